@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def call(app, method, path, body=b"", content_type="application/json", chunk_size=None):
+    """
+    Drives one request through the ASGI app in-process and returns (status, body).
+    With chunk_size set the request body is delivered in pieces of that size,
+    as a client streaming a large upload would.
+    """
+    chunk_size = chunk_size or max(len(body), 1)
+    pieces = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000), "root_path": "",
+    }
+    response = {"status": None, "body": b""}
+
+    async def receive():
+        if not pieces:
+            return {"type": "http.disconnect"}
+        piece = pieces.pop(0)
+        return {"type": "http.request", "body": piece, "more_body": bool(pieces)}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["body"]
+
+
+async def measure(items):
+    """Prints wall-clock claims per second for the per-item and batch endpoints as JSON."""
+    import server
+
+    status, body = await call(server.app, "POST", "/policyholder/", json.dumps({"name": "Bench", "email": "b@example.com"}).encode())
+    ph = json.loads(body)["id"]
+    await call(server.app, "POST", "/policy/", json.dumps({"policyholder_id": ph, "coverage": 1e12, "status": "active"}).encode())
+    claim = json.dumps({"policyholder_id": ph, "policy_id": 1, "amount": 1.0, "status": "pending"}).encode()
+
+    results = {}
+    start = time.perf_counter()
+    for _ in range(items):
+        status, _ = await call(server.app, "POST", "/claim/", claim)
+        assert status == 200, status
+    results["POST /claim/ per item"] = items / (time.perf_counter() - start)
+
+    ndjson = b"\n".join([claim] * items) + b"\n"
+    start = time.perf_counter()
+    status, body = await call(server.app, "POST", "/claims/batch", ndjson, "application/x-ndjson", chunk_size=64 * 1024)
+    results["POST /claims/batch ndjson"] = items / (time.perf_counter() - start)
+    assert status == 200 and body.count(b'"status_code":200') == items, status
+
+    array = b"[" + b",".join([claim] * items) + b"]"
+    start = time.perf_counter()
+    status, body = await call(server.app, "POST", "/claims/batch", array)
+    results["POST /claims/batch json array"] = items / (time.perf_counter() - start)
+    assert status == 200 and body.count(b'"status_code":200') == items, status
+    server.storage.close()
+    print(json.dumps(results))
+
+
+def run(items, durable):
+    env = dict(os.environ)
+    env.pop("CLAIMS_ID_DIR", None)
+    with tempfile.TemporaryDirectory() as data_dir:
+        if durable:
+            env["CLAIMS_DATA_DIR"] = data_dir
+        else:
+            env.pop("CLAIMS_DATA_DIR", None)
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--items", str(items)],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claim ingestion throughput, per-item endpoint vs batch endpoint.")
+    parser.add_argument("--items", type=int, default=5000, help="Claims ingested per endpoint")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(measure(args.items))
+        return
+
+    for durable in (False, True):
+        print(f"storage: {'write-ahead log' if durable else 'in-memory'}")
+        results = run(args.items, durable)
+        baseline = results["POST /claim/ per item"]
+        print(f"{'endpoint':<34}{'claims/s':>12}{'speedup':>9}")
+        for name, rate in results.items():
+            print(f"{name:<34}{rate:>12.0f}{rate / baseline:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROUTES = [
+    # Read routes first so the listings see exactly `history` claims
+    ("GET /", "GET", "/", None),
+    ("GET /policyholder/{id}", "GET", "/policyholder/{ph}", None),
+    ("GET /policyholder/{id}/claims", "GET", "/policyholder/{ph}/claims", None),
+    ("GET /policyholder/{id}/claims?limit=20", "GET", "/policyholder/{ph}/claims?limit=20", None),
+    ("GET /policyholder/{id}/policies", "GET", "/policyholder/{ph}/policies", None),
+    ("PUT /claim/.../status", "PUT", "/claim/{ph}/1/1/status?status=approved", None),
+    ("POST /policyholder/", "POST", "/policyholder/", {"name": "Jane", "email": "jane@example.com"}),
+    ("POST /policy/", "POST", "/policy/", {"policyholder_id": "{ph}", "coverage": 1e12, "status": "active"}),
+    ("POST /claim/", "POST", "/claim/", {"policyholder_id": "{ph}", "policy_id": 1, "amount": 10.0, "status": "pending"}),
+]
+
+
+async def call(app, method, path, body=None):
+    """Drives one request through the ASGI app in-process and returns (status, body)."""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000), "root_path": "",
+    }
+    sent = False
+    response = {"status": None, "body": b""}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["body"]
+
+
+def fill(value, ph):
+    if isinstance(value, dict):
+        return {k: fill(v, ph) for k, v in value.items()}
+    if value == "{ph}":
+        return ph
+    return value.replace("{ph}", str(ph)) if isinstance(value, str) else value
+
+
+async def measure(requests_per_route, history):
+    """Prints CPU microseconds per request and the top-level keys of the response body for every route as JSON."""
+    import server
+
+    status, body = await call(server.app, "POST", "/policyholder/", {"name": "Bench", "email": "b@example.com"})
+    ph = json.loads(body)["id"]
+    await call(server.app, "POST", "/policy/", {"policyholder_id": ph, "coverage": 1e12, "status": "active"})
+    for _ in range(history):
+        await call(server.app, "POST", "/claim/", {"policyholder_id": ph, "policy_id": 1, "amount": 1.0, "status": "pending"})
+
+    results, keys = {}, {}
+    for name, method, path, body in ROUTES:
+        path, body = fill(path, ph), fill(body, ph)
+        for _ in range(50):  # warm-up
+            await call(server.app, method, path, body)
+        start = time.process_time()
+        for _ in range(requests_per_route):
+            status, response = await call(server.app, method, path, body)
+        results[name] = (time.process_time() - start) / requests_per_route * 1e6
+        assert status == 200, (name, status)
+        keys[name] = sorted(json.loads(response))
+    print(json.dumps({"us": results, "keys": keys}))
+
+
+def run(fast, requests_per_route, history):
+    env = dict(os.environ, CLAIMS_FAST_RESPONSES="1" if fast else "0")
+    env.pop("CLAIMS_DATA_DIR", None)
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(requests_per_route), "--history", str(history)],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU cost of the claims API, default vs fast responses.")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per route")
+    parser.add_argument("--history", type=int, default=200, help="Claims stored for the listing routes")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(measure(args.requests, args.history))
+        return
+
+    before, before_keys = run(False, args.requests, args.history).values()
+    after, after_keys = run(True, args.requests, args.history).values()
+    # Both modes must do the same work: every route returns the same fields
+    for name in before_keys:
+        assert before_keys[name] == after_keys[name], (name, before_keys[name], after_keys[name])
+    print(f"{'route':<42}{'default us':>12}{'fast us':>12}{'saving':>9}")
+    for name in before:
+        saving = 1 - after[name] / before[name]
+        print(f"{name:<42}{before[name]:>12.1f}{after[name]:>12.1f}{saving:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from claims_store import ClaimsStore
+from storage import WALStorage
+
+
+class BenchClaim:
+    """Lightweight stand-in for the Claim model so the benchmark measures storage, not pydantic."""
+
+    __slots__ = ("policyholder_id", "policy_id", "amount", "status")
+
+    def __init__(self, policyholder_id, policy_id, amount, status):
+        self.policyholder_id = policyholder_id
+        self.policy_id = policy_id
+        self.amount = amount
+        self.status = status
+
+    def dict(self):
+        return {"policyholder_id": self.policyholder_id, "policy_id": self.policy_id,
+                "amount": self.amount, "status": self.status}
+
+
+def claim_records(store):
+    """Snapshot source over a ClaimsStore, mirroring server.snapshot_records."""
+    items = list(store.by_id.items())
+    return (["put_claim", ph, pid, cid, claim.dict()] for cid, (ph, pid, claim) in items)
+
+
+def write_phase(data_dir, total, writers, snapshot_every, durable):
+    """Appends `total` claim records from `writers` threads and returns records/sec."""
+    storage = WALStorage(data_dir, snapshot_every=snapshot_every, durable=durable)
+    store = ClaimsStore()
+    for _ in storage.recover():
+        pass
+    storage.attach(lambda: claim_records(store))
+    lock = threading.Lock()
+    per_writer = total // writers
+
+    def writer(index):
+        base = index * per_writer
+        for i in range(base + 1, base + per_writer + 1):
+            claim = BenchClaim(i % 1000, i % 10, 10.0, "flagged")
+            with lock:
+                store.add(claim.policyholder_id, claim.policy_id, i, claim)
+            storage.append(["put_claim", claim.policyholder_id, claim.policy_id, i, claim.dict()])
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    storage.close()
+    elapsed = time.perf_counter() - start
+    return per_writer * writers / elapsed
+
+
+def recovery_phase(data_dir):
+    """Rebuilds a ClaimsStore from disk and returns (seconds, claims recovered)."""
+    start = time.perf_counter()
+    storage = WALStorage(data_dir)
+    store = ClaimsStore()
+    for op, ph, pid, cid, data in storage.recover():
+        store.add(ph, pid, cid, BenchClaim(**data))
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed, len(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAL storage write throughput and recovery time benchmark.")
+    parser.add_argument("--claims", type=int, default=1_000_000)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--snapshot-every", type=int, default=500_000)
+    parser.add_argument("--no-fsync-wait", action="store_true", help="Acknowledge writes before they are fsynced")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="claims-wal-")
+    try:
+        rate = write_phase(data_dir, args.claims, args.writers, args.snapshot_every, not args.no_fsync_wait)
+        print(f"Write throughput: {rate:,.0f} claims/sec ({args.writers} writers, durable={not args.no_fsync_wait})")
+        # Let a background snapshot triggered near the end finish before measuring recovery
+        while any(t.name == "wal-snapshot" for t in threading.enumerate()):
+            time.sleep(0.05)
+        size = sum(os.path.getsize(os.path.join(data_dir, n)) for n in os.listdir(data_dir))
+        print(f"On disk: {size / 2**20:,.1f} MiB in {sorted(os.listdir(data_dir))}")
+        seconds, recovered = recovery_phase(data_dir)
+        print(f"Recovery: {recovered:,} claims in {seconds:.2f}s ({recovered / seconds:,.0f} claims/sec)")
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
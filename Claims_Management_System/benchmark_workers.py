@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+
+async def client(session, base, claims_per_client, errors):
+    """
+    One client's session: creates a policyholder, a policy and claims (one by
+    one and in a batch), then reads them back. Every request after the first
+    has to reach the worker that created the policyholder, so any misrouting
+    shows up as a 404 or a short listing. Returns the number of requests made.
+    """
+    async def call(method, path, expected=200, **kwargs):
+        async with session.request(method, base + path, **kwargs) as response:
+            body = await response.read()
+            if response.status != expected:
+                errors.append(f"{method} {path}: {response.status} {body[:200]!r}")
+                return None
+            return body
+
+    ph = json.loads(await call("POST", "/policyholder/", json={"name": "Bench", "email": "b@example.com"}))["id"]
+    policy = json.loads(await call("POST", "/policy/", json={"policyholder_id": ph, "coverage": 1e12, "status": "active"}))["id"]
+    claim = {"policyholder_id": ph, "policy_id": policy, "amount": 1.0, "status": "pending"}
+    for _ in range(claims_per_client):
+        await call("POST", "/claim/", json=claim)
+    results = await call("POST", "/claims/batch", json=[claim] * claims_per_client)
+    if results is not None and results.count(b'"status_code":200') != claims_per_client:
+        errors.append(f"batch for policyholder {ph}: {results[:200]!r}")
+    await call("GET", f"/policyholder/{ph}")
+    listing = await call("GET", f"/policyholder/{ph}/claims")
+    if listing is not None and len(json.loads(listing)) != 2 * claims_per_client:
+        errors.append(f"policyholder {ph} lists {len(json.loads(listing))} claims, expected {2 * claims_per_client}")
+    return claims_per_client + 5
+
+
+async def drive(base, clients, claims_per_client):
+    errors = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=clients)) as session:
+        start = time.perf_counter()
+        requests = await asyncio.gather(*(client(session, base, claims_per_client, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return sum(requests) / elapsed, errors
+
+
+def run(workers, clients, claims_per_client, port, durable):
+    """Starts router.py with `workers` servers, drives it and returns (requests/s, errors)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ)
+        env.pop("CLAIMS_DATA_DIR", None)
+        env["CLAIMS_ID_DIR"] = os.path.join(data_dir, "ids")
+        if durable:
+            env["CLAIMS_DATA_DIR"] = data_dir
+        router = subprocess.Popen(
+            [sys.executable, "router.py", "--workers", str(workers), "--port", str(port),
+             "--base-port", str(port + 100), "--proxy-workers", str(workers)],
+            env=env, cwd=here,
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    urllib.request.urlopen(base + "/", timeout=1).close()
+                    break
+                except OSError:
+                    if router.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("router did not start")
+                    time.sleep(0.2)
+            return asyncio.run(drive(base, clients, claims_per_client))
+        finally:
+            router.terminate()
+            router.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claims service throughput and correctness, 1 worker vs N workers behind router.py.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent client sessions")
+    parser.add_argument("--claims", type=int, default=20, help="Claims created per client, one by one and again in a batch")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--durable", action="store_true", help="Persist through the write-ahead log")
+    args = parser.parse_args()
+
+    print(f"{'workers':<9}{'requests/s':>12}{'speedup':>9}{'errors':>8}")
+    baseline = None
+    for workers in sorted({1, args.workers}):
+        rate, errors = run(workers, args.clients, args.claims, args.port, args.durable)
+        baseline = baseline or rate
+        print(f"{workers:<9}{rate:>12.0f}{rate / baseline:>8.1f}x{len(errors):>8}")
+        for error in errors[:5]:
+            print(f"  {error}")
+    if os.cpu_count() == 1:
+        print("only one CPU is available, so extra workers cannot add throughput here")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def add_ordered_id(ids: List[int], entity_id: int):
+    """
+    Adds an ID to a sorted ID list. IDs are allocated in increasing order, so
+    this is almost always an append.
+    """
+    if not ids or entity_id > ids[-1]:
+        ids.append(entity_id)
+    else:
+        insort(ids, entity_id)
+
+
+def remove_ordered_id(ids: List[int], entity_id: int):
+    """
+    Removes an ID from a sorted ID list.
+    """
+    index = bisect_left(ids, entity_id)
+    if index < len(ids) and ids[index] == entity_id:
+        del ids[index]
+
+
+def page_by_id(ids: List[int], entities: Dict[int, object], after: Optional[int], limit: int,
+               predicate: Optional[Callable[[object], bool]] = None) -> Tuple[List[Tuple[int, object]], Optional[int]]:
+    """
+    Returns up to `limit` (id, entity) pairs with an ID greater than `after`,
+    in ID order, and the cursor for the next page (None on the last page).
+    The start of the page is found by bisection, so deep pages cost the same
+    as the first one.
+    """
+    start = bisect_right(ids, after) if after is not None else 0
+    items = []
+    for index in range(start, len(ids)):
+        entity_id = ids[index]
+        entity = entities[entity_id]
+        if predicate is None or predicate(entity):
+            items.append((entity_id, entity))
+            if len(items) == limit:
+                return items, (entity_id if index + 1 < len(ids) else None)
+    return items, None
+
+
+class ClaimsStore:
+    """
+    In-memory claims storage with secondary indexes.
+
+    Claims are keyed by (policyholder_id, policy_id, claim_id). Alongside the
+    primary mapping the store keeps an index by claim_id, an index by status and
+    a running total of the coverage consumed by each (policyholder, policy) pair,
+    so coverage checks and lookups do not need to walk every stored claim.
+    """
+
+    # Claims in this status do not count against the policy coverage
+    UNCOUNTED_STATUS = "rejected"
+
+    def __init__(self):
+        # policyholder_id -> {claim_id: claim}
+        self.by_policyholder: Dict[int, Dict[int, object]] = {}
+        # policyholder_id -> sorted claim IDs, used for cursor pagination
+        self.ordered_ids: Dict[int, List[int]] = {}
+        # claim_id -> (policyholder_id, policy_id, claim)
+        self.by_id: Dict[int, Tuple[int, int, object]] = {}
+        # status -> {claim_id: None}, used as an insertion-ordered set
+        self.by_status: Dict[str, Dict[int, None]] = {}
+        # (policyholder_id, status) -> sorted claim IDs, used for filtered pagination
+        self.ordered_by_status: Dict[Tuple[int, str], List[int]] = {}
+        # (policyholder_id, policy_id) -> {claim_id: None}
+        self.by_policy: Dict[Tuple[int, int], Dict[int, None]] = {}
+        # (policyholder_id, policy_id) -> coverage consumed by non-rejected claims
+        self.consumed: Dict[Tuple[int, int], float] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def _counted_amount(self, claim) -> float:
+        return 0.0 if claim.status == self.UNCOUNTED_STATUS else claim.amount
+
+    def _count(self, key: Tuple[int, int], claim_id: int, claim):
+        self.by_status.setdefault(claim.status, {})[claim_id] = None
+        add_ordered_id(self.ordered_by_status.setdefault((key[0], claim.status), []), claim_id)
+        self.consumed[key] = self.consumed.get(key, 0.0) + self._counted_amount(claim)
+
+    def _uncount(self, key: Tuple[int, int], claim_id: int, claim):
+        status_ids = self.by_status[claim.status]
+        del status_ids[claim_id]
+        if not status_ids:
+            del self.by_status[claim.status]
+        status_key = (key[0], claim.status)
+        ordered_ids = self.ordered_by_status[status_key]
+        remove_ordered_id(ordered_ids, claim_id)
+        if not ordered_ids:
+            del self.ordered_by_status[status_key]
+        self.consumed[key] -= self._counted_amount(claim)
+
+    def contains(self, policyholder_id: int, policy_id: int, claim_id: int) -> bool:
+        """
+        Returns True if the claim is stored under the given policyholder and policy.
+        """
+        entry = self.by_id.get(claim_id)
+        return entry is not None and entry[0] == policyholder_id and entry[1] == policy_id
+
+    def get(self, claim_id: int):
+        """
+        Returns the claim with the given ID, or None.
+        """
+        entry = self.by_id.get(claim_id)
+        return entry[2] if entry is not None else None
+
+    def locate(self, claim_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (policyholder_id, policy_id) a claim is stored under, or None.
+        """
+        entry = self.by_id.get(claim_id)
+        return (entry[0], entry[1]) if entry is not None else None
+
+    def consumed_coverage(self, policyholder_id: int, policy_id: int) -> float:
+        """
+        Returns the total amount of non-rejected claims against a policy.
+        """
+        return self.consumed.get((policyholder_id, policy_id), 0.0)
+
+    def has_claims(self, policyholder_id: int, policy_id: int) -> bool:
+        """
+        Returns True if any claim is linked to the policy.
+        """
+        return (policyholder_id, policy_id) in self.by_policy
+
+    def has_policyholder(self, policyholder_id: int) -> bool:
+        """
+        Returns True if the policyholder has ever had a claim stored.
+        """
+        return policyholder_id in self.by_policyholder
+
+    def for_policyholder(self, policyholder_id: int) -> Dict[int, object]:
+        """
+        Returns the claims of a policyholder keyed by claim ID.
+        """
+        return self.by_policyholder.get(policyholder_id, {})
+
+    def page(self, policyholder_id: int, after: Optional[int] = None, limit: int = 100,
+             status: Optional[str] = None) -> Tuple[List[Tuple[int, object]], Optional[int]]:
+        """
+        Returns a page of a policyholder's claims in claim ID order, optionally
+        filtered by status, and the cursor for the next page. A filtered page
+        walks only the policyholder's claims in that status.
+        """
+        if status is not None:
+            ids = self.ordered_by_status.get((policyholder_id, status), [])
+        else:
+            ids = self.ordered_ids.get(policyholder_id, [])
+        return page_by_id(ids, self.for_policyholder(policyholder_id), after, limit)
+
+    def ids_with_status(self, status: str) -> Iterator[int]:
+        """
+        Iterates over the IDs of claims currently in the given status.
+        """
+        return iter(self.by_status.get(status, {}))
+
+    def add(self, policyholder_id: int, policy_id: int, claim_id: int, claim):
+        """
+        Stores a new claim. The claim's status must be final before it is added.
+        """
+        key = (policyholder_id, policy_id)
+        self.by_policyholder.setdefault(policyholder_id, {})[claim_id] = claim
+        add_ordered_id(self.ordered_ids.setdefault(policyholder_id, []), claim_id)
+        self.by_id[claim_id] = (policyholder_id, policy_id, claim)
+        self.by_policy.setdefault(key, {})[claim_id] = None
+        self._count(key, claim_id, claim)
+
+    def replace(self, policyholder_id: int, policy_id: int, claim_id: int, claim):
+        """
+        Replaces an existing claim, keeping every index and total in step.
+        """
+        key = (policyholder_id, policy_id)
+        self._uncount(key, claim_id, self.by_id[claim_id][2])
+        self.by_policyholder[policyholder_id][claim_id] = claim
+        self.by_id[claim_id] = (policyholder_id, policy_id, claim)
+        self._count(key, claim_id, claim)
+
+    def set_status(self, claim_id: int, status: str):
+        """
+        Changes the status of an existing claim.
+        """
+        policyholder_id, policy_id, claim = self.by_id[claim_id]
+        key = (policyholder_id, policy_id)
+        self._uncount(key, claim_id, claim)
+        claim.status = status
+        self._count(key, claim_id, claim)
+
+    def delete(self, claim_id: int):
+        """
+        Removes a claim and releases the coverage it consumed.
+        """
+        policyholder_id, policy_id, claim = self.by_id.pop(claim_id)
+        key = (policyholder_id, policy_id)
+        del self.by_policyholder[policyholder_id][claim_id]
+        remove_ordered_id(self.ordered_ids[policyholder_id], claim_id)
+        self._uncount(key, claim_id, claim)
+        policy_ids = self.by_policy[key]
+        del policy_ids[claim_id]
+        if not policy_ids:
+            # Drop the total instead of keeping a running float that may have drifted
+            del self.by_policy[key]
+            del self.consumed[key]
+
+
+class Shard:
+    """
+    One partition of the claims service state, guarded by its own lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.policyholders: Dict[int, object] = {}
+        # policyholder_id -> {policy_id: policy}
+        self.policies: Dict[int, Dict[int, object]] = {}
+        # policyholder_id -> sorted policy IDs, used for cursor pagination
+        self.policy_ids: Dict[int, List[int]] = {}
+        self.claims = ClaimsStore()
+
+    def put_policy(self, policyholder_id: int, policy_id: int, policy):
+        """
+        Adds or replaces a policy.
+        """
+        ph_policies = self.policies.setdefault(policyholder_id, {})
+        if policy_id not in ph_policies:
+            add_ordered_id(self.policy_ids.setdefault(policyholder_id, []), policy_id)
+        ph_policies[policy_id] = policy
+
+    def delete_policy(self, policyholder_id: int, policy_id: int):
+        """
+        Removes a policy if it exists.
+        """
+        if self.policies.get(policyholder_id, {}).pop(policy_id, None) is not None:
+            remove_ordered_id(self.policy_ids[policyholder_id], policy_id)
+
+    def delete_policies(self, policyholder_id: int):
+        """
+        Removes every policy of a policyholder.
+        """
+        self.policies.pop(policyholder_id, None)
+        self.policy_ids.pop(policyholder_id, None)
+
+    def policies_page(self, policyholder_id: int, after: Optional[int] = None, limit: int = 100,
+                      status: Optional[str] = None) -> Tuple[List[Tuple[int, object]], Optional[int]]:
+        """
+        Returns a page of a policyholder's policies in policy ID order,
+        optionally filtered by status, and the cursor for the next page.
+        """
+        predicate = (lambda policy: policy.status == status) if status is not None else None
+        return page_by_id(self.policy_ids.get(policyholder_id, []), self.policies.get(policyholder_id, {}),
+                          after, limit, predicate)
+
+
+class ShardedStore:
+    """
+    Claims service state partitioned by policyholder_id.
+
+    Every policyholder, its policies and its claims live in the same shard, so
+    a request touching one policyholder only needs that shard's lock. Requests
+    for policyholders in different shards run without contending.
+    """
+
+    def __init__(self, shard_count: int = 16):
+        self.shards = [Shard() for _ in range(shard_count)]
+
+    def shard(self, policyholder_id: int) -> Shard:
+        """
+        Returns the shard that owns the given policyholder.
+        """
+        return self.shards[policyholder_id % len(self.shards)]
+
+    def __iter__(self) -> Iterator[Shard]:
+        return iter(self.shards)
@@ -0,0 +1,97 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+
+_COUNTER = struct.Struct("<Q")
+
+
+class IdAllocator:
+    """
+    Thread-safe auto-incrementing ID source for a single process.
+    """
+
+    def __init__(self, start: int = 1):
+        self._lock = threading.Lock()
+        self._next = start
+
+    def allocate(self) -> int:
+        """
+        Returns the next unused ID.
+        """
+        with self._lock:
+            new_id = self._next
+            self._next += 1
+            return new_id
+
+    def peek(self) -> int:
+        """
+        Returns the ID the next allocate() call in this process would return.
+        """
+        with self._lock:
+            return self._next
+
+    def advance_to(self, value: int):
+        """
+        Ensures no ID below `value` is handed out again (used after recovery).
+        """
+        with self._lock:
+            self._next = max(self._next, value)
+
+
+class FileIdAllocator(IdAllocator):
+    """
+    ID source shared by every process that opens the same counter file.
+
+    The file holds the next free ID as a 64-bit integer. A process reserves a
+    block of `block_size` IDs at a time under an exclusive flock, then hands
+    them out from memory, so the cross-process lock is only taken once per
+    block. IDs are unique across processes and increasing within one process.
+    """
+
+    def __init__(self, path: str, block_size: int = 64):
+        super().__init__()
+        self.block_size = block_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _COUNTER.size:
+            os.ftruncate(self._fd, _COUNTER.size)
+        self._counter = mmap.mmap(self._fd, _COUNTER.size)
+        self._end = self._next
+
+    def _reserve(self, minimum: int = 1) -> int:
+        # Called with the thread lock held: moves the shared counter past a new block
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            start = max(_COUNTER.unpack_from(self._counter)[0], minimum, 1)
+            _COUNTER.pack_into(self._counter, 0, start + self.block_size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._next, self._end = start, start + self.block_size
+        return start
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve()
+            new_id = self._next
+            self._next += 1
+            return new_id
+
+    def advance_to(self, value: int):
+        with self._lock:
+            if self._next < value:
+                self._reserve(value)
+
+
+def open_id_allocator(name: str) -> IdAllocator:
+    """
+    Returns a file-backed allocator in CLAIMS_ID_DIR (or CLAIMS_DATA_DIR) so
+    several worker processes never hand out the same ID, or an in-process
+    allocator when neither is set.
+    """
+    directory = os.environ.get("CLAIMS_ID_DIR") or os.environ.get("CLAIMS_DATA_DIR")
+    if not directory:
+        return IdAllocator()
+    os.makedirs(directory, exist_ok=True)
+    return FileIdAllocator(os.path.join(directory, f"{name}.id"))
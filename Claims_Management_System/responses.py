@@ -0,0 +1,57 @@
+import json
+import os
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+def _encode_model(obj):
+    # Pydantic models nested in a response (e.g. a dict of claims); anything
+    # else, such as an exception inside a validation error, is stringified
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    return str(obj)
+
+
+if orjson is not None:
+    def dumps(content) -> bytes:
+        """
+        Serializes a response body. Integer dict keys become strings, as with json.
+        """
+        return orjson.dumps(content, default=_encode_model, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content) -> bytes:
+        """
+        Serializes a response body. Integer dict keys become strings, as with json.
+        """
+        return json.dumps(content, default=_encode_model, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered directly with `dumps`, skipping jsonable_encoder.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# Set CLAIMS_FAST_RESPONSES=0 to fall back to FastAPI's default encoding path
+FAST_RESPONSES = os.environ.get("CLAIMS_FAST_RESPONSES", "1") != "0"
+
+
+def respond(content, status_code: int = 200):
+    """
+    Wraps an endpoint result in a pre-rendered response.
+
+    FastAPI returns Response objects as-is, so this skips response_model
+    validation and the generic encoder. Endpoints must only pass content
+    that already has the documented shape.
+    """
+    if not FAST_RESPONSES:
+        return content
+    return FastJSONResponse(content, status_code=status_code)
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import List, Optional
+
+import aiohttp
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+# Front proxy for a multi-worker claims service. server.py keeps all state in
+# one process, so `uvicorn --workers N` would split it between workers that
+# cannot see each other's entities. Instead the launcher below starts N
+# independent servers (CLAIMS_WORKERS=N, CLAIMS_WORKER_ID=i on port base + i)
+# and this app routes every request to the worker that owns its policyholder:
+#   - paths /policyholder/{id}/..., /policy/{id}/..., /claim/{id}/... go to id % N
+#   - POST /policy/ and POST /claim/ go to body["policyholder_id"] % N
+#   - /policies/batch and /claims/batch are split per owner and the results merged
+#   - everything else (new policyholders, health checks) is spread round robin
+WORKERS = int(os.environ.get("CLAIMS_WORKERS", "1"))
+BASE_PORT = int(os.environ.get("CLAIMS_ROUTER_BASE_PORT", "8100"))
+BACKENDS = [f"http://127.0.0.1:{BASE_PORT + i}" for i in range(WORKERS)]
+OWNED_PREFIXES = ("policyholder", "policy", "claim")
+SPLIT_BATCHES = ("/policies/batch", "/claims/batch")
+# Hop-by-hop headers, and headers the proxy recomputes for the forwarded body
+DROPPED_HEADERS = {"host", "connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding"}
+
+app = FastAPI()
+session: Optional[aiohttp.ClientSession] = None
+next_worker = itertools.count()
+
+
+@app.on_event("startup")
+async def open_session():
+    global session
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=0, keepalive_timeout=30)
+    session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60), auto_decompress=False)
+
+
+@app.on_event("shutdown")
+async def close_session():
+    await session.close()
+
+
+def any_worker() -> int:
+    return next(next_worker) % WORKERS
+
+
+def owner_of(item) -> int:
+    """
+    Worker owning a JSON body, or any worker when it names no valid
+    policyholder (the worker then rejects it as the single server would).
+    """
+    if isinstance(item, dict) and isinstance(item.get("policyholder_id"), int):
+        return item["policyholder_id"] % WORKERS
+    return any_worker()
+
+
+def route(method: str, path: str, body: bytes) -> int:
+    parts = path.strip("/").split("/")
+    if parts[0] in OWNED_PREFIXES and len(parts) > 1 and parts[1].isdigit():
+        return int(parts[1]) % WORKERS
+    if method == "POST" and parts[0] in ("policy", "claim") and len(parts) == 1:
+        try:
+            return owner_of(json.loads(body))
+        except ValueError:
+            return any_worker()
+    return any_worker()
+
+
+def forward_headers(request: Request) -> dict:
+    return {k: v for k, v in request.headers.items() if k.lower() not in DROPPED_HEADERS}
+
+
+async def forward(worker: int, request: Request, body: bytes) -> Response:
+    url = BACKENDS[worker] + request.url.path
+    async with session.request(request.method, url, params=request.query_params.multi_items(),
+                               headers=forward_headers(request), data=body) as upstream:
+        content = await upstream.read()
+        headers = {k: v for k, v in upstream.headers.items() if k.lower() not in DROPPED_HEADERS}
+        return Response(content, status_code=upstream.status, headers=headers)
+
+
+def split_batch(request: Request, body: bytes) -> Optional[List[List[tuple]]]:
+    """
+    Groups the items of a batch by owning worker as (index, raw NDJSON line)
+    pairs, numbering items the way server.py does. Returns None when the body
+    is not a JSON array or NDJSON, so a single worker can reject it.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        lines = [line for line in body.split(b"\n") if line.strip()]
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(items, list):
+            return None
+        lines = [json.dumps(item).encode() for item in items]
+    groups = [[] for _ in range(WORKERS)]
+    for index, (item, line) in enumerate(zip(items, lines)):
+        groups[owner_of(item)].append((index, line))
+    return groups
+
+
+async def forward_batch(worker: int, path: str, group: List[tuple]) -> List[dict]:
+    body = b"\n".join(line for _, line in group) + b"\n"
+    async with session.post(BACKENDS[worker] + path, data=body,
+                            headers={"content-type": "application/x-ndjson"}) as upstream:
+        results = [json.loads(line) for line in (await upstream.read()).splitlines() if line.strip()]
+    for result in results:
+        # Map the worker's position in its sub-batch back to the client's index
+        result["index"] = group[result["index"]][0]
+    return results
+
+
+async def merged_batch(request: Request, groups: List[List[tuple]]) -> Response:
+    parts = await asyncio.gather(*(forward_batch(worker, request.url.path, group)
+                                   for worker, group in enumerate(groups) if group))
+    results = sorted((result for part in parts for result in part), key=lambda result: result["index"])
+    return StreamingResponse(iter([json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in results]),
+                             media_type="application/x-ndjson")
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+async def proxy(request: Request):
+    body = await request.body()
+    if request.method == "POST" and request.url.path in SPLIT_BATCHES:
+        groups = split_batch(request, body)
+        if groups is not None:
+            return await merged_batch(request, groups)
+    return await forward(route(request.method, request.url.path, body), request, body)
+
+
+def wait_until_up(urls: List[str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                urllib.request.urlopen(url + "/", timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"worker at {url} did not start")
+                time.sleep(0.2)
+
+
+def start_workers(workers: int, base_port: int) -> List[subprocess.Popen]:
+    """
+    Starts one server.py process per worker, each owning policyholder IDs
+    with id % workers == its CLAIMS_WORKER_ID.
+    """
+    processes = []
+    for worker_id in range(workers):
+        env = dict(os.environ, CLAIMS_WORKERS=str(workers), CLAIMS_WORKER_ID=str(worker_id))
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+             "--port", str(base_port + worker_id), "--log-level", "warning"],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ))
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the claims service as N workers behind a routing proxy.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Claims server processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="Port the proxy listens on")
+    parser.add_argument("--base-port", type=int, default=8100, help="Worker i listens on base-port + i")
+    parser.add_argument("--proxy-workers", type=int, default=1, help="Proxy processes sharing --port")
+    args = parser.parse_args()
+
+    # Workers started without a data directory would each allocate policy and
+    # claim IDs on their own, so they share an ID directory in any case
+    if not (os.environ.get("CLAIMS_DATA_DIR") or os.environ.get("CLAIMS_ID_DIR")):
+        os.environ["CLAIMS_ID_DIR"] = tempfile.mkdtemp(prefix="claims-ids-")
+    os.environ["CLAIMS_WORKERS"] = str(args.workers)
+    os.environ["CLAIMS_ROUTER_BASE_PORT"] = str(args.base_port)
+
+    # uvicorn re-raises SIGTERM once it has shut down; exiting through SystemExit
+    # instead of dying on the signal lets the workers below be stopped as well
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    processes = start_workers(args.workers, args.base_port)
+    try:
+        wait_until_up([f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers)])
+        import uvicorn
+        uvicorn.run("router:app", host=args.host, port=args.port, workers=args.proxy_workers,
+                    log_level="warning", app_dir=os.path.dirname(os.path.abspath(__file__)))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
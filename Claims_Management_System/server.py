@@ -1,18 +1,52 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Union
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import json
+import os
 import uuid
+from claims_store import ShardedStore
+from id_allocator import open_id_allocator
+from responses import dumps, respond
+from storage import open_storage
+
+from common.metrics import install_metrics
 
 app = FastAPI()
+install_metrics(app, "claims")
+
+# In-memory storage for entities, partitioned by policyholder ID. Each shard holds
+# a policyholder's record, policies and claims behind a single lock.
+store = ShardedStore(int(os.environ.get("CLAIMS_SHARDS", "16")))
+
+# Auto-incrementing IDs for policies and claims, shared across worker processes
+# when CLAIMS_ID_DIR or CLAIMS_DATA_DIR is set
+policy_ids = open_id_allocator("policy")
+claim_ids = open_id_allocator("claim")
 
-# In-memory storage for entities
-policyholders = {}
-policies = {}
-claims = {}
+# Storage engine that persists every change (in-memory only unless CLAIMS_DATA_DIR is set)
+storage = open_storage()
 
-# Auto-incrementing IDs for policies and claims
-policy_id_counter = 1
-claim_id_counter = 1
+# Entity state lives in one process, and a data directory can only be opened by
+# one process. To run several workers, start one server per worker with
+# CLAIMS_WORKERS=N and CLAIMS_WORKER_ID=0..N-1: each keeps its own data directory
+# under CLAIMS_DATA_DIR and only mints policyholder IDs with
+# id % CLAIMS_WORKERS == CLAIMS_WORKER_ID. router.py starts the workers and
+# routes every request carrying a policyholder_id (in the path or body) to
+# worker policyholder_id % N, splitting batches by owner. Plain
+# `uvicorn --workers N` does not work: the workers would split the state.
+WORKERS = int(os.environ.get("CLAIMS_WORKERS", "1"))
+WORKER_ID = int(os.environ.get("CLAIMS_WORKER_ID", "0"))
+if not 0 <= WORKER_ID < WORKERS:
+    raise RuntimeError("CLAIMS_WORKER_ID must be in [0, CLAIMS_WORKERS)")
+
+# Layout of the records this server writes. Version 1 logs identified a
+# deleted claim by ["del_claim", claim_id] only; version 2 writes
+# ["del_claim", policyholder_id, policy_id, claim_id]. Every snapshot starts
+# with a ["version", n] record, and one is appended after recovering an
+# older log, so each record is replayed with the layout it was written in.
+RECORD_VERSION = 2
 
 # Models
 class Policyholder(BaseModel):
@@ -30,72 +64,322 @@ class Claim(BaseModel):
     amount: float
     status: str  # pending, approved, rejected, pending_review
 
+# Response bodies of the create endpoints: the stored entity plus its generated ID
+class PolicyRecord(Policy):
+    id: int
+
+class ClaimRecord(Claim):
+    id: int
+
+
+def persist(*record) -> int:
+    """
+    Hands a state change to the storage engine and returns its sequence number.
+    Called with the shard lock held so the log follows the in-memory order;
+    the caller waits with storage.wait_for() after releasing the lock.
+    """
+    return storage.append(list(record), wait=False)
+
+def apply_record(record, version: int = RECORD_VERSION):
+    """
+    Applies a persisted state change, written with the given record layout
+    version, to the in-memory storage during recovery.
+    """
+    op, *args = record
+    if op == "put_policyholder":
+        store.shard(args[0]).policyholders[args[0]] = Policyholder(**args[1])
+    elif op == "del_policyholder":
+        shard = store.shard(args[0])
+        shard.policyholders.pop(args[0], None)
+        shard.delete_policies(args[0])
+    elif op == "put_policy":
+        store.shard(args[0]).put_policy(args[0], args[1], Policy(**args[2]))
+        policy_ids.advance_to(args[1] + 1)
+    elif op == "del_policy":
+        store.shard(args[0]).delete_policy(args[0], args[1])
+    elif op == "put_claim":
+        policyholder_id, policy_id, claim_id, data = args
+        claims = store.shard(policyholder_id).claims
+        if claims.contains(policyholder_id, policy_id, claim_id):
+            claims.replace(policyholder_id, policy_id, claim_id, Claim(**data))
+        else:
+            claims.add(policyholder_id, policy_id, claim_id, Claim(**data))
+        claim_ids.advance_to(claim_id + 1)
+    elif op == "del_claim" and version < 2:
+        # The owning policyholder was not recorded, so look in every shard
+        for shard in store:
+            if shard.claims.get(args[0]) is not None:
+                shard.claims.delete(args[0])
+    elif op == "del_claim":
+        claims = store.shard(args[0]).claims
+        if claims.contains(*args):
+            claims.delete(args[2])
+    elif op == "counters":
+        policy_ids.advance_to(args[0])
+        claim_ids.advance_to(args[1])
+
+def snapshot_records():
+    """
+    Yields the full state as storage records. Each shard is copied under its
+    lock and serialized after releasing it, so requests keep running.
+    """
+    yield ["version", RECORD_VERSION]
+    yield ["counters", policy_ids.peek(), claim_ids.peek()]
+    for shard in store:
+        with shard.lock:
+            policyholder_items = list(shard.policyholders.items())
+            policy_items = [(ph_id, list(ph_policies.items())) for ph_id, ph_policies in shard.policies.items()]
+            claim_items = list(shard.claims.by_id.items())
+        for policyholder_id, policyholder in policyholder_items:
+            if policyholder is not None:
+                yield ["put_policyholder", policyholder_id, policyholder.dict()]
+        for policyholder_id, ph_policies in policy_items:
+            for policy_id, policy in ph_policies:
+                yield ["put_policy", policyholder_id, policy_id, policy.dict()]
+        for claim_id, (policyholder_id, policy_id, claim) in claim_items:
+            yield ["put_claim", policyholder_id, policy_id, claim_id, claim.dict()]
+
+# Logs without a version record predate versioning
+_version = 1
+for _record in storage.recover():
+    if _record[0] == "version":
+        _version = _record[1]
+    else:
+        apply_record(_record, _version)
+if _version != RECORD_VERSION:
+    storage.wait_for(persist("version", RECORD_VERSION))
+storage.attach(snapshot_records)
+
+@app.on_event("shutdown")
+def close_storage():
+    storage.close()
+
 
 def generate_policyholder_id() -> int:
     """
-    Generates a unique 31-bit integer ID for a policyholder.
+    Generates a unique 31-bit integer ID for a policyholder, owned by this
+    worker (new_id % WORKERS == WORKER_ID).
     
     Returns:
         int: A unique policyholder ID.
     """
     while True:
-        new_id = uuid.uuid4().int & ((1 << 31) - 1)
-        if new_id not in policyholders:
-            policyholders[new_id] = None 
-            return new_id
+        new_id = uuid.uuid4().int % ((1 << 31) // WORKERS) * WORKERS + WORKER_ID
+        shard = store.shard(new_id)
+        with shard.lock:
+            if new_id not in shard.policyholders:
+                shard.policyholders[new_id] = None 
+                return new_id
+
+def insert_policyholder(policyholder: Policyholder) -> Tuple[int, int]:
+    """
+    Stores a new policyholder and returns its generated ID and log sequence number.
+    """
+    policyholder_id = generate_policyholder_id()  # Generate a unique ID
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        # Save the policyholder with the generated ID
+        shard.policyholders[policyholder_id] = policyholder
+        lsn = persist("put_policyholder", policyholder_id, policyholder.dict())
+    return policyholder_id, lsn
+
+def insert_policy(policy: Policy) -> Tuple[int, int]:
+    """
+    Stores a new policy and returns its generated ID and log sequence number.
+    Raises HTTPException if the policyholder does not exist.
+    """
+    shard = store.shard(policy.policyholder_id)
+    with shard.lock:
+        # Ensure the policyholder exists
+        if shard.policyholders.get(policy.policyholder_id) is None:
+            raise HTTPException(status_code=404, detail="Policyholder not found.")
+        
+        policy_id = policy_ids.allocate()
+        shard.put_policy(policy.policyholder_id, policy_id, policy)
+        lsn = persist("put_policy", policy.policyholder_id, policy_id, policy.dict())
+    return policy_id, lsn
+
+def insert_claim(claim: Claim) -> Tuple[int, int]:
+    """
+    Applies the coverage rule, stores a new claim and returns its generated ID
+    and log sequence number. The check and the insert happen under the shard
+    lock, so concurrent claims cannot both pass the coverage check.
+    Raises HTTPException if the policy does not exist or the coverage is exceeded.
+    """
+    shard = store.shard(claim.policyholder_id)
+    with shard.lock:
+        policy = shard.policies.get(claim.policyholder_id, {}).get(claim.policy_id)
+        if shard.policyholders.get(claim.policyholder_id) is None or policy is None:
+            raise HTTPException(status_code=404, detail="Policyholder or Policy not found.")
+        total_claims = shard.claims.consumed_coverage(claim.policyholder_id, claim.policy_id)
+        if total_claims + claim.amount > policy.coverage:
+            raise HTTPException(status_code=400, detail="Claim exceeds available coverage.")
+        claim_id = claim_ids.allocate()
+        if claim.amount > 10000:
+            claim.status = "pending_review"
+        else:
+            claim.status = "flagged"
+        # The status is set before storing so the store indexes it correctly
+        shard.claims.add(claim.policyholder_id, claim.policy_id, claim_id, claim)
+        lsn = persist("put_claim", claim.policyholder_id, claim.policy_id, claim_id, claim.dict())
+    return claim_id, lsn
 
 @app.post("/policyholder/")
 def create_policyholder(policyholder: Policyholder):
     """
     Creates a new policyholder and returns the generated ID along with details.
     """
-    policyholder_id = generate_policyholder_id()  # Generate a unique ID
-    # Save the policyholder with the generated ID
-    policyholders[policyholder_id] = policyholder
+    policyholder_id, lsn = insert_policyholder(policyholder)
+    storage.wait_for(lsn)
     # Return both the ID and policyholder details
-    return {"id": policyholder_id, **policyholder.dict()}
+    return respond({"id": policyholder_id, **policyholder.dict()})
 
-@app.post("/policy/", response_model=Policy)
+@app.post("/policy/", response_model=PolicyRecord)
 def create_policy(policy: Policy):
     """
     Creates a new policy and returns the policy details including the ID.
     """
-    global policy_id_counter
-
-    # Ensure the policyholder exists
-    if policy.policyholder_id not in policyholders:
-        raise HTTPException(status_code=404, detail="Policyholder not found.")
-    
-    policy_id = policy_id_counter
-    policy_id_counter += 1
-    policies[policy.policyholder_id] = policies.get(policy.policyholder_id, {})
-    policies[policy.policyholder_id][policy_id] = policy
+    policy_id, lsn = insert_policy(policy)
+    storage.wait_for(lsn)
     # Returning policy details and the generated id
-    return {"id": policy_id, **policy.dict()}
+    return respond({"id": policy_id, **policy.dict()})
 
-@app.post("/claim/", response_model=Claim)
+@app.post("/claim/", response_model=ClaimRecord)
 def create_claim(claim: Claim):
     """
     Creates a new claim and returns the generated claim ID.
     """
-    global claim_id_counter
-    if claim.policyholder_id not in policyholders or claim.policyholder_id not in policies or claim.policy_id not in policies[claim.policyholder_id]:
-        raise HTTPException(status_code=404, detail="Policyholder or Policy not found.")
-    policy = policies[claim.policyholder_id][claim.policy_id]
-    total_claims = sum(
-        c.amount for c in claims.get(claim.policyholder_id, {}).get(claim.policy_id, {}).values()
-        if c.status != "rejected"
-    )
-    if total_claims + claim.amount > policy.coverage:
-        raise HTTPException(status_code=400, detail="Claim exceeds available coverage.")
-    claim_id = claim_id_counter
-    claim_id_counter += 1
-    claims.setdefault(claim.policyholder_id, {}).setdefault(claim.policy_id, {})[claim_id] = claim
-    if claim.amount > 10000:
-        claim.status = "pending_review"
-    else:
-        claim.status = "flagged"
-    return {"id": claim_id, **claim.dict()}
+    claim_id, lsn = insert_claim(claim)
+    storage.wait_for(lsn)
+    return respond({"id": claim_id, **claim.dict()})
+
+
+# Batch ingestion: each endpoint accepts a JSON array, or NDJSON when the request
+# Content-Type is application/x-ndjson, and streams back one NDJSON result per item.
+# NDJSON bodies are parsed as they arrive, so the first chunk of items is stored
+# and acknowledged before the client has finished sending the rest.
+BATCH_CHUNK_SIZE = 1000
+
+def parse_line(line: bytes) -> Union[dict, HTTPException]:
+    """
+    Parses one NDJSON line. A malformed line becomes a per-item error instead
+    of failing the whole batch.
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        return HTTPException(status_code=400, detail="Invalid JSON.")
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Union[dict, HTTPException]]:
+    """
+    Yields the items of an NDJSON body read chunk by chunk, splitting on newlines.
+    """
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_line(line)
+    if tail.strip():
+        yield parse_line(tail)
+
+async def iter_items(items: list) -> AsyncIterator[dict]:
+    for item in items:
+        yield item
+
+async def parse_batch(request: Request) -> AsyncIterator[Union[dict, HTTPException]]:
+    """
+    Returns the items of a batch request. A JSON array has to be read whole
+    before it can be parsed, so errors in it are raised before any item is stored.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return iter_ndjson(request.stream())
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON.")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array.")
+    return iter_items(items)
+
+def insert_chunk(items: list, first_index: int, model, insert) -> bytes:
+    """
+    Validates and inserts a chunk of items in order and returns their NDJSON
+    result lines once a single wait for the storage engine covers every record
+    in it, so an acknowledged item is durable.
+    """
+    results, lsn = [], 0
+    for index, item in enumerate(items, first_index):
+        try:
+            if isinstance(item, HTTPException):
+                raise item
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=422, detail="Expected a JSON object.")
+            try:
+                entity = model(**item)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors())
+            entity_id, lsn = insert(entity)
+            results.append({"index": index, "status_code": 200, "id": entity_id})
+        except HTTPException as e:
+            results.append({"index": index, "status_code": e.status_code, "detail": e.detail})
+    storage.wait_for(lsn)
+    return b"".join(dumps(r) + b"\n" for r in results)
+
+async def run_batch(items: AsyncIterator, model, insert) -> AsyncIterator[bytes]:
+    """
+    Inserts items in chunks of BATCH_CHUNK_SIZE as they are parsed, yielding
+    each chunk's results. Inserts take shard locks and wait for fsync, so they
+    run in the threadpool rather than on the event loop.
+    """
+    chunk, first_index = [], 0
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            yield await run_in_threadpool(insert_chunk, chunk, first_index, model, insert)
+            first_index += len(chunk)
+            chunk = []
+    if chunk:
+        yield await run_in_threadpool(insert_chunk, chunk, first_index, model, insert)
+
+class BatchResponse(StreamingResponse):
+    """
+    Streams batch results while the request body may still be arriving.
+    StreamingResponse also listens for a client disconnect on `receive`,
+    which would take the body messages away from request.stream(), so the
+    results are sent without that listener.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def batch_response(request: Request, model, insert) -> StreamingResponse:
+    items = await parse_batch(request)
+    return BatchResponse(run_batch(items, model, insert), media_type="application/x-ndjson")
+
+@app.post("/policyholders/batch")
+async def create_policyholders_batch(request: Request):
+    """
+    Creates many policyholders in one request.
+    """
+    return await batch_response(request, Policyholder, insert_policyholder)
+
+@app.post("/policies/batch")
+async def create_policies_batch(request: Request):
+    """
+    Creates many policies in one request.
+    """
+    return await batch_response(request, Policy, insert_policy)
+
+@app.post("/claims/batch")
+async def create_claims_batch(request: Request):
+    """
+    Creates many claims in one request. Claims are checked against the
+    running coverage total of their policy in input order.
+    """
+    return await batch_response(request, Claim, insert_claim)
 
 
 @app.get("/policyholder/{policyholder_id}")
@@ -103,40 +387,123 @@ def get_policyholder(policyholder_id: int):
     """
     Retrieves a policyholder by ID.
     """
-    if policyholder_id not in policyholders:
+    policyholder = store.shard(policyholder_id).policyholders.get(policyholder_id)
+    if policyholder is None:
         raise HTTPException(status_code=404, detail="Policyholder not found.")
-    return policyholders[policyholder_id]
+    return respond(policyholder)
+
+# Listing endpoints: without paging parameters they return a policyholder's full
+# history as before. Passing limit, cursor, status, fields or format switches to
+# cursor pagination ordered by ID: {"items": [...], "next_cursor": id | null}.
+# format=ndjson streams every matching item after the cursor, one JSON object
+# per line, reading a page at a time so server memory stays bounded.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 500
+
+def parse_fields(fields: Optional[str], model) -> Optional[List[str]]:
+    """
+    Parses a comma-separated field projection, rejecting unknown fields.
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = set(names) - {"id", *model.__annotations__}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return names
+
+def project(entity_id: int, entity, names: Optional[List[str]]) -> dict:
+    """
+    Returns the entity as a dict with its ID, restricted to `names` if given.
+    """
+    if names is None:
+        return {"id": entity_id, **entity.dict()}
+    return {name: entity_id if name == "id" else getattr(entity, name) for name in names}
+
+def list_response(shard, pager, cursor: Optional[int], limit: Optional[int], names: Optional[List[str]], format: str):
+    """
+    Builds a paginated JSON response or a streaming NDJSON response from
+    `pager(after, limit) -> (items, next_cursor)`, which must be called with
+    the shard lock held.
+    """
+    if format == "ndjson":
+        def stream():
+            after = cursor
+            while True:
+                with shard.lock:
+                    items, after = pager(after, STREAM_PAGE_SIZE)
+                    lines = b"".join(dumps(project(entity_id, entity, names)) + b"\n" for entity_id, entity in items)
+                if lines:
+                    yield lines
+                if after is None:
+                    return
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'.")
+    with shard.lock:
+        items, next_cursor = pager(cursor, limit or DEFAULT_PAGE_SIZE)
+        return respond({"items": [project(entity_id, entity, names) for entity_id, entity in items], "next_cursor": next_cursor})
 
 @app.get("/policyholder/{policyholder_id}/claims")
-def get_claims_by_policyholder(policyholder_id: int):
-    if policyholder_id not in claims:
-        raise HTTPException(status_code=404, detail="Claims not found for this policyholder.")
-    
-    # Collecting claims per policyholder and policy
-    filtered_claims = {}
-    for policy_id, policy_claims in claims[policyholder_id].items():
-        for claim_id, claim in policy_claims.items():
-            filtered_claims[claim_id] = claim
+def get_claims_by_policyholder(
+    policyholder_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[str] = None,
+):
+    """
+    Retrieves the claims of a policyholder, optionally paginated by claim ID.
+    """
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if not shard.claims.has_policyholder(policyholder_id):
+            raise HTTPException(status_code=404, detail="Claims not found for this policyholder.")
+        
+        if limit is None and cursor is None and status is None and fields is None and format is None:
+            # Claims are indexed per policyholder, so no walk over every policy is needed.
+            # The fast path renders inside respond() while the lock is held; with
+            # CLAIMS_FAST_RESPONSES=0 FastAPI serializes after it is released, so
+            # the mapping is copied to keep concurrent inserts out of the listing.
+            return respond(dict(shard.claims.for_policyholder(policyholder_id)))
     
-    return filtered_claims
+    names = parse_fields(fields, Claim)
+    pager = lambda after, size: shard.claims.page(policyholder_id, after, size, status)
+    return list_response(shard, pager, cursor, limit, names, format or "json")
 
 
 
 @app.get("/policyholder/{policyholder_id}/policies")
-def get_policies_by_policyholder(policyholder_id: int):
+def get_policies_by_policyholder(
+    policyholder_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[str] = None,
+):
     """
-    Retrieves all policies for a given policyholder by their ID.
+    Retrieves all policies for a given policyholder by their ID, optionally
+    paginated by policy ID.
     """
-    if policyholder_id not in policyholders:
-        raise HTTPException(status_code=404, detail="Policyholder not found.")
-    
-    # Retrieve all policies for this policyholder
-    policies_for_policyholder = policies.get(policyholder_id, {})
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if shard.policyholders.get(policyholder_id) is None:
+            raise HTTPException(status_code=404, detail="Policyholder not found.")
+        
+        if limit is None and cursor is None and status is None and fields is None and format is None:
+            # Retrieve all policies for this policyholder
+            policies_for_policyholder = dict(shard.policies.get(policyholder_id, {}))
+            return respond({
+                "policyholder_id": policyholder_id,
+                "policies": policies_for_policyholder
+            })
     
-    return {
-        "policyholder_id": policyholder_id,
-        "policies": policies_for_policyholder
-    }
+    names = parse_fields(fields, Policy)
+    pager = lambda after, size: shard.policies_page(policyholder_id, after, size, status)
+    return list_response(shard, pager, cursor, limit, names, format or "json")
 
 
 @app.put("/policy/{policyholder_id}/{policy_id}")
@@ -144,54 +511,67 @@ def update_policy(policyholder_id: int, policy_id: int, policy: Policy):
     """
     Updates a specific policy by policyholder ID and policy ID.
     """
-    if policyholder_id not in policies or policy_id not in policies[policyholder_id]:
-        raise HTTPException(status_code=404, detail="Policy not found.")
-    
-    policies[policyholder_id][policy_id] = policy
-    return {"detail": "Policy updated successfully."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if policy_id not in shard.policies.get(policyholder_id, {}):
+            raise HTTPException(status_code=404, detail="Policy not found.")
+        
+        shard.put_policy(policyholder_id, policy_id, policy)
+        lsn = persist("put_policy", policyholder_id, policy_id, policy.dict())
+    storage.wait_for(lsn)
+    return respond({"detail": "Policy updated successfully."})
 
 @app.put("/claim/{policyholder_id}/{policy_id}/{claim_id}")
 def update_claim(policyholder_id: int, policy_id: int, claim_id: int, claim: Claim):
     """
     Updates a specific claim by policyholder ID, policy ID, and claim ID.
     """
-    if policyholder_id not in claims or policy_id not in claims[policyholder_id] or claim_id not in claims[policyholder_id][policy_id]:
-        raise HTTPException(status_code=404, detail="Claim not found.")
-    
-    claims[policyholder_id][policy_id][claim_id] = claim
-    return {"detail": "Claim updated successfully."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if not shard.claims.contains(policyholder_id, policy_id, claim_id):
+            raise HTTPException(status_code=404, detail="Claim not found.")
+        
+        shard.claims.replace(policyholder_id, policy_id, claim_id, claim)
+        lsn = persist("put_claim", policyholder_id, policy_id, claim_id, claim.dict())
+    storage.wait_for(lsn)
+    return respond({"detail": "Claim updated successfully."})
 
 @app.put("/policyholder/{policyholder_id}")
 def update_policyholder(policyholder_id: int, policyholder: Policyholder):
     """
     Updates a specific policyholder by policyholder ID.
     """
-    if policyholder_id not in policyholders:
-        raise HTTPException(status_code=404, detail="Policyholder not found.")
-    
-    policyholders[policyholder_id] = policyholder
-    return {"detail": "Policyholder updated successfully."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if shard.policyholders.get(policyholder_id) is None:
+            raise HTTPException(status_code=404, detail="Policyholder not found.")
+        
+        shard.policyholders[policyholder_id] = policyholder
+        lsn = persist("put_policyholder", policyholder_id, policyholder.dict())
+    storage.wait_for(lsn)
+    return respond({"detail": "Policyholder updated successfully."})
 
 @app.delete("/policyholder/{policyholder_id}")
 def delete_policyholder(policyholder_id: int):
     """
     Deletes a specific policyholder by ID.
     """
-    if policyholder_id not in policyholders:
-        raise HTTPException(status_code=404, detail="Policyholder not found.")
-    
-    # Check if there are active policies
-    if policyholder_id in policies and any(policy.status == "active" for policy in policies[policyholder_id].values()):
-        raise HTTPException(status_code=400, detail="Cannot delete policyholder with active policies.")
-    
-    # Delete the policyholder and their policies, if any
-    del policyholders[policyholder_id]
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if shard.policyholders.get(policyholder_id) is None:
+            raise HTTPException(status_code=404, detail="Policyholder not found.")
+        
+        # Check if there are active policies
+        if any(policy.status == "active" for policy in shard.policies.get(policyholder_id, {}).values()):
+            raise HTTPException(status_code=400, detail="Cannot delete policyholder with active policies.")
+        
+        # Delete the policyholder and their policies, if any
+        del shard.policyholders[policyholder_id]
+        shard.delete_policies(policyholder_id)  # Delete all policies for this policyholder
+        lsn = persist("del_policyholder", policyholder_id)
+    storage.wait_for(lsn)
     
-    # Delete policies only if the policyholder exists in policies
-    if policyholder_id in policies:
-        del policies[policyholder_id]  # Delete all policies for this policyholder
-    
-    return {"detail": f"Policyholder {policyholder_id} deleted successfully."}
+    return respond({"detail": f"Policyholder {policyholder_id} deleted successfully."})
 
 
 @app.delete("/policy/{policyholder_id}/{policy_id}")
@@ -199,42 +579,53 @@ def delete_policy(policyholder_id: int, policy_id: int):
     """
     Deletes a specific policy by policyholder ID and policy ID.
     """
-    if policyholder_id not in policies or policy_id not in policies[policyholder_id]:
-        raise HTTPException(status_code=404, detail="Policy not found.")
-    
-    # Check if there are linked claims
-    linked_claims = [claim for claim in claims.get(policyholder_id, {}).get(policy_id, {}).values()]
-    if linked_claims:
-        raise HTTPException(status_code=400, detail="Cannot delete policy with linked claims.")
-    
-    del policies[policyholder_id][policy_id]
-    return {"detail": f"Policy {policy_id} for policyholder {policyholder_id} deleted successfully."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if policy_id not in shard.policies.get(policyholder_id, {}):
+            raise HTTPException(status_code=404, detail="Policy not found.")
+        
+        # Check if there are linked claims
+        if shard.claims.has_claims(policyholder_id, policy_id):
+            raise HTTPException(status_code=400, detail="Cannot delete policy with linked claims.")
+        
+        shard.delete_policy(policyholder_id, policy_id)
+        lsn = persist("del_policy", policyholder_id, policy_id)
+    storage.wait_for(lsn)
+    return respond({"detail": f"Policy {policy_id} for policyholder {policyholder_id} deleted successfully."})
 
 @app.delete("/claim/{policyholder_id}/{policy_id}/{claim_id}")
 def delete_claim(policyholder_id: int, policy_id: int, claim_id: int):
     """
     Deletes a specific claim by policyholder ID, policy ID, and claim ID.
     """
-    if policyholder_id not in claims or policy_id not in claims[policyholder_id] or claim_id not in claims[policyholder_id][policy_id]:
-        raise HTTPException(status_code=404, detail="Claim not found.")
-    
-    del claims[policyholder_id][policy_id][claim_id]
-    return {"detail": f"Claim {claim_id} for policyholder {policyholder_id} and policy {policy_id} deleted successfully."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if not shard.claims.contains(policyholder_id, policy_id, claim_id):
+            raise HTTPException(status_code=404, detail="Claim not found.")
+        
+        shard.claims.delete(claim_id)
+        lsn = persist("del_claim", policyholder_id, policy_id, claim_id)
+    storage.wait_for(lsn)
+    return respond({"detail": f"Claim {claim_id} for policyholder {policyholder_id} and policy {policy_id} deleted successfully."})
 
 @app.put("/claim/{policyholder_id}/{policy_id}/{claim_id}/status")
 def change_claim_status(policyholder_id: int, policy_id: int, claim_id: int, status: str):
     """
     Changes the status of a specific claim.
     """
-    if policyholder_id not in claims or policy_id not in claims[policyholder_id] or claim_id not in claims[policyholder_id][policy_id]:
-        raise HTTPException(status_code=404, detail="Claim not found.")
-    
-    claims[policyholder_id][policy_id][claim_id].status = status
-    return {"detail": f"Claim status updated to {status}."}
+    shard = store.shard(policyholder_id)
+    with shard.lock:
+        if not shard.claims.contains(policyholder_id, policy_id, claim_id):
+            raise HTTPException(status_code=404, detail="Claim not found.")
+        
+        shard.claims.set_status(claim_id, status)
+        lsn = persist("put_claim", policyholder_id, policy_id, claim_id, shard.claims.get(claim_id).dict())
+    storage.wait_for(lsn)
+    return respond({"detail": f"Claim status updated to {status}."})
 
 @app.get("/")
 def health_check():
     """
     Health check endpoint to verify server status.
     """
-    return {"status": "ok"}
+    return respond({"status": "ok"})
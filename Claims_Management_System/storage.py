@@ -0,0 +1,333 @@
+import fcntl
+import json
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the standard library
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+# A record is a JSON array: [operation, *keys, data?]. Every operation is an
+# idempotent put or delete of a whole entity, so replaying a record that is
+# already reflected in a snapshot leaves the state unchanged.
+Record = list
+
+
+class Storage:
+    """
+    Storage engine interface used by the claims service.
+
+    The service keeps its working set in memory and hands every state change to
+    the storage engine as a record. On startup the engine yields the records
+    needed to rebuild that state.
+    """
+
+    def recover(self) -> Iterator[Record]:
+        """
+        Yields the records needed to rebuild the in-memory state.
+        """
+        return iter(())
+
+    def append(self, record: Record, wait: bool = True) -> int:
+        """
+        Persists a state change and returns its log sequence number.
+        """
+        return self.append_many([record], wait)
+
+    def append_many(self, records: List[Record], wait: bool = True) -> int:
+        """
+        Persists several state changes at once and returns the sequence number
+        of the last one. With wait=False the caller must call wait_for() before
+        acknowledging the change.
+        """
+        return 0
+
+    def wait_for(self, lsn: int):
+        """
+        Blocks until every record up to `lsn` is durable.
+        """
+
+    def attach(self, snapshot_source: Callable[[], Iterable[Record]]):
+        """
+        Registers the callable that returns the full current state as records.
+        The callable runs on a background thread while requests keep mutating
+        the state, so it must copy what it reads under the state's own locks.
+        """
+
+    def close(self):
+        """
+        Flushes pending writes and releases resources.
+        """
+
+
+class MemoryStorage(Storage):
+    """
+    No-op engine: state lives only in process memory and is lost on restart.
+    """
+
+
+class WALStorage(Storage):
+    """
+    Append-only write-ahead log with periodic compacted snapshots.
+
+    Records are appended to the current log segment and made durable by a
+    background thread that fsyncs once per `sync_interval`, so concurrent
+    writers share a single fsync (group commit). Every `snapshot_every`
+    records the state is written to a new snapshot, the log rolls over to a
+    new segment and segments covered by the snapshot are deleted. Recovery
+    memory-maps the newest snapshot and replays only the log written after it.
+
+    A data directory has a single owner: the engine holds an exclusive lock on
+    it, and a second process opening the same directory fails instead of
+    interleaving segments with the first.
+    """
+
+    SNAPSHOT_PREFIX = "snapshot-"
+    SEGMENT_PREFIX = "wal-"
+
+    def __init__(self, data_dir: str, sync_interval: float = 0.005,
+                 snapshot_every: int = 500_000, durable: bool = True):
+        self.data_dir = data_dir
+        self.sync_interval = sync_interval
+        self.snapshot_every = snapshot_every
+        self.durable = durable
+        os.makedirs(data_dir, exist_ok=True)
+        self._dir_lock = os.open(self._path("LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._dir_lock)
+            raise RuntimeError(f"{data_dir} is already in use by another process; "
+                               "give each worker its own data directory (CLAIMS_WORKER_ID)")
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._lsn = 0            # Sequence number of the last appended record
+        self._synced_lsn = 0     # Sequence number of the last fsynced record
+        self._since_snapshot = 0
+        self._snapshot_source: Optional[Callable[[], Iterable[Record]]] = None
+        self._snapshotting = False
+        self._segment = None
+        self._closed = False
+        self._flusher = None
+
+    # Paths -----------------------------------------------------------------
+
+    def _files(self, prefix: str) -> List[str]:
+        names = [n for n in os.listdir(self.data_dir) if n.startswith(prefix) and not n.endswith(".tmp")]
+        return sorted(names, key=lambda n: int(n[len(prefix):].split(".")[0]))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.data_dir, name)
+
+    # Recovery --------------------------------------------------------------
+
+    def recover(self) -> Iterator[Record]:
+        """
+        Yields the records of the latest snapshot followed by the log tail,
+        then opens a fresh log segment for new writes.
+        """
+        snapshot_lsn = 0
+        snapshots = self._files(self.SNAPSHOT_PREFIX)
+        if snapshots:
+            latest = snapshots[-1]
+            snapshot_lsn = int(latest[len(self.SNAPSHOT_PREFIX):].split(".")[0])
+            yield from self._read_snapshot(self._path(latest))
+        self._lsn = snapshot_lsn
+        for name in self._files(self.SEGMENT_PREFIX):
+            for lsn, record in self._read_segment(self._path(name)):
+                if lsn > snapshot_lsn:
+                    self._lsn = lsn
+                    yield record
+        self._synced_lsn = self._lsn
+        self._open_segment()
+
+    def _read_snapshot(self, path: str) -> Iterator[Record]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for line in iter(data.readline, b""):
+                    yield _loads(line)
+
+    def _read_segment(self, path: str) -> Iterator[tuple]:
+        end = 0
+        with open(path, "r+b") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("record has no line terminator")
+                    entry = _loads(line)
+                except ValueError:
+                    # A torn write at the tail of the log; nothing after it was acknowledged.
+                    # Cut it off so records appended to this segment later are not
+                    # glued onto it and lost on the next recovery.
+                    f.truncate(end)
+                    os.fsync(f.fileno())
+                    break
+                end += len(line)
+                yield entry[0], entry[1:]
+
+    # Writing ---------------------------------------------------------------
+
+    def _open_segment(self):
+        self._segment = open(self._path(f"{self.SEGMENT_PREFIX}{self._lsn + 1}.log"), "ab")
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+            self._flusher.start()
+
+    def attach(self, snapshot_source: Callable[[], Iterable[Record]]):
+        self._snapshot_source = snapshot_source
+
+    def append_many(self, records: List[Record], wait: bool = True) -> int:
+        """
+        Appends several records to the log. When the engine is durable and
+        `wait` is set, the call returns once a single fsync by the group commit
+        thread covers all of them.
+
+        Callers that hold a lock while appending (to keep the log in the same
+        order as their in-memory changes) pass wait=False and call wait_for()
+        after releasing it, so the lock is never held across an fsync.
+        """
+        if not records:
+            return self._lsn
+        lines = [_dumps([0, *record]) for record in records]
+        with self._lock:
+            for line in lines:
+                self._lsn += 1
+                self._segment.write(b"[%d%s\n" % (self._lsn, line[2:]))
+            lsn = self._lsn
+            self._since_snapshot += len(lines)
+            snapshot_due = (self._snapshot_source is not None and not self._snapshotting
+                            and self._since_snapshot >= self.snapshot_every)
+            if snapshot_due:
+                self._snapshotting = True
+                self._since_snapshot = 0
+                self._roll_segment()
+        if snapshot_due:
+            threading.Thread(target=self._write_snapshot, args=(lsn,), name="wal-snapshot", daemon=True).start()
+        if wait:
+            self.wait_for(lsn)
+        return lsn
+
+    def wait_for(self, lsn: int):
+        if not self.durable:
+            return
+        with self._lock:
+            while self._synced_lsn < lsn and not self._closed:
+                self._synced.wait()
+
+    def _roll_segment(self):
+        # Called with the lock held: records after this point go to a new segment
+        self._sync_locked()
+        self._segment.close()
+        self._open_segment()
+
+    def _sync_locked(self):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._synced_lsn = self._lsn
+        self._synced.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            with self._lock:
+                if self._closed:
+                    return
+                if self._synced_lsn >= self._lsn:
+                    continue
+                target = self._lsn
+                self._segment.flush()
+                # fsync a duplicate descriptor outside the lock so writers can keep
+                # appending; a segment roll may close the original meanwhile.
+                fd = os.dup(self._segment.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._lock:
+                if target > self._synced_lsn:
+                    self._synced_lsn = target
+                    self._synced.notify_all()
+
+    def snapshot(self):
+        """
+        Writes a snapshot of the current state synchronously.
+        """
+        with self._lock:
+            self._since_snapshot = 0
+            self._roll_segment()
+            lsn = self._lsn
+            self._snapshotting = True
+        self._write_snapshot(lsn)
+
+    def _write_snapshot(self, lsn: int):
+        # The snapshot is fuzzy: writes keep flowing while it is taken, and any
+        # change it misses or includes early is covered by replaying the log
+        # from `lsn` on, since every record is an idempotent put or delete.
+        try:
+            final = self._path(f"{self.SNAPSHOT_PREFIX}{lsn}.jsonl")
+            tmp = final + ".tmp"
+            with open(tmp, "wb") as f:
+                for record in self._snapshot_source():
+                    f.write(_dumps(record))
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, final)
+            self._compact(lsn)
+        finally:
+            with self._lock:
+                self._snapshotting = False
+
+    def _compact(self, lsn: int):
+        for name in self._files(self.SNAPSHOT_PREFIX):
+            if int(name[len(self.SNAPSHOT_PREFIX):].split(".")[0]) < lsn:
+                os.remove(self._path(name))
+        # A segment is covered by the snapshot when the next segment starts at or before lsn + 1
+        segments = self._files(self.SEGMENT_PREFIX)
+        starts = [int(n[len(self.SEGMENT_PREFIX):].split(".")[0]) for n in segments]
+        for name, next_start in zip(segments, starts[1:]):
+            if next_start <= lsn + 1:
+                os.remove(self._path(name))
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None and not self._segment.closed:
+                self._sync_locked()
+                self._segment.close()
+            self._closed = True
+            self._synced.notify_all()
+        if self._dir_lock is not None:
+            os.close(self._dir_lock)
+            self._dir_lock = None
+
+
+def open_storage(data_dir: Optional[str] = None) -> Storage:
+    """
+    Returns the storage engine configured by the CLAIMS_DATA_DIR environment
+    variable, or an in-memory engine when it is unset. When CLAIMS_WORKER_ID
+    is set the engine uses that worker's own subdirectory.
+    """
+    data_dir = data_dir or os.environ.get("CLAIMS_DATA_DIR")
+    if not data_dir:
+        return MemoryStorage()
+    worker_id = os.environ.get("CLAIMS_WORKER_ID")
+    if worker_id is not None:
+        data_dir = os.path.join(data_dir, f"worker-{int(worker_id)}")
+    return WALStorage(
+        data_dir,
+        sync_interval=float(os.environ.get("CLAIMS_WAL_SYNC_INTERVAL", "0.005")),
+        snapshot_every=int(os.environ.get("CLAIMS_SNAPSHOT_EVERY", "500000")),
+    )
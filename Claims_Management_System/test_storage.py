@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from storage import WALStorage
+
+
+class WALStorageTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = directory.name
+
+    def reopen(self):
+        storage = WALStorage(self.data_dir, durable=False)
+        records = list(storage.recover())
+        return storage, records
+
+    def segment(self):
+        segments = [name for name in os.listdir(self.data_dir) if name.startswith(WALStorage.SEGMENT_PREFIX)]
+        return os.path.join(self.data_dir, max(segments, key=lambda name: int(name[len(WALStorage.SEGMENT_PREFIX):].split(".")[0])))
+
+    def test_records_written_after_a_torn_first_record_survive_recovery(self):
+        storage, records = self.reopen()
+        self.assertEqual(records, [])
+        storage.close()
+        # A crash part-way through the first record of the newest segment
+        with open(self.segment(), "ab") as f:
+            f.write(b'[1,"put_policyholder",1,{"na')
+
+        storage, records = self.reopen()
+        self.assertEqual(records, [])
+        storage.append_many([["put_policyholder", 1, {"name": "a"}], ["put_policyholder", 2, {"name": "b"}]])
+        storage.close()
+
+        for _ in range(2):
+            storage, records = self.reopen()
+            storage.close()
+            self.assertEqual(records, [["put_policyholder", 1, {"name": "a"}], ["put_policyholder", 2, {"name": "b"}]])
+
+    def test_torn_tail_after_complete_records_is_cut_off(self):
+        storage, _ = self.reopen()
+        storage.append(["put_policyholder", 1, {"name": "a"}])
+        storage.close()
+        with open(self.segment(), "ab") as f:
+            f.write(b'[2,"put_policyholder",2,{"name":"b"}]')  # complete JSON, but no terminator
+
+        storage, records = self.reopen()
+        storage.append(["put_policyholder", 3, {"name": "c"}])
+        storage.close()
+        storage, records = self.reopen()
+        storage.close()
+        self.assertEqual(records, [["put_policyholder", 1, {"name": "a"}], ["put_policyholder", 3, {"name": "c"}]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
-from typing import List
+import os
+
+from common.item_store import DuplicateItemError, ItemStore
+from common.metrics import install_metrics
 
 app = FastAPI()
+install_metrics(app, "http")
 
 class Item(BaseModel):
     name: str
@@ -29,7 +33,8 @@ class Item(BaseModel):
         return {"name": self.name, "description": self.description}
 
 
-stored_items: List[Item] = []
+# Items indexed by name; ITEM_DUPLICATES picks the duplicate-name policy (allow, replace, reject)
+stored_items = ItemStore(duplicates=os.environ.get("ITEM_DUPLICATES", "allow"))
 
 @app.get("/")
 async def read_root():
@@ -42,15 +47,19 @@ async def read_root():
 async def get_data():
     """
     Fetch all stored items with only public fields.
+    The serialized payload is cached by the store until the next write.
     """
-    return {"stored_items": [item.public_dict() for item in stored_items]}
+    return Response(content=stored_items.snapshot(), media_type="application/json")
 
 @app.post("/api/items/")
 async def create_item(item: Item):
     """
-    Add a new item to the stored_items list and print the private name.
+    Add a new item to the stored_items store and print the private name.
     """
-    stored_items.append(item)
+    try:
+        stored_items.add(item)
+    except DuplicateItemError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     item.print_name()  # Call the print_name function to display the private name
     return {"message": "Item added successfully."}  # No need to return the name or description here
 
@@ -59,8 +68,7 @@ async def delete_item(item_name: str):
     """
     Delete an item by its name.
     """
-    global stored_items
-    stored_items = [item for item in stored_items if item.name != item_name]
+    stored_items.delete(item_name)
     return {"message": f"Item with name '{item_name}' deleted successfully."}
 
 def main():
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+
+from upstream_client import UpstreamClient
+
+POSTS = [{"userId": 1, "id": i, "title": f"title {i}", "body": "body " * 20} for i in range(100)]
+
+
+async def start_stub(port: int, delay: float) -> web.AppRunner:
+    """Starts a local stand-in for the posts API."""
+    body = json.dumps(POSTS)
+
+    async def list_posts(request):
+        if delay:
+            await asyncio.sleep(delay)
+        return web.Response(text=body, content_type="application/json")
+
+    async def create_post(request):
+        if delay:
+            await asyncio.sleep(delay)
+        data = await request.json()
+        return web.json_response({**data, "id": 101}, status=201)
+
+    app = web.Application()
+    app.router.add_get("/posts", list_posts)
+    app.router.add_post("/posts", create_post)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def session_per_request(url: str, count: int, parallel: int) -> float:
+    """The previous fetch_data behaviour: a new ClientSession (and connection) per call."""
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def one():
+        async with semaphore:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    await response.json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return count / (time.perf_counter() - start)
+
+
+async def pooled(url: str, count: int, parallel: int) -> float:
+    """The shared UpstreamClient, driven through fan_out."""
+    async with UpstreamClient(limit_per_host=parallel) as client:
+        start = time.perf_counter()
+        results = await client.fan_out((("GET", url, None) for _ in range(count)), max_parallel=parallel)
+        elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        raise errors[0]
+    return count / elapsed
+
+
+async def main(args):
+    runner = await start_stub(args.port, args.delay)
+    url = f"http://127.0.0.1:{args.port}/posts"
+    try:
+        for parallel in args.parallel:
+            before = await session_per_request(url, args.requests, parallel)
+            after = await pooled(url, args.requests, parallel)
+            print(f"parallel={parallel:<4} session-per-request {before:>9,.0f} req/s   "
+                  f"pooled {after:>9,.0f} req/s   speedup {after / before:.1f}x")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request sessions with the pooled upstream client.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--parallel", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--delay", type=float, default=0.0, help="Stub server latency in seconds")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
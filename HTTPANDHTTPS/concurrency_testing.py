@@ -1,48 +1,306 @@
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
 
-BASE_URL = "http://127.0.0.1:8000/api"
+import aiohttp
 
-def create_item(name, description):
-    """Send a POST request to create an item."""
-    response = requests.post(f"{BASE_URL}/items/", json={"name": name, "description": description})
-    return {"task": "create", "name": name, "status": response.status_code, "response": response.json()}
+from common.histogram import Histogram
 
-def delete_item(name):
-    """Send a DELETE request to delete an item."""
-    response = requests.delete(f"{BASE_URL}/items/{name}")
-    return {"task": "delete", "name": name, "status": response.status_code, "response": response.json()}
+BASE_URL = "http://127.0.0.1:8000"
 
-def get_data():
-    """Send a GET request to fetch all items."""
-    response = requests.get(f"{BASE_URL}/data")
-    return {"task": "fetch", "status": response.status_code, "response": response.json()}
+OPERATIONS = ("create", "delete", "fetch")
 
-def test_concurrent_tasks():
-    """Test multiple concurrent tasks on the API."""
-    print("Starting concurrent task tests...\n")
+# Request shapes of the apps in this repository. `{name}` is replaced with a
+# fresh item name in create bodies, and `{name}`/`{id}` in delete and fetch
+# paths with the name and the "id" returned by an earlier create.
+PROFILES = {
+    # HTTP.py, HTTPS_server.py and natandservices/webserver.py
+    "items": {
+        "create_path": "/api/items/",
+        "create_body": '{"name": "{name}", "description": "Description for {name}"}',
+        "delete_path": "/api/items/{name}",
+        "fetch_path": "/api/data",
+    },
+    # Claims_Management_System/server.py (or router.py in front of it)
+    "claims": {
+        "create_path": "/policyholder/",
+        "create_body": '{"name": "{name}", "email": "{name}@example.com"}',
+        "delete_path": "/policyholder/{id}",
+        "fetch_path": "/policyholder/{id}",
+    },
+    # get_post_public_api.py, which has no delete endpoint
+    "posts": {
+        "create_path": "/create_post",
+        "create_body": '{"title": "{name}", "body": "Body for {name}", "userId": 1}',
+        "delete_path": None,
+        "fetch_path": "/get_posts",
+    },
+}
 
-    tasks = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Create multiple items concurrently
-        for i in range(5):
-            tasks.append(executor.submit(create_item, f"item{i}", f"Description for item{i}"))
 
-        # Delete items concurrently
-        for i in range(3):
-            tasks.append(executor.submit(delete_item, f"item{i}"))
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parses a request mix such as "create=1,delete=1,fetch=8" into weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}', expected one of {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the request mix needs at least one positive weight")
+    return mix
 
-        # Fetch data concurrently
-        for _ in range(5):
-            tasks.append(executor.submit(get_data))
 
-        # Wait for all tasks to complete
-        for future in as_completed(tasks):
-            result = future.result()
-            print(f"Task: {result['task']}, Name: {result.get('name', 'N/A')}, Status: {result['status']}, Response: {result['response']}")
+class Stats:
+    """Latency histograms, status counts and errors for one measured phase."""
+
+    def __init__(self):
+        self.latency = {op: Histogram() for op in OPERATIONS}
+        self.statuses: Dict[str, Dict[int, int]] = {op: {} for op in OPERATIONS}
+        self.errors: Dict[str, int] = {}
+        self.dropped = 0
+        self.elapsed = 0.0
+
+    def record(self, op: str, status: int, latency_ns: int):
+        self.latency[op].record(latency_ns)
+        statuses = self.statuses[op]
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def record_error(self, error: BaseException):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, title: str):
+        total = Histogram()
+        print(f"\n{title}: {self.elapsed:.1f}s")
+        print(f"{'operation':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}{'max ms':>10}  statuses")
+        for op in OPERATIONS:
+            hist = self.latency[op]
+            if not hist.count:
+                continue
+            total.merge(hist)
+            p = hist.percentiles((50, 90, 99, 99.9, 100))
+            statuses = ", ".join(f"{status}: {count}" for status, count in sorted(self.statuses[op].items()))
+            print(f"{op:<10}{hist.count:>10}{hist.count / self.elapsed:>10.0f}"
+                  + "".join(f"{v / 1e6:>10.2f}" for v in p.values()) + f"  {statuses}")
+        print(f"{'total':<10}{total.count:>10}{total.count / self.elapsed:>10.0f}")
+        if self.errors:
+            print("Errors: " + ", ".join(f"{name}: {count}" for name, count in sorted(self.errors.items())))
+        if self.dropped:
+            print(f"Dropped arrivals (max in flight reached): {self.dropped}")
+        if total.count:
+            print("\nLatency distribution (all operations):")
+            print(total.distribution())
+
+
+class LoadGenerator:
+    """
+    Drives create/delete/fetch traffic against an item API over keep-alive
+    connections.
+
+    Closed-loop mode runs `concurrency` workers that each send the next request
+    as soon as the previous one completes, which measures peak throughput.
+    Open-loop mode starts requests at a fixed arrival rate regardless of how
+    fast the server answers, and measures latency from each request's intended
+    start time, so a stalled server shows up in the tail instead of silently
+    lowering the offered load (coordinated omission).
+    """
+
+    def __init__(self, base_url: str, mix: Dict[str, float], create_path: str, create_body: str,
+                 delete_path: Optional[str], fetch_path: str, verify_ssl: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.ops = [op for op in OPERATIONS if mix.get(op)]
+        self.weights = [mix[op] for op in self.ops]
+        self.create_url = self.base_url + create_path
+        self.create_body = create_body
+        self.delete_url = self.base_url + (delete_path or "")
+        self.fetch_url = self.base_url + fetch_path
+        self.verify_ssl = verify_ssl
+        self.names = itertools.count()
+        # (name, id) of items created and not yet deleted, so deletes and
+        # fetches hit existing items
+        self.created = deque()
+
+    def session(self, connections: int) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections,
+                                         ssl=None if self.verify_ssl else False)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+
+    def choose(self) -> str:
+        return random.choices(self.ops, self.weights)[0]
+
+    async def issue(self, session: aiohttp.ClientSession, op: str, stats: Optional[Stats], start_ns: int):
+        try:
+            if op == "create":
+                name = f"load-{next(self.names)}"
+                request = session.post(self.create_url, data=self.create_body.replace("{name}", name).encode(),
+                                       headers={"Content-Type": "application/json"})
+            elif op == "delete":
+                name, item_id = self.created.popleft() if self.created else ("load-missing", 0)
+                request = session.delete(self.delete_url.format(name=name, id=item_id))
+            else:
+                name, item_id = self.created[-1] if self.created else ("load-missing", 0)
+                request = session.get(self.fetch_url.format(name=name, id=item_id))
+            async with request as response:
+                body = await response.read()  # Drain the body so the connection is reused
+                status = response.status
+            if op == "create" and status < 300:
+                self.created.append((name, created_id(body)))
+            if stats is not None:
+                stats.record(op, status, time.perf_counter_ns() - start_ns)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if stats is not None:
+                stats.record_error(e)
+
+    async def closed_loop(self, duration: float, concurrency: int, stats: Optional[Stats]):
+        deadline = time.perf_counter() + duration
+        async with self.session(concurrency) as session:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    await self.issue(session, self.choose(), stats, time.perf_counter_ns())
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(self, duration: float, rate: float, max_in_flight: int, stats: Optional[Stats]):
+        interval_ns = int(1e9 / rate)
+        in_flight = set()
+        async with self.session(max_in_flight) as session:
+            start_ns = time.perf_counter_ns()
+            end_ns = start_ns + int(duration * 1e9)
+            sent = 0
+            while True:
+                now = time.perf_counter_ns()
+                # Start every arrival that is due, even if the loop woke up late
+                due = min((now - start_ns) // interval_ns + 1, (end_ns - start_ns) // interval_ns)
+                while sent < due:
+                    intended = start_ns + sent * interval_ns
+                    sent += 1
+                    if len(in_flight) >= max_in_flight:
+                        if stats is not None:
+                            stats.dropped += 1
+                        continue
+                    task = asyncio.ensure_future(self.issue(session, self.choose(), stats, intended))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                next_ns = start_ns + sent * interval_ns
+                if next_ns >= end_ns:
+                    break
+                await asyncio.sleep(max(0, next_ns - time.perf_counter_ns()) / 1e9)
+            if in_flight:
+                await asyncio.wait(in_flight)
+
+    async def run(self, mode: str, duration: float, warmup: float, concurrency: int,
+                  rate: float, max_in_flight: int) -> Stats:
+        async def phase(seconds: float, stats: Optional[Stats]):
+            if mode == "closed":
+                await self.closed_loop(seconds, concurrency, stats)
+            else:
+                await self.open_loop(seconds, rate, max_in_flight, stats)
+
+        if warmup > 0:
+            print(f"Warming up for {warmup:.1f}s...")
+            await phase(warmup, None)
+        stats = Stats()
+        print(f"Measuring for {duration:.1f}s...")
+        start = time.perf_counter()
+        await phase(duration, stats)
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+
+def created_id(body: bytes):
+    """The "id" field of a create response, if it has one."""
+    try:
+        created = json.loads(body)
+    except ValueError:
+        return None
+    return created.get("id") if isinstance(created, dict) else None
+
+
+def load_app(target: str):
+    """
+    Imports an ASGI app given as "module:attr" or "path/to/file.py:attr". The
+    module's directory is added to sys.path so its sibling imports resolve.
+    """
+    module_name, _, attr = target.partition(":")
+    if module_name.endswith(".py") or os.sep in module_name:
+        path = os.path.abspath(module_name)
+        sys.path.insert(0, os.path.dirname(path))
+        module_name = os.path.splitext(os.path.basename(path))[0]
+    return getattr(importlib.import_module(module_name), attr or "app")
+
+
+def serve_in_process(app) -> tuple:
+    """Runs the app under uvicorn on a background thread and returns (server, thread, base_url)."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the FastAPI apps in this repository.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=BASE_URL, help="Base URL of a running server")
+    target.add_argument("--app", help="Serve an app in-process instead, e.g. HTTP.py:app or ../natandservices/webserver.py:app")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="items",
+                        help="Request shapes of the target app; the options below override single parts")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=32, help="Closed loop: number of concurrent workers")
+    parser.add_argument("--rate", type=float, default=1000, help="Open loop: request arrivals per second")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: cap on outstanding requests")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("create=1,delete=1,fetch=8"))
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--create-path")
+    parser.add_argument("--create-body", help="JSON body template for creates, with {name} substituted")
+    parser.add_argument("--delete-path", help="Path template for deletes, with {name} and {id} of a created item")
+    parser.add_argument("--fetch-path", help="Path template for fetches, with {name} and {id} of a created item")
+    parser.add_argument("--insecure", action="store_true", help="Skip TLS certificate checks (self-signed HTTPS_server.py)")
+    args = parser.parse_args()
+    requests = {key: getattr(args, key) or value for key, value in PROFILES[args.profile].items()}
+    if args.mix.get("delete") and not requests["delete_path"]:
+        parser.error(f"the {args.profile} profile has no delete endpoint; pass --delete-path or drop delete from --mix")
+
+    server = None
+    base_url = args.url
+    if args.app:
+        # The server shares this process (and its GIL) with the load generator,
+        # so absolute numbers are lower than against a separate uvicorn process.
+        server, thread, base_url = serve_in_process(load_app(args.app))
+
+    generator = LoadGenerator(base_url, args.mix, verify_ssl=not args.insecure, **requests)
+    load = f"{args.concurrency} workers" if args.mode == "closed" else f"{args.rate:.0f} req/s offered"
+    print(f"Target {base_url}, {args.mode} loop, {load}, mix {args.mix}")
+    try:
+        stats = asyncio.run(generator.run(args.mode, args.duration, args.warmup, args.concurrency,
+                                          args.rate, args.max_in_flight))
+        stats.report("Results")
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join()
 
-    print("\nConcurrent task tests completed.")
 
 if __name__ == "__main__":
-    print("Testing API with multiple concurrent tasks...\n")
-    test_concurrent_tasks()
+    main()
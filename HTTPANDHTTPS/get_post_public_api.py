@@ -4,8 +4,14 @@ from pydantic import BaseModel
 import aiohttp
 import asyncio
 import json
+import os
+
+from common.metrics import install_metrics
+from response_cache import ResponseCache
+from upstream_client import UpstreamClient
 
 app = FastAPI()
+install_metrics(app, "public_api_proxy")
 
 API_URL = "https://jsonplaceholder.typicode.com/posts"
 
@@ -14,24 +20,35 @@ class PostData(BaseModel):
     body: str
     userId: int
 
+# Shared upstream client: one connection pool for the lifetime of the application
+upstream = UpstreamClient.from_env()
+
+# Cache of upstream GET responses keyed on URL
+upstream_cache = ResponseCache(
+    max_entries=int(os.environ.get("UPSTREAM_CACHE_ENTRIES", "128")),
+    ttl=float(os.environ.get("UPSTREAM_CACHE_TTL", "30")),
+    stale_ttl=float(os.environ.get("UPSTREAM_CACHE_STALE_TTL", "300")),
+)
+
+@app.on_event("startup")
+async def open_upstream():
+    await upstream.start()
+
+@app.on_event("shutdown")
+async def close_upstream():
+    await upstream.close()
+
 # Asynchronous function to make GET or POST requests and handle errors
 async def fetch_data(url: str, method: str, json_data: dict = None):
     """
     Makes an asynchronous GET or POST request to the given URL and returns the response data.
+    Reuses pooled connections and retries transient failures.
     Handles errors including client response errors and timeouts.
     """
+    if method not in ('GET', 'POST'):
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, detail="Method not allowed")
     try:
-        async with aiohttp.ClientSession() as session:
-            if method == 'GET':
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    return await response.json()
-            elif method == 'POST':
-                async with session.post(url, json=json_data) as response:
-                    response.raise_for_status()
-                    return await response.json()
-            else:
-                raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, detail="Method not allowed")
+        return await upstream.request(method, url, json_data)
     except aiohttp.ClientResponseError as e:
         raise HTTPException(status_code=e.status, detail=f"Request failed: {e.message}")
     except asyncio.TimeoutError:
@@ -45,8 +62,9 @@ async def fetch_data(url: str, method: str, json_data: dict = None):
 async def get_posts():
     """
     Fetches and returns the first 5 posts from the external API.
+    Served from the cache; concurrent misses share a single upstream request.
     """
-    posts = await fetch_data(API_URL, 'GET')
+    posts = await upstream_cache.get_or_fetch(API_URL, lambda: fetch_data(API_URL, 'GET'))
     return {"status": "success", "posts": posts[:5]}
 
 
@@ -61,6 +79,15 @@ async def create_post(post_data: PostData):
     return {"status": "success", "created_post": created_post}
 
 
+# Cache hit/miss counters
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    Returns the upstream response cache counters.
+    """
+    return upstream_cache.snapshot()
+
+
 # A simple test route to check server functionality
 @app.get("/")
 async def test_async():
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class ResponseCache:
+    """
+    In-process async cache with TTL expiry, LRU eviction, request coalescing
+    and stale-while-revalidate.
+
+    An entry younger than `ttl` is served as is. Between `ttl` and
+    `ttl + stale_ttl` it is still served, while a single background task
+    refreshes it. Older entries are treated as misses. Concurrent misses for
+    the same key share one in-flight fetch instead of each calling upstream.
+    Failed fetches are never cached.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 30.0, stale_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (value, fetched_at), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                      "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for `key`, calling `fetch()` when it is missing
+        or expired. Exceptions raised by `fetch()` propagate to every waiter.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                if key not in self._in_flight:
+                    self.stats["refreshes"] += 1
+                    task = self._start_fetch(key, fetch)
+                    task.add_done_callback(self._log_refresh_error)
+                return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = self._start_fetch(key, fetch)
+        # Shield the shared fetch so a cancelled waiter does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def run():
+            try:
+                value = await fetch()
+                self._store(key, value)
+                return value
+            finally:
+                self._in_flight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._in_flight[key] = task
+        return task
+
+    def _log_refresh_error(self, task: asyncio.Task):
+        # Background refreshes keep serving the stale value on failure
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refresh_errors"] += 1
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        """
+        Drops a cached entry.
+        """
+        self._entries.pop(key, None)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the counters plus current size, for monitoring.
+        """
+        return {**self.stats, "entries": len(self._entries), "in_flight": len(self._in_flight)}
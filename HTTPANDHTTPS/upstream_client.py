@@ -0,0 +1,131 @@
+import asyncio
+import os
+import random
+from typing import Any, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+# Statuses worth retrying: the upstream may succeed on a later attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _RetryableStatus(Exception):
+    pass
+
+
+class UpstreamClient:
+    """
+    Application-lifetime HTTP client for upstream APIs.
+
+    One aiohttp.ClientSession is shared by every request, so TCP and TLS
+    connections are kept alive and reused. The connector caps the total
+    number of pooled connections and the number per host; requests beyond
+    that wait for a free connection. Failed requests are retried with
+    exponential backoff and full jitter.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, total_timeout: float = 10.0,
+                 connect_timeout: float = 3.0, retries: int = 3, backoff_base: float = 0.1,
+                 backoff_cap: float = 2.0, keepalive_timeout: float = 30.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.keepalive_timeout = keepalive_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls) -> "UpstreamClient":
+        """
+        Builds a client configured by the UPSTREAM_* environment variables.
+        """
+        return cls(
+            limit=int(os.environ.get("UPSTREAM_POOL_SIZE", "100")),
+            limit_per_host=int(os.environ.get("UPSTREAM_POOL_PER_HOST", "20")),
+            total_timeout=float(os.environ.get("UPSTREAM_TIMEOUT", "10")),
+            connect_timeout=float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "3")),
+            retries=int(os.environ.get("UPSTREAM_RETRIES", "3")),
+        )
+
+    async def start(self):
+        """
+        Opens the shared session. Must be called from the running event loop.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        """
+        Closes the session and every pooled connection.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self) -> "UpstreamClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def request(self, method: str, url: str, json_data: Any = None) -> Any:
+        """
+        Sends a request and returns the decoded JSON body.
+
+        GET requests are retried on connection errors, timeouts and retryable
+        statuses. Other methods are only retried when the connection could not
+        be established, since the upstream never saw the request then.
+        Raises aiohttp.ClientResponseError or asyncio.TimeoutError after the
+        last attempt.
+        """
+        if self.session is None:
+            await self.start()
+        idempotent = method == "GET"
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(method, url, json=json_data) as response:
+                    if response.status in RETRY_STATUSES and idempotent and attempt < self.retries:
+                        await response.read()  # Drain the body so the connection goes back to the pool
+                        raise _RetryableStatus()
+                    response.raise_for_status()
+                    return await response.json()
+            except _RetryableStatus:
+                pass
+            except aiohttp.ClientConnectorError:
+                if attempt >= self.retries:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not idempotent or attempt >= self.retries:
+                    raise
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def get(self, url: str) -> Any:
+        return await self.request("GET", url)
+
+    async def post(self, url: str, json_data: Any = None) -> Any:
+        return await self.request("POST", url, json_data)
+
+    async def fan_out(self, calls: Iterable[Tuple[str, str, Any]], max_parallel: int = 10) -> List[Any]:
+        """
+        Issues many (method, url, json_data) calls concurrently with at most
+        `max_parallel` in flight, and returns their results in input order.
+        A failed call yields its exception instead of a result.
+        """
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def run(method: str, url: str, json_data: Any):
+            async with semaphore:
+                return await self.request(method, url, json_data)
+
+        return await asyncio.gather(*(run(*call) for call in calls), return_exceptions=True)
@@ -0,0 +1,7 @@
+"""
+Modules shared by the services in this repository.
+
+Install once from the repository root with `pip install -e .` so that every
+service and benchmark can `import common` regardless of the directory it is
+started from.
+"""
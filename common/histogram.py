@@ -0,0 +1,128 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Percentiles printed by default in latency reports
+REPORT_PERCENTILES = (50.0, 75.0, 90.0, 99.0, 99.9, 99.99, 100.0)
+
+
+class Histogram:
+    """
+    HDR-style latency histogram with fixed relative precision.
+
+    Values (integers, e.g. nanoseconds) between `lowest` and `highest` are
+    counted in log-linear buckets: each power-of-two range is split into
+    enough linear sub-buckets to keep `significant_digits` decimal digits of
+    precision. Recording is a few integer operations and an index increment,
+    memory is fixed regardless of how many values are recorded, and
+    histograms from several workers can be merged exactly.
+    """
+
+    def __init__(self, lowest: int = 1_000, highest: int = 60_000_000_000, significant_digits: int = 3):
+        if lowest < 1 or highest < 2 * lowest:
+            raise ValueError("highest must be at least twice lowest, and lowest at least 1")
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_digits = significant_digits
+
+        largest_single_unit = 2 * 10 ** significant_digits
+        self._sub_bucket_magnitude = (largest_single_unit - 1).bit_length()
+        self._half_magnitude = self._sub_bucket_magnitude - 1
+        self._half_count = 1 << self._half_magnitude
+        self._unit_magnitude = lowest.bit_length() - 1
+        self._sub_bucket_mask = ((1 << self._sub_bucket_magnitude) - 1) << self._unit_magnitude
+
+        bucket_count = 1
+        smallest_untrackable = (1 << self._sub_bucket_magnitude) << self._unit_magnitude
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = [0] * ((bucket_count + 1) * self._half_count)
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        bucket = (value | self._sub_bucket_mask).bit_length() - self._unit_magnitude - self._half_magnitude - 1
+        sub_bucket = value >> (bucket + self._unit_magnitude)
+        return ((bucket + 1) << self._half_magnitude) + sub_bucket - self._half_count
+
+    def _value_range(self, index: int) -> Tuple[int, int]:
+        # Inverse of _index: the lowest and highest values counted at `index`
+        bucket = (index >> self._half_magnitude) - 1
+        sub_bucket = (index & (self._half_count - 1)) + self._half_count
+        if bucket < 0:
+            sub_bucket -= self._half_count
+            bucket = 0
+        shift = bucket + self._unit_magnitude
+        return sub_bucket << shift, ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1):
+        """
+        Counts `value` (clamped to [0, highest]) `count` times.
+        """
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        """
+        Adds every value counted by `other`, which must use the same settings.
+        """
+        if (other.lowest, other.highest, other.significant_digits) != (self.lowest, self.highest, self.significant_digits):
+            raise ValueError("Only histograms with the same range and precision can be merged")
+        for index, in_bucket in enumerate(other.counts):
+            if in_bucket:
+                self.counts[index] += in_bucket
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def value_at_percentile(self, percentile: float) -> int:
+        """
+        Returns the highest value equivalent to the given percentile (0-100),
+        i.e. at most that share of the recorded values is above it.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(percentile / 100.0 * self.count + 0.5))
+        seen = 0
+        for index, in_bucket in enumerate(self.counts):
+            seen += in_bucket
+            if seen >= rank:
+                return min(self._value_range(index)[1], self.max)
+        return self.max
+
+    def percentiles(self, percentiles: Iterable[float] = REPORT_PERCENTILES) -> Dict[float, int]:
+        return {p: self.value_at_percentile(p) for p in percentiles}
+
+    def distribution(self, scale: float = 1e6, unit: str = "ms",
+                     percentiles: Iterable[float] = REPORT_PERCENTILES) -> str:
+        """
+        Formats the percentile distribution as a table, with values divided by
+        `scale` (nanoseconds to milliseconds by default).
+        """
+        lines: List[str] = [f"{'percentile':>10}  {'value (' + unit + ')':>14}  {'count':>10}"]
+        for p in percentiles:
+            value = self.value_at_percentile(p)
+            below = sum(self.counts[:self._index(value) + 1]) if self.count else 0
+            lines.append(f"{p:>10.3f}  {value / scale:>14.3f}  {below:>10}")
+        lines.append(f"{'mean':>10}  {self.mean / scale:>14.3f}  {self.count:>10}")
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+import json
+import threading
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+except ImportError:  # orjson is optional; fall back to the standard library
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+# What to do when an item is added under a name that is already stored
+DUPLICATE_POLICIES = ("allow", "replace", "reject")
+
+
+class DuplicateItemError(ValueError):
+    pass
+
+
+class ItemStore:
+    """
+    Name-indexed item storage shared by the HTTP, HTTPS and NAT web servers.
+
+    Items are kept in insertion order with an index from name to items, so
+    adding and deleting are O(1) per item instead of rebuilding a list. The
+    serialized `/api/data` payload is cached and only rebuilt after a write.
+
+    Duplicate names are handled according to `duplicates`:
+    "allow" stores every item (delete removes all of them), "replace" swaps
+    the stored item in place, and "reject" raises DuplicateItemError.
+    """
+
+    def __init__(self, duplicates: str = "allow",
+                 public: Callable[[object], dict] = lambda item: item.public_dict()):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicates must be one of {DUPLICATE_POLICIES}")
+        self.duplicates = duplicates
+        self.public = public
+        self._lock = threading.Lock()
+        self._items: Dict[int, object] = {}           # sequence -> item, in insertion order
+        self._by_name: Dict[str, Dict[int, None]] = {}  # name -> {sequence: None}
+        self._next_seq = 0
+        self._snapshot: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[object]:
+        with self._lock:
+            return iter(list(self._items.values()))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def add(self, item):
+        """
+        Stores an item under `item.name`, applying the duplicate policy.
+        """
+        with self._lock:
+            existing = self._by_name.get(item.name)
+            if existing and self.duplicates == "reject":
+                raise DuplicateItemError(f"Item with name '{item.name}' already exists.")
+            if existing and self.duplicates == "replace":
+                self._items[next(iter(existing))] = item
+            else:
+                seq = self._next_seq
+                self._next_seq += 1
+                self._items[seq] = item
+                self._by_name.setdefault(item.name, {})[seq] = None
+            self._snapshot = None
+
+    def delete(self, name: str) -> int:
+        """
+        Removes every item with the given name and returns how many were removed.
+        """
+        with self._lock:
+            sequences = self._by_name.pop(name, None)
+            if not sequences:
+                return 0
+            for seq in sequences:
+                del self._items[seq]
+            self._snapshot = None
+            return len(sequences)
+
+    def snapshot(self) -> bytes:
+        """
+        Returns the serialized {"stored_items": [...]} payload, rebuilding it
+        only if the store changed since it was last built.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = _dumps({"stored_items": [self.public(item) for item in self._items.values()]})
+                snapshot = self._snapshot
+        return snapshot
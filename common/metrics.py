@@ -0,0 +1,182 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+# Latency histogram bucket upper bounds in seconds (Prometheus defaults plus a
+# few sub-millisecond buckets, since most in-memory endpoints finish there)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_BUCKETS_NS = [int(b * 1e9) for b in LATENCY_BUCKETS]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RouteStats:
+    """
+    Counters for one (method, route) pair. Updated on the event loop thread
+    only, so no locking is needed.
+    """
+
+    __slots__ = ("buckets", "count", "duration_ns", "errors", "request_bytes", "response_bytes")
+
+    def __init__(self):
+        # One slot per bucket plus the +Inf overflow
+        self.buckets = [0] * (len(_BUCKETS_NS) + 1)
+        self.count = 0
+        self.duration_ns = 0
+        # status class ("4xx", "5xx") -> count
+        self.errors: Dict[str, int] = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a latency quantile in seconds by interpolating inside the
+        bucket that contains it, the same way histogram_quantile does.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, upper in enumerate(LATENCY_BUCKETS):
+            in_bucket = self.buckets[index]
+            if seen + in_bucket >= rank and in_bucket:
+                return lower + (upper - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+
+class MetricsRegistry:
+    """
+    Per-route request metrics rendered in the Prometheus text format.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, duration_ns: int,
+                request_bytes: int, response_bytes: int):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = RouteStats()
+        stats.buckets[bisect_left(_BUCKETS_NS, duration_ns)] += 1
+        stats.count += 1
+        stats.duration_ns += duration_ns
+        stats.request_bytes += request_bytes
+        stats.response_bytes += response_bytes
+        if status >= 400:
+            status_class = f"{status // 100}xx"
+            stats.errors[status_class] = stats.errors.get(status_class, 0) + 1
+
+    def render(self) -> str:
+        lines: List[str] = []
+        service = self.service
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("http_requests_in_flight", "gauge", "Requests currently being served.")
+        lines.append(f'http_requests_in_flight{{service="{service}"}} {self.in_flight}')
+
+        routes = sorted(self.routes.items())
+        family("http_request_duration_seconds", "histogram", "Request latency by route.")
+        for (method, route), stats in routes:
+            labels = f'service="{service}",method="{method}",route="{route}"'
+            cumulative = 0
+            for upper, in_bucket in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += in_bucket
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.duration_ns / 1e9}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+
+        family("http_request_duration_quantile_seconds", "gauge", "Latency quantiles estimated from the histogram.")
+        for (method, route), stats in routes:
+            labels = f'service="{service}",method="{method}",route="{route}"'
+            for q in QUANTILES:
+                lines.append(f'http_request_duration_quantile_seconds{{{labels},quantile="{q}"}} {stats.quantile(q)}')
+
+        family("http_request_size_bytes_total", "counter", "Request body bytes received.")
+        for (method, route), stats in routes:
+            lines.append(f'http_request_size_bytes_total{{service="{service}",method="{method}",route="{route}"}} {stats.request_bytes}')
+
+        family("http_response_size_bytes_total", "counter", "Response body bytes sent.")
+        for (method, route), stats in routes:
+            lines.append(f'http_response_size_bytes_total{{service="{service}",method="{method}",route="{route}"}} {stats.response_bytes}')
+
+        family("http_request_errors_total", "counter", "Responses with a 4xx or 5xx status.")
+        for (method, route), stats in routes:
+            for status_class, count in sorted(stats.errors.items()):
+                lines.append(f'http_request_errors_total{{service="{service}",method="{method}",route="{route}",status="{status_class}"}} {count}')
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, payload sizes, errors and
+    in-flight requests. Routes are labelled with their path template (e.g.
+    /policyholder/{policyholder_id}) so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        response = [500, 0]  # status, body bytes
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.body":
+                response[1] += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                response[0] = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        start = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ns = time.perf_counter_ns() - start
+            registry.in_flight -= 1
+            # The router stores the matched route in the scope it was handed
+            route = scope.get("route")
+            request_bytes = 0
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    try:
+                        request_bytes = int(value)
+                    except ValueError:
+                        # A malformed header must not mask the response or its exception
+                        pass
+                    break
+            registry.observe(scope["method"], route.path if route is not None else "<unmatched>",
+                             response[0], duration_ns, request_bytes, response[1])
+
+
+def install_metrics(app: FastAPI, service: Optional[str] = None) -> MetricsRegistry:
+    """
+    Adds the metrics middleware to `app` and exposes the registry on GET /metrics.
+    """
+    registry = MetricsRegistry(service or app.title)
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    return registry
@@ -1,87 +1,1014 @@
-import socket
+import argparse
+import asyncio
+import errno
+import itertools
+import multiprocessing
+import os
 import random
+import signal
+import socket
+import struct
+import threading
+import time
+import traceback
+from collections import deque
+
+from control import ControlServer, RouterMetrics
+from event_log import DEBUG, ERROR, INFO, WARNING, EventLog
+from nat_table import NatTable, PortExhaustedError, PrivateAddressPool, SharedMappingArray, SharedNatTable
+
+# IP and port pools
+PRIVATE_IPS = [f"192.168.1.{i}" for i in range(2, 255)]  # Private IP pool
+PUBLIC_IPS = [f"203.0.113.{i}" for i in range(1, 10)]    # Public IP pool
+PUBLIC_PORTS = list(range(10000, 11000))                 # Public port pool
+
+# The Internet server's framing, in both directions: a 4-byte big-endian length and the payload
+FRAME_HEADER = struct.Struct("!I")
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the splice relay is Linux-only anyway
+    fcntl = None
+
+
+class BufferPool:
+    """
+    Reusable relay buffers, so steady-state relaying allocates nothing.
+    Buffers come back to the pool when a connection closes; at most
+    `max_free` idle buffers are kept.
+    """
+
+    def __init__(self, buffer_size=65536, max_free=1024):
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self._free = deque()
+
+    def acquire(self):
+        return self._free.pop() if self._free else bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        if len(self._free) < self.max_free:
+            self._free.append(buffer)
+
+
+class PipePool:
+    """
+    Reusable pipes for the splice relay. A pipe is only returned to the pool
+    once it has been fully drained, so any connection can use it next; pipes
+    that may still hold data are closed instead.
+    """
+
+    def __init__(self, pipe_size=65536, max_free=1024):
+        self.pipe_size = pipe_size
+        self.max_free = max_free
+        self._free = deque()
+
+    def acquire(self):
+        if self._free:
+            return self._free.pop()
+        read_fd, write_fd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, self.pipe_size)
+        except OSError:
+            pass  # Above /proc/sys/fs/pipe-max-size; keep the default size
+        return read_fd, write_fd
+
+    def release(self, pipe):
+        if len(self._free) < self.max_free:
+            self._free.append(pipe)
+        else:
+            self.discard(pipe)
+
+    def discard(self, pipe):
+        for fd in pipe:
+            os.close(fd)
+
+
+class FrameCounter:
+    """
+    Follows one direction of a connection through the Internet server's
+    framing (FRAME_HEADER), counting the frames completed so far.
+    """
+
+    __slots__ = ("frames", "header", "remaining")
 
-class NATRouter:
     def __init__(self):
-        # IP and port pools
-        self.private_ips = [f"192.168.1.{i}" for i in range(2, 255)]  # Private IP pool
-        self.public_ips = [f"203.0.113.{i}" for i in range(1, 10)]   # Public IP pool
-        self.public_ports = list(range(10000, 11000))               # Public port pool
-        self.nat_table = {}  # Maps (private IP, private port) -> (public IP, public port)
-
-    def assign_private_ip(self):
-        return random.choice(self.private_ips)
-
-    def assign_public_ip_port(self):
-        return random.choice(self.public_ips), random.choice(self.public_ports)
-
-    def handle_client(self, client_socket, server_address):
-        # Assign private IP and port for the client
-        private_ip = self.assign_private_ip()
-        private_port = client_socket.getsockname()[1]
-
-        # Assign public IP and port
-        public_ip, public_port = self.assign_public_ip_port()
-        self.nat_table[(private_ip, private_port)] = (public_ip, public_port)
-        print(f"[NAT TABLE] Mapped Private ({private_ip}:{private_port}) -> Public ({public_ip}:{public_port})")
-
-        # Connect to the Internet server
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-            server_socket.connect(server_address)
-
-            # Receive data from client and forward it to the server
-            client_data = client_socket.recv(1024)
-            print(f"[NAT Router] Forwarding data from client to server: {client_data.decode()}")
-            server_socket.send(client_data)
-
-            # Receive response from server and forward it back to the client
-            server_response = server_socket.recv(1024)
-            print(f"[NAT Router] Forwarding data from server to client: {server_response.decode()}")
-            client_socket.send(server_response)
+        self.frames = 0
+        self.header = b""   # Bytes of a frame header received so far
+        self.remaining = 0  # Payload bytes still due for the current frame
 
-    def start(self, bind_address, server_address):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as nat_socket:
-            nat_socket.bind(bind_address)
-            nat_socket.listen(1)
-            print(f"[NAT Router] Listening on {bind_address}")
-
-            client_socket, client_address = nat_socket.accept()
-            print(f"[NAT Router] Connection from {client_address}")
-            self.handle_client(client_socket, server_address)
+    def at_boundary(self):
+        return not self.header and not self.remaining
+
+    def feed(self, data):
+        offset, end = 0, len(data)
+        while offset < end:
+            if self.remaining:
+                step = min(self.remaining, end - offset)
+                self.remaining -= step
+                offset += step
+                if not self.remaining:
+                    self.frames += 1
+                continue
+            step = min(FRAME_HEADER.size - len(self.header), end - offset)
+            self.header += bytes(data[offset:offset + step])
+            offset += step
+            if len(self.header) == FRAME_HEADER.size:
+                (self.remaining,) = FRAME_HEADER.unpack(self.header)
+                self.header = b""
+                if not self.remaining:
+                    self.frames += 1
+
+
+class UpstreamPool:
+    """
+    Idle upstream connections kept open for reuse by later clients.
+
+    Only suitable for the Internet server's framed request/response protocol.
+    The router hands a connection back only at a response boundary: every
+    complete request the client sent has been answered and relayed, and no
+    frame is half-way through in either direction (see
+    NATRouter._relay_pooled); any other connection is closed. A connection is
+    also checked with a non-blocking MSG_PEEK before it is pooled and again
+    before it is reused: unread bytes or an EOF from the upstream mean it
+    cannot be shared and it is closed.
+    At most `size` idle connections are kept, and connections idle for
+    longer than `idle_timeout` seconds are closed.
+    """
+
+    def __init__(self, address, size=64, idle_timeout=30.0):
+        self.address = address
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = deque()  # (socket, idle since), most recently used on the right
+
+        # Counters
+        self.acquired = 0
+        self.reused = 0
+        self.connects = 0
+        self.connect_ns = 0  # Total time spent establishing new connections
+        self.discarded = 0   # Failed a health check
+        self.evicted = 0     # Idle for longer than idle_timeout or the pool was full
+
+    @staticmethod
+    def healthy(sock):
+        try:
+            sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return True  # Open, with nothing left unread
+        except OSError:
+            return False
+        return False  # Unread data or EOF
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        start = time.perf_counter_ns()
+        try:
+            await loop.sock_connect(sock, self.address)
+        except BaseException:
+            sock.close()
+            raise
+        self.connects += 1
+        self.connect_ns += time.perf_counter_ns() - start
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    async def acquire(self):
+        """
+        Returns a healthy idle connection, or a new one if none is left.
+        """
+        self.acquired += 1
+        while self._idle:
+            sock, _ = self._idle.pop()
+            if self.healthy(sock):
+                self.reused += 1
+                return sock
+            self.discarded += 1
+            sock.close()
+        return await self.connect()
+
+    def release(self, sock):
+        """
+        Returns a connection to the pool, or closes it if it cannot be reused.
+        """
+        if not self.healthy(sock):
+            self.discarded += 1
+            sock.close()
+        elif len(self._idle) >= self.size:
+            self.evicted += 1
+            sock.close()
+        else:
+            self._idle.append((sock, time.monotonic()))
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            self._idle.popleft()[0].close()
+            self.evicted += 1
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[0].close()
+
+    def stats(self):
+        """
+        Reuse ratio and the connect time saved, estimated from the mean
+        latency of the connections that had to be established.
+        """
+        mean_connect_ms = self.connect_ns / self.connects / 1e6 if self.connects else 0.0
+        return {
+            "acquired": self.acquired,
+            "reused": self.reused,
+            "reuse_ratio": self.reused / self.acquired if self.acquired else 0.0,
+            "connects": self.connects,
+            "mean_connect_ms": mean_connect_ms,
+            "connect_ms_saved": self.reused * mean_connect_ms,
+            "idle": len(self._idle),
+            "discarded": self.discarded,
+            "evicted": self.evicted,
+        }
+
+
+SPLICE_AVAILABLE = hasattr(os, "splice") and fcntl is not None
+RELAY_MODES = ("auto", "splice", "buffered")
+# splice errors meaning the sockets cannot be spliced, as opposed to a broken connection
+_SPLICE_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP}
+
+# Largest UDP payload over IPv4
+MAX_DATAGRAM = 65507
+
+
+class UdpFlow:
+    """
+    One UDP flow through the router: the client's address, its NAT mapping
+    and the connected socket that carries the flow to the server.
+    """
+
+    __slots__ = ("client", "mapping", "sock")
+
+    def __init__(self, client, mapping, sock):
+        self.client = client
+        self.mapping = mapping
+        self.sock = sock
+
+
+class NATRouter:
+    def __init__(self, buffer_size=65536, backlog=4096, drain_timeout=5.0, verbose=True, relay_mode="auto",
+                 idle_timeout=240.0, upstream_pool_size=0, upstream_idle_timeout=30.0,
+                 reuse_port=False, nat_table=None, log_level=None, log_format="text", log_sample_rates=None,
+                 control_address=None, udp=False, udp_idle_timeout=30.0, udp_buffer_size=4 * 2**20,
+                 udp_batch=64, udp_table=None, private_ips=None, upstream_response_timeout=10.0):
+        self.private_ips = PRIVATE_IPS if private_ips is None else private_ips
+        self.public_ips = PUBLIC_IPS
+        self.public_ports = PUBLIC_PORTS
+        # Each client host gets a private IP of its own while it has live mappings
+        self.private_addresses = PrivateAddressPool(self.private_ips)
+        # Maps (private IP, private port) <-> (public IP, public port); mappings
+        # left idle for idle_timeout seconds are expired and their ports reused.
+        # Worker processes pass a SharedNatTable over their slice of the ports.
+        if nat_table is None:
+            nat_table = NatTable(self.public_ips, self.public_ports, idle_timeout, tick=min(1.0, idle_timeout / 4))
+        self.nat_table = nat_table
+        self.nat_table.on_expire = self._mapping_expired
+        # Lets several worker processes listen on the same address (see start_workers)
+        self.reuse_port = reuse_port
+
+        # UDP datagrams on the same address, with mappings of their own that
+        # expire after udp_idle_timeout seconds without traffic either way
+        self.udp = udp
+        if udp_table is None:
+            udp_table = NatTable(self.public_ips, self.public_ports, udp_idle_timeout,
+                                 tick=min(1.0, udp_idle_timeout / 4))
+        self.udp_table = udp_table
+        self.udp_table.on_expire = self._close_udp_flow
+        self.udp_buffer_size = udp_buffer_size  # SO_RCVBUF/SO_SNDBUF, so bursts queue in the kernel
+        self.udp_batch = udp_batch  # Datagrams drained per readiness callback before yielding
+        self.udp_socket = None
+        self.udp_flows = {}  # Client address -> UdpFlow
+        self._udp_by_private = {}  # Private endpoint -> UdpFlow, to close flows as they expire
+        self._udp_buffer = memoryview(bytearray(MAX_DATAGRAM))
+
+        if relay_mode not in RELAY_MODES:
+            raise ValueError(f"relay_mode must be one of {RELAY_MODES}")
+        if relay_mode == "splice" and not SPLICE_AVAILABLE:
+            raise ValueError("relay_mode 'splice' needs os.splice (Linux, Python 3.10+)")
+        # "auto" splices when the platform supports it and falls back to buffered copies
+        self.relay_mode = relay_mode
+        self.use_splice = relay_mode != "buffered" and SPLICE_AVAILABLE
+        self.buffers = BufferPool(buffer_size)
+        self.pipes = PipePool(buffer_size)
+        # Opt-in reuse of upstream connections, for request/response protocols only
+        self.upstream_pool_size = upstream_pool_size
+        self.upstream_idle_timeout = upstream_idle_timeout
+        # Seconds a pooled connection waits, after the client's EOF, for responses still in flight
+        self.upstream_response_timeout = upstream_response_timeout
+        self.upstream_pool = None
+        self.backlog = backlog
+        self.drain_timeout = drain_timeout  # Seconds open relays get to finish on shutdown
+        self.verbose = verbose
+        # Structured events written by a background thread; verbose only picks the default level
+        if log_level is None:
+            log_level = INFO if verbose else WARNING
+        self.events = EventLog(level=log_level, fmt=log_format, sample_rates=log_sample_rates)
+        self._trace_chunks = False  # Emit a "bytes_forwarded" event per chunk (DEBUG level only)
+        # Kept up to date as traffic flows; served read-only on control_address if one is given
+        self.metrics = RouterMetrics()
+        self.control_address = control_address
+        self.control = None
+        self.bound_address = None
+        self.ready = threading.Event()  # Set once the router is accepting connections
+
+        # Counters
+        self.connections_total = 0
+        self.connections_active = 0
+        self.bytes_to_server = 0
+        self.bytes_to_client = 0
+        self.connections_rejected = 0
+        self.udp_flows_total = 0
+        self.datagrams_to_server = 0
+        self.datagrams_to_client = 0
+        self.datagrams_dropped = 0  # Socket buffer full, flow rejected or the server unreachable
+
+        self._loop = None
+        self._stop = None
+        self._connections = set()
+
+    def _map(self, table, client):
+        """
+        Maps a client to a public endpoint in `table`. The client's private
+        endpoint is its host's private IP and its own source port, and every
+        mapping holds one reference to that IP until it is released. Raises
+        PortExhaustedError, or AddressExhaustedError when no private IP is left.
+        """
+        private_ip = self.private_addresses.acquire(client[0])
+        private = (private_ip, client[1])
+        existing = private in table
+        try:
+            mapping = table.map(private)
+        except PortExhaustedError:
+            self.private_addresses.release(private_ip)
+            raise
+        if existing:
+            self.private_addresses.release(private_ip)
+        return mapping
+
+    def _mapping_expired(self, mapping):
+        self.private_addresses.release(mapping.private[0])
+
+    def _forwarded(self, mapping, to_server, n, elapsed_ns=None):
+        if to_server:
+            self.bytes_to_server += n
+            self.metrics.bytes_out.mark(n)
+            mapping.bytes_out += n
+        else:
+            self.bytes_to_client += n
+            self.metrics.bytes_in.mark(n)
+            mapping.bytes_in += n
+        if elapsed_ns is not None:
+            self.metrics.relay_latency.record(elapsed_ns)
+        if self._trace_chunks:
+            self.events.emit(DEBUG, "bytes_forwarded", private=mapping.private, public=mapping.public,
+                             direction="out" if to_server else "in", bytes=n)
+
+    async def _pump(self, source, destination, mapping, to_server, half_close=True, frames=None, stop=None):
+        """
+        Copies one direction of a connection until the source reaches EOF,
+        then half-closes the destination so the peer sees the EOF too
+        (unless `half_close` is False, for pooled upstream connections).
+        With a FrameCounter in `frames` every chunk is fed to it, and the
+        copy also ends as soon as `stop()` returns True after a chunk.
+
+        sock_sendall only returns once the chunk is fully written, and the
+        next chunk is not read before that, so a slow receiver slows the
+        sender down instead of growing a buffer in the router.
+        """
+        loop = self._loop
+        buffer = self.buffers.acquire()
+        view = memoryview(buffer)
+        try:
+            while True:
+                n = await loop.sock_recv_into(source, view)
+                if not n:
+                    break
+                read_at = time.perf_counter_ns()
+                await loop.sock_sendall(destination, view[:n])
+                self._forwarded(mapping, to_server, n, time.perf_counter_ns() - read_at)
+                if frames is not None:
+                    frames.feed(view[:n])
+                    if stop is not None and stop():
+                        break
+            if half_close:
+                try:
+                    destination.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass  # The destination is already gone
+        finally:
+            view.release()
+            self.buffers.release(buffer)
+
+    async def _wait_ready(self, sock, writable):
+        loop = self._loop
+        future = loop.create_future()
+        fd = sock.fileno()
+        add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+        add(fd, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            remove(fd)
+
+    async def _splice_pump(self, source, destination, mapping, to_server, half_close=True):
+        """
+        Same contract as _pump, but moves the data socket -> pipe -> socket
+        with os.splice so it never enters Python. A pipe is only taken from
+        the pool while a chunk is in flight, so idle connections hold none.
+        In "auto" mode a socket pair the kernel cannot splice falls back to
+        the buffered pump, which is safe because a refused splice consumes
+        nothing.
+        """
+        source_fd, destination_fd = source.fileno(), destination.fileno()
+        chunk = self.pipes.pipe_size
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        started = False
+        while True:
+            pipe = self.pipes.acquire()
+            pipe_read, pipe_write = pipe
+            try:
+                n = os.splice(source_fd, pipe_write, chunk, flags=flags)
+            except BlockingIOError:
+                self.pipes.release(pipe)
+                await self._wait_ready(source, False)
+                continue
+            except OSError as e:
+                self.pipes.release(pipe)
+                if started or self.relay_mode != "auto" or e.errno not in _SPLICE_UNSUPPORTED:
+                    raise
+                return await self._pump(source, destination, mapping, to_server, half_close)
+            started = True
+            if not n:
+                self.pipes.release(pipe)
+                break
+            read_at = time.perf_counter_ns()
+            pending = n
+            try:
+                while pending:
+                    try:
+                        pending -= os.splice(pipe_read, destination_fd, pending, flags=flags)
+                    except BlockingIOError:
+                        await self._wait_ready(destination, True)
+            except BaseException:
+                # The pipe may still hold data; never hand it to another connection
+                self.pipes.discard(pipe)
+                raise
+            self.pipes.release(pipe)
+            self._forwarded(mapping, to_server, n, time.perf_counter_ns() - read_at)
+        if half_close:
+            try:
+                destination.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass  # The destination is already gone
+
+    async def _relay(self, client_socket, server_socket, mapping):
+        """
+        Relays both directions until each side has sent EOF; if either
+        direction fails the connection is torn down.
+        """
+        pump = self._splice_pump if self.use_splice else self._pump
+        upstream = self._loop.create_task(pump(client_socket, server_socket, mapping, True))
+        downstream = self._loop.create_task(pump(server_socket, client_socket, mapping, False))
+        pending = {upstream, downstream}
+        failed = None
+        try:
+            while pending and failed is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failed = next((t.exception() for t in done if t.exception() is not None), None)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(upstream, downstream, return_exceptions=True)
+        if failed is not None:
+            raise failed
+
+    async def _relay_pooled(self, client_socket, server_socket, mapping):
+        """
+        Relays a connection over a pooled upstream connection, following the
+        frames in both directions. The client's EOF is not passed upstream;
+        once it arrives the relay keeps forwarding responses until every
+        complete request has been answered, then stops at that response
+        boundary. If that takes longer than upstream_response_timeout, the
+        EOF is passed on after all and the relay runs until the upstream
+        closes. Returns True only if the connection stopped at a boundary,
+        so a response still in flight can never reach the next client that
+        reuses the connection. Frames must be inspected, so this relay always
+        copies through buffers, even when splicing is enabled.
+        """
+        requests, responses = FrameCounter(), FrameCounter()
+        upstream = self._loop.create_task(
+            self._pump(client_socket, server_socket, mapping, True, False, requests))
+
+        def answered():
+            return (upstream.done() and requests.at_boundary() and responses.at_boundary()
+                    and responses.frames >= requests.frames)
+
+        downstream = self._loop.create_task(
+            self._pump(server_socket, client_socket, mapping, False, True, responses, answered))
+        try:
+            done, _ = await asyncio.wait({upstream, downstream}, return_when=asyncio.FIRST_COMPLETED)
+            if upstream not in done:
+                downstream.result()
+                return False  # The upstream sent EOF before the client finished
+            upstream.result()
+            if not requests.at_boundary():
+                return False  # The client closed half-way through a request
+            if not answered():
+                done, _ = await asyncio.wait({downstream}, timeout=self.upstream_response_timeout)
+                if not done:
+                    # Give up on reuse: pass the client's EOF on and relay the
+                    # remaining responses until the upstream closes, as without a pool
+                    try:
+                        server_socket.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        pass
+                    await downstream
+                    return False
+            if downstream.done():
+                downstream.result()
+            return answered() and responses.frames == requests.frames
+        finally:
+            for task in (upstream, downstream):
+                task.cancel()
+            await asyncio.gather(upstream, downstream, return_exceptions=True)
+
+    async def handle_client(self, client_socket, client_address, server_address):
+        # Assign private and public endpoints
+        try:
+            mapping = self._map(self.nat_table, client_address)
+        except PortExhaustedError as e:
+            self.connections_rejected += 1
+            self.metrics.rejected.mark()
+            self.events.emit(WARNING, "connection_rejected", client=client_address, reason=str(e))
+            client_socket.close()
+            return
+        if not mapping.flows:
+            self.events.emit(INFO, "mapping_created", private=mapping.private, public=mapping.public)
+        mapping.connections += 1
+        mapping.flows += 1
+        opened = time.perf_counter_ns()
+        bytes_out, bytes_in = mapping.bytes_out, mapping.bytes_in
+
+        self.connections_total += 1
+        self.connections_active += 1
+        pool = self.upstream_pool
+        server_socket = None
+        reusable = False
+        try:
+            # Connect to the Internet server, or reuse a pooled connection to it
+            connect_start = time.perf_counter_ns()
+            if pool is not None:
+                server_socket = await pool.acquire()
+            else:
+                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                server_socket.setblocking(False)
+                await self._loop.sock_connect(server_socket, server_address)
+                server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.metrics.connect_latency.record(time.perf_counter_ns() - connect_start)
+
+            if pool is not None:
+                reusable = await self._relay_pooled(client_socket, server_socket, mapping)
+            else:
+                await self._relay(client_socket, server_socket, mapping)
+        except OSError as e:
+            self.events.emit(WARNING, "relay_failed", private=mapping.private, public=mapping.public, error=str(e))
+        finally:
+            self.connections_active -= 1
+            duration = time.perf_counter_ns() - opened
+            self.metrics.closed.mark()
+            self.metrics.connection_duration.record(duration)
+            # The mapping stays reserved until it has been idle for idle_timeout
+            mapping.connections -= 1
+            self.nat_table.touch(mapping)
+            self.events.emit(INFO, "connection_closed", private=mapping.private, public=mapping.public,
+                             bytes_out=mapping.bytes_out - bytes_out, bytes_in=mapping.bytes_in - bytes_in,
+                             seconds=round(duration / 1e9, 6))
+            if server_socket is not None:
+                if reusable:
+                    pool.release(server_socket)
+                else:
+                    server_socket.close()
             client_socket.close()
 
+    def _udp_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            sock.setsockopt(socket.SOL_SOCKET, option, self.udp_buffer_size)
+        return sock
+
+    def _open_udp_flow(self, client, server_address):
+        try:
+            mapping = self._map(self.udp_table, client)
+        except PortExhaustedError as e:
+            self.metrics.rejected.mark()
+            self.events.emit(WARNING, "udp_flow_rejected", client=client, reason=str(e))
+            return None
+        private = mapping.private
+        existing = self._udp_by_private.get(private)
+        if existing is not None:
+            # The mapping belongs to another client's flow; replacing it would orphan that flow's socket
+            self.metrics.rejected.mark()
+            self.events.emit(WARNING, "udp_flow_rejected", client=client, private=private,
+                             reason=f"private endpoint in use by {existing.client}")
+            return None
+        sock = self._udp_socket()
+        try:
+            sock.connect(server_address)
+        except OSError as e:
+            sock.close()
+            self.udp_table.release(mapping)
+            self._mapping_expired(mapping)
+            self.events.emit(WARNING, "udp_flow_failed", private=private, error=str(e))
+            return None
+        flow = self.udp_flows[client] = self._udp_by_private[private] = UdpFlow(client, mapping, sock)
+        mapping.flows += 1
+        self.udp_flows_total += 1
+        self._loop.add_reader(sock.fileno(), self._udp_from_server, flow)
+        self.events.emit(INFO, "udp_flow_created", client=client, private=private, public=mapping.public)
+        return flow
+
+    def _close_udp_flow(self, mapping):
+        self._mapping_expired(mapping)
+        flow = self._udp_by_private.pop(mapping.private, None)
+        if flow is None:
+            return
+        del self.udp_flows[flow.client]
+        self._loop.remove_reader(flow.sock.fileno())
+        flow.sock.close()
+        self.events.emit(INFO, "udp_flow_expired", private=mapping.private, public=mapping.public,
+                         bytes_out=mapping.bytes_out, bytes_in=mapping.bytes_in)
+
+    def _udp_from_client(self, server_address):
+        """
+        Readiness callback for the router's UDP socket: drains up to
+        udp_batch datagrams with recvfrom_into and forwards each on its
+        flow's socket, creating the flow on its first datagram. Python has
+        no recvmmsg, so batching is this drain loop plus large kernel socket
+        buffers that absorb bursts between callbacks.
+        """
+        sock, view = self.udp_socket, self._udp_buffer
+        now = self.udp_table.clock()
+        for _ in range(self.udp_batch):
+            try:
+                n, client = sock.recvfrom_into(view)
+            except BlockingIOError:
+                return
+            except OSError:
+                continue  # An ICMP error for an earlier datagram
+            flow = self.udp_flows.get(client)
+            if flow is None:
+                flow = self._open_udp_flow(client, server_address)
+                if flow is None:
+                    self.datagrams_dropped += 1
+                    continue
+            flow.mapping.last_active = now
+            try:
+                flow.sock.send(view[:n])
+            except OSError:
+                self.datagrams_dropped += 1  # Send buffer full or the server unreachable
+                continue
+            self.datagrams_to_server += 1
+            self.metrics.datagrams_out.mark()
+            self._forwarded(flow.mapping, True, n)
+
+    def _udp_from_server(self, flow):
+        """
+        Readiness callback for a flow's socket: drains up to udp_batch
+        replies and translates each back to the client through the reverse
+        index (public endpoint -> private endpoint) before sending it from
+        the router's own address.
+        """
+        view = self._udp_buffer
+        for _ in range(self.udp_batch):
+            try:
+                n = flow.sock.recv_into(view)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.datagrams_dropped += 1  # The server's port is closed
+                continue
+            if self.udp_table.translate_inbound(flow.mapping.public) is None:
+                self.datagrams_dropped += 1  # The mapping has expired
+                return
+            try:
+                self.udp_socket.sendto(view[:n], flow.client)
+            except OSError:
+                self.datagrams_dropped += 1
+                continue
+            self.datagrams_to_client += 1
+            self.metrics.datagrams_in.mark()
+            self._forwarded(flow.mapping, False, n)
+
+    def _close_udp(self):
+        if self.udp_socket is None:
+            return
+        self._loop.remove_reader(self.udp_socket.fileno())
+        self.udp_socket.close()
+        for flow in self.udp_flows.values():
+            self._loop.remove_reader(flow.sock.fileno())
+            flow.sock.close()
+        self.udp_flows.clear()
+        self._udp_by_private.clear()
+
+    async def _accept_loop(self, nat_socket, server_address):
+        loop = self._loop
+        while True:
+            try:
+                client_socket, client_address = await loop.sock_accept(nat_socket)
+            except OSError as e:
+                # Typically EMFILE: back off instead of spinning until descriptors free up
+                self.events.emit(ERROR, "accept_failed", error=str(e))
+                await asyncio.sleep(0.1)
+                continue
+            self.metrics.accepted.mark()
+            self.events.emit(INFO, "connection_opened", client=client_address)
+            client_socket.setblocking(False)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            task = loop.create_task(self.handle_client(client_socket, client_address, server_address))
+            self._connections.add(task)
+            task.add_done_callback(self._connections.discard)
+
+    async def _expire_loop(self):
+        while True:
+            await asyncio.sleep(self.nat_table.wheel.tick)
+            expired = self.nat_table.expire()
+            if expired:
+                self.events.emit(INFO, "mappings_expired", count=expired, active=len(self.nat_table))
+            if self.udp_socket is not None:
+                self.udp_table.expire()
+            if self.upstream_pool is not None:
+                self.upstream_pool.evict_idle()
+
+    async def serve(self, bind_address, server_address):
+        """
+        Accepts clients and relays each to `server_address` concurrently
+        until stop() is called. On shutdown the router stops accepting, gives
+        open relays `drain_timeout` seconds to finish and cancels the rest.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        nat_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        nat_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            nat_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        nat_socket.setblocking(False)
+        nat_socket.bind(bind_address)
+        nat_socket.listen(self.backlog)
+        self.bound_address = nat_socket.getsockname()
+        if self.udp:
+            self.udp_socket = self._udp_socket()
+            if self.reuse_port:
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.udp_socket.bind(self.bound_address)
+            self._loop.add_reader(self.udp_socket.fileno(), self._udp_from_client, server_address)
+        if self.upstream_pool_size:
+            self.upstream_pool = UpstreamPool(server_address, self.upstream_pool_size, self.upstream_idle_timeout)
+        if self.control_address is not None:
+            self.control = ControlServer(self, self.control_address)
+            await self.control.start()
+            self.events.emit(WARNING, "control_listening", address=self.control.bound_address)
+        self._trace_chunks = self.events.enabled(DEBUG)
+        self.events.emit(WARNING, "listening", address=self.bound_address, relay="splice" if self.use_splice else "buffered")
+        self.ready.set()
+
+        accept_task = self._loop.create_task(self._accept_loop(nat_socket, server_address))
+        expire_task = self._loop.create_task(self._expire_loop())
+        try:
+            await self._stop.wait()
+        finally:
+            accept_task.cancel()
+            expire_task.cancel()
+            await asyncio.gather(accept_task, expire_task, return_exceptions=True)
+            nat_socket.close()
+            self._close_udp()
+            if self.control is not None:
+                await self.control.close()
+            if self._connections:
+                _, pending = await asyncio.wait(set(self._connections), timeout=self.drain_timeout)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            if self.upstream_pool is not None:
+                self.upstream_pool.close()
+            self.ready.clear()
+            self.events.emit(WARNING, "stopped", connections=self.connections_total,
+                             bytes_out=self.bytes_to_server, bytes_in=self.bytes_to_client)
+            self.events.close()
+
+    def stop(self):
+        """
+        Asks a running router to shut down. Safe to call from any thread.
+        """
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def start(self, bind_address, server_address):
+        try:
+            asyncio.run(self.serve(bind_address, server_address))
+        except KeyboardInterrupt:
+            pass
+
+    def mapping_stats(self, limit=None):
+        """
+        Byte and flow counters for every live mapping, or the first `limit`.
+        """
+        mappings = itertools.islice(self.nat_table.forward.values(), limit)
+        return [{"private": m.private, "public": m.public, "flows": m.flows, "connections": m.connections,
+                 "bytes_out": m.bytes_out, "bytes_in": m.bytes_in, "idle_s": round(time.monotonic() - m.last_active, 3)}
+                for m in mappings]
+
+
+def start_workers(bind_address, server_address, workers, idle_timeout=240.0, **router_options):
+    """
+    Runs the router in `workers` forked processes that all listen on
+    `bind_address` with SO_REUSEPORT, so the kernel spreads incoming
+    connections across them and each runs on its own core. The NAT table
+    lives in shared memory: every worker allocates from its own slice of the
+    public ports and can read the mappings of all the others. Blocks until
+    the workers exit; SIGINT or SIGTERM stops them all.
+    """
+    shared = SharedMappingArray(PUBLIC_IPS, PUBLIC_PORTS)
+    pids = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                table = SharedNatTable(shared, worker, workers, idle_timeout, tick=min(1.0, idle_timeout / 4))
+                options = dict(router_options)
+                # One control endpoint per worker: the next port, or the path with the worker number
+                control_address = options.get("control_address")
+                if isinstance(control_address, str):
+                    options["control_address"] = f"{control_address}.{worker}"
+                elif control_address is not None:
+                    options["control_address"] = (control_address[0], control_address[1] + worker)
+                udp_timeout = options.pop("udp_idle_timeout", 30.0)
+                udp_table = NatTable(PUBLIC_IPS, shared.partition(worker, workers), udp_timeout,
+                                     tick=min(1.0, udp_timeout / 4))
+                # Private IPs are split between workers too, so no two hosts share one
+                router = NATRouter(reuse_port=True, nat_table=table, udp_table=udp_table,
+                                   private_ips=PRIVATE_IPS[worker::workers], **options)
+                signal.signal(signal.SIGTERM, lambda *_: router.stop())
+                router.start(bind_address, server_address)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        pids.append(pid)
+
+    def forward(signum, _frame):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {signum: signal.signal(signum, forward) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for pid in pids:
+            while True:
+                try:
+                    os.waitpid(pid, 0)
+                    break
+                except InterruptedError:
+                    continue
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
 # Internet Server Simulation
-def internet_server(bind_address):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        server_socket.bind(bind_address)
-        server_socket.listen(1)
-        print(f"[Internet Server] Listening on {bind_address}")
+# Messages in both directions are frames (see FRAME_HEADER)
+
 
-        client_socket, client_address = server_socket.accept()
-        print(f"[Internet Server] Connection from {client_address}")
+class InternetDatagramProtocol(asyncio.DatagramProtocol):
+    """Answers each datagram with its own payload, or with `response` if that is not empty."""
 
-        # Receive data from the NAT router
-        data = client_socket.recv(1024)
-        print(f"[Internet Server] Received: {data.decode()}")
+    def __init__(self, response=b""):
+        self.response = response
 
-        # Send a response back to the NAT router
-        response = f"Hello from Internet Server!"
-        client_socket.send(response.encode())
-        print(f"[Internet Server] Response sent.")
-        client_socket.close()
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.transport.sendto(self.response or data, address)
+
+
+async def serve_internet(bind_address, response_size=0, latency=0.0, jitter=0.0, max_pipeline=1024, verbose=True):
+    """
+    Concurrent request/response server standing in for the Internet.
+
+    Each request frame is answered with a frame echoing its payload, or with
+    `response_size` bytes if that is set. Every response is delayed by
+    `latency` plus up to `jitter` seconds, measured from when its request
+    arrived, so pipelined requests wait concurrently while responses still
+    go out in request order. At most `max_pipeline` responses are queued
+    per connection before the server stops reading from it.
+    """
+    loop = asyncio.get_running_loop()
+    fixed_response = b"x" * response_size
+
+    async def handle(reader, writer):
+        peer = writer.get_extra_info("peername")
+        if verbose:
+            print(f"[Internet Server] Connection from {peer}")
+        queue = asyncio.Queue(max_pipeline)
+
+        async def respond():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                due, payload = item
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+                if queue.empty():
+                    await writer.drain()
+
+        responder = loop.create_task(respond())
+        try:
+            while True:
+                (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                payload = await reader.readexactly(length)
+                if verbose:
+                    print(f"[Internet Server] Received {length} bytes")
+                delay = latency + (random.uniform(0, jitter) if jitter else 0.0)
+                await queue.put((loop.time() + delay, fixed_response if response_size else payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # The client closed the connection
+        finally:
+            await queue.put(None)
+            try:
+                await responder
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    server = await asyncio.start_server(handle, *bind_address, backlog=4096)
+    # Datagrams to the same address are answered at once, without framing
+    await loop.create_datagram_endpoint(lambda: InternetDatagramProtocol(fixed_response), local_addr=bind_address)
+    print(f"[Internet Server] Listening on {bind_address} (TCP and UDP)")
+    async with server:
+        await server.serve_forever()
+
+
+def internet_server(bind_address, **options):
+    try:
+        asyncio.run(serve_internet(bind_address, **options))
+    except KeyboardInterrupt:
+        pass
 
 # Main Execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NAT router simulation.")
+    parser.add_argument("--workers", type=int, default=1, help="Router processes sharing the listen address")
+    parser.add_argument("--response-size", type=int, default=0, help="Internet server response size (0 echoes)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Internet server response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay of up to this many seconds")
+    parser.add_argument("--quiet", action="store_true", help="No per-connection output, for load tests")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"),
+                        help="Router event level (default: info, or warning with --quiet)")
+    parser.add_argument("--udp", action="store_true", help="Also forward UDP datagrams on the router's port")
+    parser.add_argument("--control", help="Serve read-only metrics on HOST:PORT or a Unix socket path")
+    parser.add_argument("--log-format", choices=("text", "json"), default="text")
+    parser.add_argument("--log-sample", type=float, default=1.0,
+                        help="Fraction of per-chunk bytes_forwarded events to keep at debug level")
+    args = parser.parse_args()
+    router_options = {"verbose": not args.quiet, "udp": args.udp, "log_format": args.log_format,
+                      "log_sample_rates": {"bytes_forwarded": args.log_sample}}
+    if args.log_level:
+        router_options["log_level"] = args.log_level.upper()
+    if args.control:
+        host, _, port = args.control.rpartition(":")
+        router_options["control_address"] = (host or "127.0.0.1", int(port)) if port.isdigit() else args.control
+
     # Define addresses
     nat_bind_address = ("127.0.0.1", 8888)  # NAT router
     internet_bind_address = ("127.0.0.1", 9999)  # Internet server
 
-    # Start the Internet server
+    # Start the Internet server in its own process, so it does not compete with the router
     print("[Starting Internet Server...]")
-    import threading
-    threading.Thread(target=internet_server, args=(internet_bind_address,), daemon=True).start()
+    multiprocessing.Process(target=internet_server, args=(internet_bind_address,), daemon=True,
+                            kwargs={"response_size": args.response_size, "latency": args.latency,
+                                    "jitter": args.jitter, "verbose": not args.quiet}).start()
 
     # Start the NAT router
     print("[Starting NAT Router...]")
-    nat_router = NATRouter()
-    nat_router.start(nat_bind_address, internet_bind_address)
+    if args.workers > 1:
+        start_workers(nat_bind_address, internet_bind_address, args.workers, **router_options)
+    else:
+        nat_router = NATRouter(**router_options)
+        nat_router.start(nat_bind_address, internet_bind_address)
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import signal
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from NAT import FRAME_HEADER, RELAY_MODES, SPLICE_AVAILABLE, NATRouter, start_workers
+
+
+class EchoProtocol(asyncio.Protocol):
+    """Echoes everything back, pausing reads while the peer is not keeping up."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+    def pause_writing(self):
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+    def eof_received(self):
+        return False  # Close once the echoed data is flushed
+
+
+def run_echo_server(address):
+    """Echo server standing in for the Internet server, run in its own process(es)."""
+    async def serve():
+        server = await asyncio.get_running_loop().create_server(EchoProtocol, *address, backlog=4096, reuse_port=True)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def run_router(bind_address, server_address, buffer_size, relay_mode, pool_size=0, mapping_timeout=240.0):
+    router = NATRouter(buffer_size=buffer_size, verbose=False, relay_mode=relay_mode, upstream_pool_size=pool_size,
+                       idle_timeout=mapping_timeout)
+    signal.signal(signal.SIGTERM, lambda *_: router.stop())
+    router.start(bind_address, server_address)
+    if router.upstream_pool is not None:
+        stats = router.upstream_pool.stats()
+        print(f"  upstream pool: {stats['reused']:,}/{stats['acquired']:,} reused ({stats['reuse_ratio']:.1%}), "
+              f"{stats['connects']:,} connects at {stats['mean_connect_ms']:.3f} ms, "
+              f"{stats['connect_ms_saved']:,.0f} ms of connect time saved")
+
+
+def cpu_seconds(pid: int) -> float:
+    """User plus system CPU time consumed so far by a process (Linux /proc)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit():
+    # Every relayed connection needs three descriptors across the processes
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+async def wait_listening(address, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(*address)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def stream(address, total: int, chunk: int) -> int:
+    """Sends `total` bytes over one connection while reading the echo, returns bytes echoed."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, address)
+    payload = memoryview(b"x" * chunk)
+    buffer = memoryview(bytearray(chunk))
+
+    async def send():
+        remaining = total
+        while remaining:
+            n = min(chunk, remaining)
+            await loop.sock_sendall(sock, payload[:n])
+            remaining -= n
+        sock.shutdown(socket.SHUT_WR)
+
+    async def receive():
+        received = 0
+        while True:
+            n = await loop.sock_recv_into(sock, buffer)
+            if not n:
+                return received
+            received += n
+
+    try:
+        _, received = await asyncio.gather(send(), receive())
+    finally:
+        sock.close()
+    return received
+
+
+async def throughput(address, connections: int, per_connection: int, chunk: int):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(stream(address, per_connection, chunk) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    return sum(results), elapsed, sum(results) == connections * per_connection
+
+
+async def hold_open(address, connections: int, message: bytes = b"ping" * 256):
+    """
+    Opens `connections` connections, completes a round trip on each and keeps
+    them all open until every one has done so. Returns how many succeeded.
+    """
+    all_open = asyncio.Event()
+    opened = 0
+    succeeded = 0
+
+    async def one():
+        nonlocal opened, succeeded
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(*address)
+            writer.write(message)
+            await writer.drain()
+            await reader.readexactly(len(message))
+            succeeded += 1
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Failed attempts count too, so the others are not left waiting
+            opened += 1
+            if opened == connections:
+                all_open.set()
+            await all_open.wait()
+            if writer is not None:
+                writer.close()
+
+    await asyncio.gather(*(one() for _ in range(connections)))
+    return succeeded
+
+
+async def request_response(address, requests: int, parallel: int, message: bytes = FRAME_HEADER.pack(60) + b"x" * 60):
+    """
+    Short connections that each send one request, read the response and
+    close, like HTTP/1.0 clients. The request is a single frame, so the
+    echoed response is one too and a pooled router can reuse the upstream
+    connection. Returns (connections/sec, mean latency ms, failures).
+    """
+    semaphore = asyncio.Semaphore(parallel)
+    total_ns = 0
+    failures = 0
+
+    async def one():
+        nonlocal total_ns, failures
+        async with semaphore:
+            start = time.perf_counter_ns()
+            try:
+                reader, writer = await asyncio.open_connection(*address)
+                writer.write(message)
+                await reader.readexactly(len(message))
+                writer.close()
+                await writer.wait_closed()
+            except (OSError, asyncio.IncompleteReadError):
+                failures += 1
+                return
+            total_ns += time.perf_counter_ns() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    completed = requests - failures
+    return completed / elapsed, total_ns / max(completed, 1) / 1e6, failures
+
+
+async def run_request_response(label, address, args):
+    await wait_listening(address)
+    rate, latency, failures = await request_response(address, args.requests, args.parallel)
+    failed = f", {failures:,} failed" if failures else ""
+    print(f"{label:<16} request/response: {rate:>9,.0f} connections/s, {latency:.3f} ms mean{failed}")
+
+
+def client_process(address, connections, per_connection, chunk):
+    """One load-generating process of the scaling phase: returns (bytes echoed, seconds)."""
+    async def run():
+        echoed, elapsed, _ = await throughput(address, connections, per_connection, chunk)
+        return echoed, elapsed
+
+    return asyncio.run(run())
+
+
+def run_scaling(address, args, workers):
+    router = multiprocessing.Process(target=start_workers, daemon=True,
+                                     args=(address, args.echo_address, workers),
+                                     kwargs={"verbose": False, "buffer_size": args.buffer_size})
+    router.start()
+    try:
+        asyncio.run(wait_listening(address))
+        per_process = max(1, args.connections // args.client_processes)
+        with ProcessPoolExecutor(args.client_processes) as pool:
+            results = list(pool.map(client_process, [address] * args.client_processes,
+                                    [per_process] * args.client_processes,
+                                    [args.bytes_per_connection] * args.client_processes,
+                                    [args.chunk] * args.client_processes))
+        echoed = sum(r[0] for r in results)
+        elapsed = max(r[1] for r in results)
+        print(f"{workers:>3} worker(s): {echoed / elapsed / 1e6:>9,.1f} MB/s echoed over "
+              f"{per_process * args.client_processes} connections from {args.client_processes} client processes")
+    finally:
+        router.terminate()
+        router.join()
+
+
+async def run_client(label, address, args, router_pid=None):
+    await wait_listening(address)
+    cpu_before = cpu_seconds(router_pid) if router_pid else 0.0
+    echoed, elapsed, complete = await throughput(address, args.connections, args.bytes_per_connection, args.chunk)
+    status = "" if complete else " (INCOMPLETE)"
+    line = f"{label:<16} throughput: {echoed / elapsed / 1e6:>9,.1f} MB/s echoed over {args.connections} connections"
+    if router_pid:
+        # The router relays every echoed byte twice: client -> server and back
+        cpu = cpu_seconds(router_pid) - cpu_before
+        line += f", router CPU {cpu / (2 * echoed / 1e9):.2f} s/GB relayed"
+    print(line + status)
+    start = time.perf_counter()
+    succeeded = await hold_open(address, args.concurrent)
+    print(f"{label:<16} concurrency: {succeeded:,}/{args.concurrent:,} simultaneous connections completed "
+          f"a round trip in {time.perf_counter() - start:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NAT router relay throughput and concurrency benchmark.")
+    parser.add_argument("--connections", type=int, default=64, help="Streams in the throughput phase")
+    parser.add_argument("--bytes-per-connection", type=int, default=64 * 2**20)
+    parser.add_argument("--chunk", type=int, default=65536, help="Client send size")
+    parser.add_argument("--buffer-size", type=int, default=65536, help="Router relay buffer size")
+    parser.add_argument("--concurrent", type=int, default=5000, help="Connections held open in the concurrency phase")
+    parser.add_argument("--modes", nargs="+", choices=RELAY_MODES[1:],
+                        default=["buffered", "splice"] if SPLICE_AVAILABLE else ["buffered"],
+                        help="Router relay modes to compare")
+    parser.add_argument("--requests", type=int, default=20_000, help="Short connections in the request/response phase")
+    parser.add_argument("--parallel", type=int, default=64, help="Concurrent short connections")
+    parser.add_argument("--pool-size", type=int, default=128, help="Upstream pool size for the pooled run")
+    parser.add_argument("--mapping-timeout", type=float, default=0.5,
+                        help="NAT mapping idle timeout; short so closed connections free their ports during the run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Router worker process counts for the scaling phase")
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count(),
+                        help="Load-generating processes in the scaling phase")
+    parser.add_argument("--echo-processes", type=int, default=os.cpu_count(),
+                        help="Echo server processes sharing its port")
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if args.concurrent * 3 > limit:
+        print(f"Warning: descriptor limit {limit} may be too low for {args.concurrent} connections")
+
+    echo_address = args.echo_address = ("127.0.0.1", free_port())
+    echoes = [multiprocessing.Process(target=run_echo_server, args=(echo_address,), daemon=True)
+              for _ in range(args.echo_processes)]
+    for echo in echoes:
+        echo.start()
+    try:
+        asyncio.run(run_client("direct", echo_address, args))
+        for mode in args.modes:
+            router_address = ("127.0.0.1", free_port())
+            router = multiprocessing.Process(target=run_router, daemon=True,
+                                             args=(router_address, echo_address, args.buffer_size, mode))
+            router.start()
+            try:
+                asyncio.run(run_client(f"via NAT ({mode})", router_address, args, router.pid))
+            finally:
+                router.terminate()
+                router.join()
+
+        # Short request/response connections, with and without upstream connection reuse
+        asyncio.run(run_request_response("direct", echo_address, args))
+        for label, pool_size in (("via NAT", 0), ("via NAT (pool)", args.pool_size)):
+            router_address = ("127.0.0.1", free_port())
+            router = multiprocessing.Process(target=run_router, daemon=True,
+                                             args=(router_address, echo_address, args.buffer_size, "auto", pool_size,
+                                                   args.mapping_timeout))
+            router.start()
+            try:
+                asyncio.run(run_request_response(label, router_address, args))
+            finally:
+                router.terminate()
+                router.join()
+
+        # SO_REUSEPORT worker processes sharing the NAT table
+        print(f"Scaling on {os.cpu_count()} CPU(s):")
+        for workers in args.workers:
+            run_scaling(("127.0.0.1", free_port()), args, workers)
+    finally:
+        for echo in echoes:
+            echo.terminate()
+            echo.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import random
+import time
+
+from nat_table import NatTable
+
+PUBLIC_IPS = [f"203.0.113.{i}" for i in range(1, 10)]
+PORTS = range(10000, 11000)
+
+
+def random_choice_allocate(used, attempts_limit=1_000_000):
+    """The previous approach with a collision check added: retry random picks until one is free."""
+    for attempts in range(1, attempts_limit + 1):
+        endpoint = (random.choice(PUBLIC_IPS), random.choice(PORTS))
+        if endpoint not in used:
+            return endpoint, attempts
+    raise RuntimeError("no free endpoint found")
+
+
+def table_latency(utilization: float, operations: int) -> float:
+    """Mean ns per map + release at the given fill level of the port space."""
+    table = NatTable(PUBLIC_IPS, PORTS)
+    capacity = table.allocator.capacity
+    filled = min(int(capacity * utilization), capacity - 1)
+    for i in range(filled):
+        table.map(("192.168.1.2", i))
+    start = time.perf_counter_ns()
+    for i in range(operations):
+        table.release(table.map(("192.168.1.3", i)))
+    return (time.perf_counter_ns() - start) / operations
+
+
+def random_choice_latency(utilization: float, operations: int) -> float:
+    capacity = len(PUBLIC_IPS) * len(PORTS)
+    used = set()
+    while len(used) < min(int(capacity * utilization), capacity - 1):
+        used.add(random_choice_allocate(used)[0])
+    start = time.perf_counter_ns()
+    for _ in range(operations):
+        endpoint, _ = random_choice_allocate(used)
+        used.add(endpoint)
+        used.discard(endpoint)
+    return (time.perf_counter_ns() - start) / operations
+
+
+def expiry_cost(mappings: int) -> float:
+    """Seconds to expire `mappings` idle mappings in one pass of the timer wheel."""
+    now = [0.0]
+    table = NatTable(PUBLIC_IPS, PORTS, idle_timeout=30, clock=lambda: now[0])
+    for i in range(mappings):
+        table.map(("192.168.1.2", i))
+    now[0] = 31.0
+    start = time.perf_counter()
+    expired = table.expire()
+    assert expired == mappings
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NAT port allocation latency versus port-space utilization.")
+    parser.add_argument("--operations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"Port space: {len(PUBLIC_IPS)} public IPs x {len(PORTS)} ports")
+    print(f"{'utilization':>12}{'NatTable ns/op':>18}{'random.choice ns/op':>22}")
+    for utilization in (0.0, 0.5, 0.9, 0.99, 0.999, 1.0):
+        table_ns = table_latency(utilization, args.operations)
+        random_ns = random_choice_latency(utilization, min(args.operations, 2_000))
+        print(f"{utilization:>12.1%}{table_ns:>18,.0f}{random_ns:>22,.0f}")
+    mappings = len(PUBLIC_IPS) * len(PORTS)
+    print(f"Expiring {mappings:,} idle mappings: {expiry_cost(mappings) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import multiprocessing
+import selectors
+import signal
+import socket
+import struct
+import time
+
+from NAT import InternetDatagramProtocol, NATRouter
+
+from common.histogram import Histogram
+
+# Each datagram starts with its send time, so replies need no bookkeeping
+STAMP = struct.Struct("!Q")
+
+
+def run_udp_echo(address):
+    """UDP echo server standing in for the Internet server, run in its own process."""
+    async def serve():
+        await asyncio.get_running_loop().create_datagram_endpoint(InternetDatagramProtocol, local_addr=address)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def run_router(bind_address, server_address, batch, flow_timeout):
+    router = NATRouter(verbose=False, udp=True, udp_batch=batch, udp_idle_timeout=flow_timeout)
+    signal.signal(signal.SIGTERM, lambda *_: router.stop())
+    router.start(bind_address, server_address)
+    print(f"  router: {router.datagrams_to_server:,} datagrams out, {router.datagrams_to_client:,} back, "
+          f"{router.datagrams_dropped:,} dropped, {router.udp_flows_total:,} flows")
+
+
+def free_port() -> int:
+    # A port free for both TCP and UDP, since the router listens on both
+    with socket.socket() as tcp, socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        tcp.bind(("127.0.0.1", 0))
+        port = tcp.getsockname()[1]
+        udp.bind(("127.0.0.1", port))
+        return port
+
+
+def wait_answering(address, timeout=10.0):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.settimeout(0.1)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            probe.sendto(b"probe", address)
+            try:
+                probe.recv(64)
+                return
+            except OSError:
+                continue
+    raise TimeoutError(f"{address} is not answering UDP")
+
+
+def flood(address, flows: int, window: int, duration: float, size: int, loss_timeout: float = 0.1):
+    """
+    Keeps `window` datagrams in flight on each of `flows` sockets (one flow
+    each through the router) for `duration` seconds. A flow that hears
+    nothing for `loss_timeout` counts its outstanding datagrams as lost and
+    refills its window. Returns (replies, lost, seconds, latency histogram).
+    """
+    padding = b"x" * max(size - STAMP.size, 0)
+    selector = selectors.DefaultSelector()
+    outstanding, last_heard = {}, {}
+    latency = Histogram()
+    replies = lost = 0
+
+    def send(sock, count):
+        for _ in range(count):
+            try:
+                sock.send(STAMP.pack(time.perf_counter_ns()) + padding)
+            except BlockingIOError:
+                break
+            outstanding[sock] += 1
+
+    for _ in range(flows):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 2**20)
+        sock.connect(address)
+        selector.register(sock, selectors.EVENT_READ)
+        outstanding[sock] = 0
+    start = time.perf_counter()
+    for sock in outstanding:
+        last_heard[sock] = start
+        send(sock, window)
+
+    while (now := time.perf_counter()) - start < duration:
+        for key, _ in selector.select(loss_timeout / 2):
+            sock = key.fileobj
+            received = 0
+            while True:
+                try:
+                    data = sock.recv(65536)
+                except BlockingIOError:
+                    break
+                except ConnectionRefusedError:
+                    continue
+                latency.record(time.perf_counter_ns() - STAMP.unpack_from(data)[0])
+                received += 1
+            replies += received
+            outstanding[sock] = max(outstanding[sock] - received, 0)
+            last_heard[sock] = now
+            send(sock, window - outstanding[sock])
+        for sock, heard in last_heard.items():
+            if now - heard > loss_timeout:
+                lost += outstanding[sock]
+                outstanding[sock] = 0
+                last_heard[sock] = now
+                send(sock, window)
+    elapsed = time.perf_counter() - start
+    for sock in outstanding:
+        selector.unregister(sock)
+        sock.close()
+    return replies, lost, elapsed, latency
+
+
+def report(label, result):
+    replies, lost, elapsed, latency = result
+    print(f"{label:<24}{replies / elapsed:>12,.0f} datagrams/s round trip, {lost:,} timed out, "
+          f"p50 {latency.value_at_percentile(50) / 1e3:,.0f} us, p99 {latency.value_at_percentile(99) / 1e3:,.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP datagrams per second through the NAT router on localhost.")
+    parser.add_argument("--flows", type=int, default=32, help="Client sockets, each a separate NAT flow")
+    parser.add_argument("--window", type=int, default=16, help="Datagrams in flight per flow")
+    parser.add_argument("--size", type=int, default=64, help="Datagram payload size in bytes")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 64],
+                        help="Router udp_batch sizes to compare (datagrams drained per readiness callback)")
+    parser.add_argument("--flow-timeout", type=float, default=30.0, help="Router UDP flow idle timeout")
+    args = parser.parse_args()
+
+    echo_address = ("127.0.0.1", free_port())
+    echo = multiprocessing.Process(target=run_udp_echo, args=(echo_address,), daemon=True)
+    echo.start()
+    try:
+        wait_answering(echo_address)
+        report("direct", flood(echo_address, args.flows, args.window, args.duration, args.size))
+        for batch in args.batches:
+            router_address = ("127.0.0.1", free_port())
+            router = multiprocessing.Process(target=run_router, daemon=True,
+                                             args=(router_address, echo_address, batch, args.flow_timeout))
+            router.start()
+            try:
+                wait_answering(router_address)
+                report(f"via NAT (batch {batch})",
+                       flood(router_address, args.flows, args.window, args.duration, args.size))
+            finally:
+                router.terminate()
+                router.join()
+    finally:
+        echo.terminate()
+        echo.join()
+
+
+if __name__ == "__main__":
+    main()
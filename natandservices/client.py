@@ -1,16 +1,114 @@
-import socket
+import argparse
+import asyncio
+import struct
+import time
+from collections import deque
+
+from common.histogram import Histogram
+
+# Same framing as the Internet server in NAT.py: 4-byte big-endian length, then the payload
+FRAME_HEADER = struct.Struct("!I")
+
 
 def client():
     # Client connects to the NAT router
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect(('127.0.0.1', 8888))  
+    async def run():
+        reader, writer = await asyncio.open_connection('127.0.0.1', 8888)
         message = "Hello from the client!"
         print(f"Client: Sending message to NAT Router: {message}")
-        s.sendall(message.encode())
+        writer.write(FRAME_HEADER.pack(len(message)) + message.encode())
 
         # Receive the response from the NAT router
-        data = s.recv(1024)
+        (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+        data = await reader.readexactly(length)
         print(f"Client: Received response: {data.decode()}")
+        writer.close()
+
+    asyncio.run(run())
+
+
+class LoadResult:
+    def __init__(self):
+        self.latency = Histogram()
+        self.messages = 0
+        self.bytes_received = 0
+        self.failed_connections = 0
+
+
+async def drive_connection(address, messages: int, pipeline: int, payload: bytes, result: LoadResult):
+    """
+    Sends `messages` frames over one connection with up to `pipeline` of them
+    awaiting a response, recording each round trip from send to response.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(*address)
+    except OSError:
+        result.failed_connections += 1
+        return
+    frame = FRAME_HEADER.pack(len(payload)) + payload
+    window = asyncio.Semaphore(pipeline)
+    sent_at = deque()
+
+    async def send():
+        for _ in range(messages):
+            await window.acquire()
+            sent_at.append(time.perf_counter_ns())
+            writer.write(frame)
+            await writer.drain()
+
+    async def receive():
+        for _ in range(messages):
+            (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            await reader.readexactly(length)
+            # Responses come back in request order
+            result.latency.record(time.perf_counter_ns() - sent_at.popleft())
+            result.messages += 1
+            result.bytes_received += FRAME_HEADER.size + length
+            window.release()
+
+    try:
+        await asyncio.gather(send(), receive())
+    except (OSError, asyncio.IncompleteReadError):
+        result.failed_connections += 1
+    finally:
+        writer.close()
+
+
+async def run_load(address, connections: int, messages: int, pipeline: int, size: int) -> tuple:
+    result = LoadResult()
+    payload = b"x" * size
+    start = time.perf_counter()
+    await asyncio.gather(*(drive_connection(address, messages, pipeline, payload, result)
+                           for _ in range(connections)))
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined load driver for the NAT router and Internet server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--connections", type=int, default=0,
+                        help="Concurrent connections; without it a single demo message is sent")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages per connection")
+    parser.add_argument("--pipeline", type=int, default=8, help="Messages in flight per connection")
+    parser.add_argument("--size", type=int, default=64, help="Request payload size in bytes")
+    args = parser.parse_args()
+
+    if not args.connections:
+        client()
+        return
+
+    address = (args.host, args.port)
+    print(f"Driving {address[0]}:{address[1]}: {args.connections} connections x {args.messages} messages, "
+          f"pipeline {args.pipeline}, {args.size}-byte requests")
+    result, elapsed = asyncio.run(run_load(address, args.connections, args.messages, args.pipeline, args.size))
+    print(f"{result.messages:,} responses in {elapsed:.2f}s: {result.messages / elapsed:,.0f} msg/s, "
+          f"{result.bytes_received / elapsed / 1e6:,.1f} MB/s received")
+    if result.failed_connections:
+        print(f"Failed connections: {result.failed_connections}")
+    print("\nEnd-to-end latency through the NAT hop:")
+    print(result.latency.distribution())
+
 
 if __name__ == "__main__":
-    client()
+    main()
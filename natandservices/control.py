@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from common.histogram import Histogram
+
+# Percentiles reported for each latency histogram
+METRIC_PERCENTILES = (50.0, 90.0, 99.0, 99.9, 100.0)
+
+
+class RateMeter:
+    """
+    Events per second over a sliding window of one-second buckets.
+
+    mark() adds to the bucket of the current second, reusing it once the
+    window has wrapped around, so updates are O(1) and memory is fixed.
+    Rates only count completed seconds.
+    """
+
+    def __init__(self, window: int = 61, clock=time.monotonic):
+        self.clock = clock
+        self.counts = [0] * window
+        self.seconds = [-1] * window  # The second each bucket currently counts
+        self.total = 0
+
+    def mark(self, n: int = 1):
+        second = int(self.clock())
+        index = second % len(self.counts)
+        if self.seconds[index] != second:
+            self.seconds[index] = second
+            self.counts[index] = 0
+        self.counts[index] += n
+        self.total += n
+
+    def rate(self, seconds: int = 10) -> float:
+        seconds = min(seconds, len(self.counts) - 1)
+        now = int(self.clock())
+        in_window = sum(count for second, count in zip(self.seconds, self.counts) if now - seconds <= second < now)
+        return in_window / seconds
+
+    def rates(self) -> Dict[str, float]:
+        return {f"{seconds}s": self.rate(seconds) for seconds in (1, 10, 60)}
+
+
+class RouterMetrics:
+    """
+    Counters and latency histograms updated as traffic is relayed.
+
+    Every update is a counter increment or a histogram record, so the cost
+    on the forwarding path does not depend on how often the metrics are
+    read; percentiles and rates are only computed by snapshot().
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.accepted = RateMeter()
+        self.closed = RateMeter()
+        self.rejected = RateMeter()
+        self.bytes_out = RateMeter()
+        self.bytes_in = RateMeter()
+        self.datagrams_out = RateMeter()
+        self.datagrams_in = RateMeter()
+        self.connect_latency = Histogram()   # Upstream connect, or pool acquire, in ns
+        self.relay_latency = Histogram(lowest=100)  # One chunk from read complete to written, in ns
+        self.connection_duration = Histogram(highest=24 * 3600 * 10 ** 9)
+
+    @staticmethod
+    def _summary(histogram: Histogram) -> dict:
+        # Nanoseconds reported as microseconds
+        return {
+            "count": histogram.count,
+            "mean_us": round(histogram.mean / 1e3, 3),
+            "percentiles_us": {str(p): round(value / 1e3, 3)
+                               for p, value in histogram.percentiles(METRIC_PERCENTILES).items()},
+        }
+
+    def snapshot(self, router) -> dict:
+        table = router.nat_table
+        pool = router.upstream_pool
+        return {
+            "uptime_s": round(time.monotonic() - self.started, 3),
+            "relay": "splice" if router.use_splice else "buffered",
+            "connections": {
+                "total": router.connections_total,
+                "active": router.connections_active,
+                "rejected": router.connections_rejected,
+                "accepted_per_s": self.accepted.rates(),
+                "closed_per_s": self.closed.rates(),
+                "rejected_per_s": self.rejected.rates(),
+            },
+            "bytes": {
+                "to_server": router.bytes_to_server,
+                "to_client": router.bytes_to_client,
+                "to_server_per_s": self.bytes_out.rates(),
+                "to_client_per_s": self.bytes_in.rates(),
+            },
+            "nat_table": {
+                "mappings": len(table),
+                "expired": table.expired,
+                "capacity": table.allocator.capacity,
+                "public_ips": table.allocator.utilization(),
+            },
+            "upstream_pool": pool.stats() if pool is not None else None,
+            "udp": {
+                "flows": len(router.udp_flows),
+                "flows_total": router.udp_flows_total,
+                "expired": router.udp_table.expired,
+                "datagrams_to_server": router.datagrams_to_server,
+                "datagrams_to_client": router.datagrams_to_client,
+                "dropped": router.datagrams_dropped,
+                "to_server_per_s": self.datagrams_out.rates(),
+                "to_client_per_s": self.datagrams_in.rates(),
+            } if router.udp_socket is not None else None,
+            "latency": {
+                "upstream_connect": self._summary(self.connect_latency),
+                "relay_chunk": self._summary(self.relay_latency),
+                "connection_duration": self._summary(self.connection_duration),
+            },
+            "events": {"emitted": router.events.emitted, "sampled_out": router.events.sampled_out},
+        }
+
+
+class ControlServer:
+    """
+    Read-only HTTP endpoint for inspecting a running router.
+
+    GET /metrics       counters, rates, port-pool use and latency percentiles
+    GET /mappings      live mappings with their counters (?limit=N, default 100)
+
+    `address` is a (host, port) pair for TCP or a filesystem path for a Unix
+    socket. Requests are answered on the router's event loop from state it
+    already keeps, so the relay never does extra work for them.
+    """
+
+    def __init__(self, router, address):
+        self.router = router
+        self.address = address
+        self.bound_address = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self._server = await asyncio.start_unix_server(self._handle, self.address)
+            self.bound_address = self.address
+        else:
+            self._server = await asyncio.start_server(self._handle, *self.address)
+            self.bound_address = self._server.sockets[0].getsockname()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def route(self, method: str, target: str):
+        """
+        Returns (status, body) for a request line.
+        """
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        url = urlsplit(target)
+        if url.path == "/metrics":
+            return 200, self.router.metrics.snapshot(self.router)
+        if url.path == "/mappings":
+            try:
+                limit = int(parse_qs(url.query).get("limit", ["100"])[0])
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                return 400, {"error": "limit must be a non-negative integer"}
+            return 200, {"mappings": self.router.mapping_stats(limit), "total": len(self.router.nat_table)}
+        return 404, {"error": f"unknown path {url.path}", "paths": ["/metrics", "/mappings"]}
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5.0)
+            # Skip the headers; no request needs a body
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                status, body = 400, {"error": "malformed request line"}
+            else:
+                status, body = self.route(parts[0], parts[1])
+            payload = json.dumps(body, indent=2, default=str).encode()
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
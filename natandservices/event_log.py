@@ -0,0 +1,79 @@
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Levels used by the router's events
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+
+
+class TextFormatter(logging.Formatter):
+    """Renders an event as `[NAT Router] event key=value ...`."""
+
+    def __init__(self, prefix: str):
+        super().__init__()
+        self.prefix = prefix
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in record.fields.items())
+        return f"[{self.prefix}] {record.event} {fields}".rstrip()
+
+
+class JSONFormatter(logging.Formatter):
+    """Renders an event as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({"ts": record.created, "level": record.levelname, "event": record.event,
+                           **record.fields}, default=str)
+
+
+class EventLog:
+    """
+    Structured event logging that stays off the relay's data path.
+
+    emit() checks the level and the event's sample rate, then hands the
+    event to a queue; formatting and the write to `stream` happen on a
+    QueueListener thread. Events carry only counts, sizes and endpoints,
+    never payload bytes. Per-event sample rates (0.0-1.0) thin out
+    high-volume events such as "bytes_forwarded"; `sampled_out` counts what
+    was skipped so totals can still be reasoned about.
+    """
+
+    def __init__(self, name: str = "NAT Router", level: int = INFO, fmt: str = "text",
+                 sample_rates: Optional[Dict[str, float]] = None, stream=None):
+        if fmt not in ("text", "json"):
+            raise ValueError("fmt must be 'text' or 'json'")
+        # A private logger, so several routers in one process do not share handlers
+        self.logger = logging.Logger(name, level)
+        self.sample_rates = dict(sample_rates or {})
+        self.emitted = 0
+        self.sampled_out: Dict[str, int] = {}
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(TextFormatter(name) if fmt == "text" else JSONFormatter())
+        self._queue = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(self._queue))
+        self._listener = QueueListener(self._queue, output)
+        self._listener.start()
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def emit(self, level: int, event: str, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = self.sample_rates.get(event)
+        if rate is not None and rate < 1.0 and random.random() >= rate:
+            self.sampled_out[event] = self.sampled_out.get(event, 0) + 1
+            return
+        self.emitted += 1
+        self.logger.log(level, event, extra={"event": event, "fields": fields})
+
+    def close(self):
+        """
+        Writes out every queued event and stops the writer thread.
+        """
+        self._listener.stop()
@@ -0,0 +1,394 @@
+import math
+import mmap
+import random
+import socket
+import struct
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Endpoint = Tuple[str, int]
+
+
+class PortExhaustedError(RuntimeError):
+    pass
+
+
+class AddressExhaustedError(PortExhaustedError):
+    pass
+
+
+class PortAllocator:
+    """
+    Hands out (public IP, port) pairs without collisions.
+
+    Each public IP has a free list of its ports and a bitmap of the ports in
+    use. Allocation pops from the free list of the next IP that still has
+    ports, and release appends to the back, so both are O(1) no matter how
+    full the port space is. Free lists start shuffled so public ports are not
+    predictable, and a released port is reused last.
+    """
+
+    def __init__(self, public_ips: Iterable[str], ports: Iterable[int]):
+        ports = list(ports)
+        self.low = min(ports)
+        self.capacity = 0
+        self._free: Dict[str, deque] = {}
+        self._in_use: Dict[str, bytearray] = {}
+        for ip in public_ips:
+            shuffled = ports[:]
+            random.shuffle(shuffled)
+            self._free[ip] = deque(shuffled)
+            self._in_use[ip] = bytearray(max(ports) - self.low + 1)
+            self.capacity += len(ports)
+        # Public IPs that still have free ports, rotated so mappings spread across them
+        self._available = deque(self._free)
+        self.allocated = 0
+
+    def allocate(self) -> Endpoint:
+        """
+        Returns a free public endpoint. Raises PortExhaustedError when every
+        port on every public IP is in use.
+        """
+        if not self._available:
+            raise PortExhaustedError(f"All {self.capacity} public ports are in use")
+        ip = self._available[0]
+        free = self._free[ip]
+        port = free.popleft()
+        if free:
+            self._available.rotate(-1)
+        else:
+            self._available.popleft()
+        self._in_use[ip][port - self.low] = 1
+        self.allocated += 1
+        return ip, port
+
+    def release(self, ip: str, port: int):
+        """
+        Returns an endpoint to its free list. Releasing a free endpoint is an error.
+        """
+        in_use = self._in_use[ip]
+        if not in_use[port - self.low]:
+            raise ValueError(f"{ip}:{port} is not allocated")
+        in_use[port - self.low] = 0
+        free = self._free[ip]
+        if not free:
+            self._available.append(ip)
+        free.append(port)
+        self.allocated -= 1
+
+    def utilization(self) -> Dict[str, dict]:
+        """
+        Ports in use on each public IP, from the free list lengths.
+        """
+        per_ip = self.capacity // len(self._free)
+        return {ip: {"in_use": per_ip - len(free), "total": per_ip, "utilization": round(1 - len(free) / per_ip, 4)}
+                for ip, free in self._free.items()}
+
+    def in_use(self, ip: str, port: int) -> bool:
+        in_use = self._in_use.get(ip)
+        index = port - self.low
+        return in_use is not None and 0 <= index < len(in_use) and bool(in_use[index])
+
+
+class PrivateAddressPool:
+    """
+    Hands out private IPs to client hosts without collisions.
+
+    A host keeps the same private IP for as long as it holds a reference to
+    it (one per live NAT mapping), so two hosts can never share a private
+    endpoint. When its last reference is released the IP goes back to the
+    free list and is reused last, like a released port in PortAllocator.
+    """
+
+    def __init__(self, private_ips: Iterable[str]):
+        self._free = deque(private_ips)
+        self.capacity = len(self._free)
+        self._by_host: Dict[str, str] = {}
+        self._hosts: Dict[str, str] = {}  # Private IP -> the host it is assigned to
+        self._references: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_host)
+
+    def acquire(self, host: str) -> str:
+        """
+        Returns the private IP of `host`, assigning a free one if it has none,
+        and takes a reference to it. Raises AddressExhaustedError when every
+        private IP is assigned to another host.
+        """
+        ip = self._by_host.get(host)
+        if ip is None:
+            if not self._free:
+                raise AddressExhaustedError(f"All {self.capacity} private IPs are in use")
+            ip = self._free.popleft()
+            self._by_host[host] = ip
+            self._hosts[ip] = host
+            self._references[ip] = 0
+        self._references[ip] += 1
+        return ip
+
+    def release(self, ip: str):
+        """
+        Drops a reference taken by acquire(), freeing the IP after the last one.
+        """
+        self._references[ip] -= 1
+        if not self._references[ip]:
+            del self._references[ip]
+            del self._by_host[self._hosts.pop(ip)]
+            self._free.append(ip)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel with `slots` buckets of `tick` seconds each.
+
+    Scheduling is an append to the bucket the deadline falls in, and each
+    advance only visits the buckets whose time has passed. Deadlines further
+    out than one revolution land in the last bucket and are simply
+    rescheduled by the caller when they come due early.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, now: Optional[float] = None):
+        self.tick = tick
+        self.slots: List[list] = [[] for _ in range(slots)]
+        self.current = 0
+        self.time = time.monotonic() if now is None else now  # Start of the current bucket
+
+    def schedule(self, entry, deadline: float):
+        ticks = math.ceil((deadline - self.time) / self.tick)
+        ticks = min(max(ticks, 1), len(self.slots) - 1)
+        self.slots[(self.current + ticks) % len(self.slots)].append(entry)
+
+    def advance(self, now: float) -> List[object]:
+        """
+        Moves the wheel up to `now` and returns the entries of every bucket passed.
+        """
+        due = []
+        for _ in range(len(self.slots)):
+            if self.time + self.tick > now:
+                break
+            self.time += self.tick
+            self.current = (self.current + 1) % len(self.slots)
+            bucket = self.slots[self.current]
+            if bucket:
+                due.extend(bucket)
+                self.slots[self.current] = []
+        else:
+            # Idle for more than a revolution: every bucket has been drained
+            self.time = now
+        return due
+
+
+class Mapping:
+    """One private endpoint translated to one public endpoint."""
+
+    __slots__ = ("private", "public", "last_active", "connections", "released", "flows", "bytes_out", "bytes_in")
+
+    def __init__(self, private: Endpoint, public: Endpoint, now: float):
+        self.private = private
+        self.public = public
+        self.last_active = now
+        self.connections = 0  # Open connections using the mapping; it never expires while > 0
+        self.released = False
+        # Traffic counters: connections ever made through the mapping and bytes each way
+        self.flows = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+
+class NatTable:
+    """
+    NAT translation table with forward and reverse indexes.
+
+    `forward` maps (private IP, private port) to a Mapping for outbound
+    traffic, and `reverse` maps (public IP, public port) back to it for
+    inbound translation. Idle mappings are expired through a timer wheel:
+    activity only updates a timestamp, and a mapping found active when its
+    bucket comes due is rescheduled instead of removed.
+    """
+
+    def __init__(self, public_ips: Iterable[str], ports: Iterable[int], idle_timeout: float = 300.0,
+                 tick: float = 1.0, clock=time.monotonic):
+        self.allocator = PortAllocator(public_ips, ports)
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.wheel = TimerWheel(tick, slots=max(2, math.ceil(idle_timeout / tick) + 1), now=clock())
+        self.forward: Dict[Endpoint, Mapping] = {}
+        self.reverse: Dict[Endpoint, Mapping] = {}
+        self.expired = 0
+        # Called with each mapping expire() releases, e.g. to close what the mapping owned
+        self.on_expire: Optional[Callable[[Mapping], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.forward)
+
+    def __contains__(self, private: Endpoint) -> bool:
+        return private in self.forward
+
+    def map(self, private: Endpoint) -> Mapping:
+        """
+        Returns the mapping for a private endpoint, allocating a public
+        endpoint if it has none. Raises PortExhaustedError when full.
+        """
+        now = self.clock()
+        mapping = self.forward.get(private)
+        if mapping is not None:
+            mapping.last_active = now
+            return mapping
+        mapping = Mapping(private, self.allocator.allocate(), now)
+        self.forward[private] = mapping
+        self.reverse[mapping.public] = mapping
+        self.wheel.schedule(mapping, now + self.idle_timeout)
+        return mapping
+
+    def translate_inbound(self, public: Endpoint) -> Optional[Endpoint]:
+        """
+        Returns the private endpoint behind a public one, or None.
+        """
+        mapping = self.reverse.get(public)
+        if mapping is None:
+            return None
+        mapping.last_active = self.clock()
+        return mapping.private
+
+    def touch(self, mapping: Mapping):
+        mapping.last_active = self.clock()
+
+    def release(self, mapping: Mapping):
+        """
+        Removes a mapping and frees its public endpoint immediately.
+        """
+        if mapping.released:
+            return
+        mapping.released = True
+        del self.forward[mapping.private]
+        del self.reverse[mapping.public]
+        self.allocator.release(*mapping.public)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Releases mappings idle for longer than idle_timeout and returns how
+        many were released.
+        """
+        now = self.clock() if now is None else now
+        released = 0
+        for mapping in self.wheel.advance(now):
+            if mapping.released:
+                continue
+            if mapping.connections:
+                self.wheel.schedule(mapping, now + self.idle_timeout)
+                continue
+            deadline = mapping.last_active + self.idle_timeout
+            if deadline > now:
+                self.wheel.schedule(mapping, deadline)
+                continue
+            self.release(mapping)
+            released += 1
+            if self.on_expire is not None:
+                self.on_expire(mapping)
+        self.expired += released
+        return released
+
+
+class SharedMappingArray:
+    """
+    Array of mapping slots in anonymous shared memory, one slot per public
+    endpoint, so processes forked after it is created all see the same
+    translations.
+
+    Every slot has a single writer: the worker that owns its public port.
+    Slots carry a sequence number that the writer makes odd while it updates
+    the slot, so readers in other processes retry instead of seeing a torn
+    record (a seqlock).
+    """
+
+    # sequence, in use, owner worker, private IPv4, private port, last active
+    SLOT = struct.Struct("<IBB4sHd")
+
+    def __init__(self, public_ips: Iterable[str], ports: Iterable[int]):
+        self.public_ips = list(public_ips)
+        self.ports = list(ports)
+        self.low = min(self.ports)
+        self.span = max(self.ports) - self.low + 1
+        self._ip_index = {ip: i for i, ip in enumerate(self.public_ips)}
+        self.memory = mmap.mmap(-1, len(self.public_ips) * self.span * self.SLOT.size)
+
+    def _offset(self, public: Endpoint) -> int:
+        return (self._ip_index[public[0]] * self.span + public[1] - self.low) * self.SLOT.size
+
+    def _write(self, offset: int, in_use: int, worker: int, private: Endpoint, last_active: float):
+        memory = self.memory
+        sequence = struct.unpack_from("<I", memory, offset)[0]
+        struct.pack_into("<I", memory, offset, sequence + 1)
+        self.SLOT.pack_into(memory, offset, sequence + 1, in_use, worker,
+                            socket.inet_aton(private[0]), private[1], last_active)
+        struct.pack_into("<I", memory, offset, sequence + 2)
+
+    def store(self, worker: int, mapping: "Mapping"):
+        self._write(self._offset(mapping.public), 1, worker, mapping.private, mapping.last_active)
+
+    def clear(self, worker: int, public: Endpoint):
+        self._write(self._offset(public), 0, worker, ("0.0.0.0", 0), 0.0)
+
+    def lookup(self, public: Endpoint) -> Optional[Tuple[int, Endpoint, float]]:
+        """
+        Returns (owner worker, private endpoint, last active) for a public
+        endpoint mapped by any worker, or None.
+        """
+        if public[0] not in self._ip_index or not 0 <= public[1] - self.low < self.span:
+            return None
+        offset = self._offset(public)
+        while True:
+            sequence, in_use, worker, private_ip, private_port, last_active = self.SLOT.unpack_from(self.memory, offset)
+            if sequence % 2 == 0 and struct.unpack_from("<I", self.memory, offset)[0] == sequence:
+                break
+        if not in_use:
+            return None
+        return worker, (socket.inet_ntoa(private_ip), private_port), last_active
+
+    def partition(self, worker: int, workers: int) -> List[int]:
+        """
+        Returns the contiguous slice of the port range owned by `worker`.
+        """
+        size = math.ceil(len(self.ports) / workers)
+        return self.ports[worker * size:(worker + 1) * size]
+
+
+class SharedNatTable(NatTable):
+    """
+    NatTable for one of several worker processes.
+
+    Each worker allocates only from its own slice of the port range on every
+    public IP, so no two workers can hand out the same public endpoint and
+    allocation needs no cross-process lock. Every change is mirrored into a
+    SharedMappingArray, which lets any worker translate inbound traffic for
+    a mapping created by another.
+    """
+
+    def __init__(self, shared: SharedMappingArray, worker: int, workers: int, idle_timeout: float = 300.0,
+                 tick: float = 1.0, clock=time.monotonic):
+        super().__init__(shared.public_ips, shared.partition(worker, workers), idle_timeout, tick, clock)
+        self.shared = shared
+        self.worker = worker
+
+    def map(self, private: Endpoint) -> Mapping:
+        mapping = super().map(private)
+        self.shared.store(self.worker, mapping)
+        return mapping
+
+    def touch(self, mapping: Mapping):
+        super().touch(mapping)
+        self.shared.store(self.worker, mapping)
+
+    def release(self, mapping: Mapping):
+        if not mapping.released:
+            self.shared.clear(self.worker, mapping.public)
+        super().release(mapping)
+
+    def translate_inbound(self, public: Endpoint) -> Optional[Endpoint]:
+        private = super().translate_inbound(public)
+        if private is not None:
+            return private
+        entry = self.shared.lookup(public)
+        return entry[1] if entry is not None else None
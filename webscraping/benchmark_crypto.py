@@ -0,0 +1,141 @@
+import argparse
+import csv
+import io
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import container
+import file_crypto
+
+PASSWORD = "benchmark password"
+
+
+def openssl_encrypt(path):
+    """The previous approach: one openssl process per file (argument list, password via the environment)."""
+    subprocess.run(["openssl", "enc", "-aes-256-cbc", "-salt", "-in", path, "-out", f"{path}.enc",
+                    "-pass", "env:SCRAPE_PASSWORD"], check=True, stderr=subprocess.DEVNULL,
+                   env={**os.environ, "SCRAPE_PASSWORD": PASSWORD})
+
+
+def native_sequential(paths):
+    ring = file_crypto.KeyRing(PASSWORD)
+    for path in paths:
+        file_crypto.encrypt_file(path, ring)
+
+
+def make_files(directory, count, size):
+    paths = []
+    for n in range(count):
+        path = os.path.join(directory, f"table_{size}_{n}.csv")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def run(label, encrypt, paths):
+    total = sum(os.path.getsize(path) for path in paths)
+    start = time.perf_counter()
+    encrypt(paths)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<26}{total / elapsed / 2**20:>10,.1f} MB/s{len(paths) / elapsed:>12,.1f} files/s")
+
+
+def make_table(directory, rows):
+    path = os.path.join(directory, "settlement_history.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Life Insurer", "Year", "Total claims", "Claims paid", "% of total claims"])
+        for n in range(rows):
+            writer.writerow([f"Insurer {n}", 2000 + n % 24, 10_000 + n, 9_800 + n, round(98 + n % 200 / 100, 2)])
+    return path
+
+
+def timed(function, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1e3, result
+
+
+def run_lookups(directory, rows):
+    """One insurer's row, and the whole table in pandas, from each encrypted format."""
+    path = make_table(directory, rows)
+    ring = file_crypto.KeyRing(PASSWORD)
+    stream = file_crypto.encrypt_file(path, ring, f"{path}.stream.enc")
+    table_path = container.encrypt_table(path, ring)
+    key = f"Insurer {rows // 2}"
+    print(f"{rows:,}-row table ({os.path.getsize(path) / 2**20:.1f} MiB):")
+
+    def stream_lookup():
+        plain = io.BytesIO()
+        with open(stream, "rb") as source:
+            file_crypto.decrypt_stream(source, plain, ring)
+        plain.seek(0)
+        return next(row for row in csv.reader(io.TextIOWrapper(plain, newline="")) if row[0] == key)
+
+    def stream_to_pandas():
+        # The old workflow: decrypt to a _decrypted.csv, then read it
+        return pd.read_csv(file_crypto.decrypt_file(stream, ring))
+
+    def container_lookup():
+        with container.EncryptedTable(table_path, ring) as table:
+            return table.find(key)
+
+    def container_to_pandas():
+        with container.EncryptedTable(table_path, ring) as table:
+            return table.to_dataframe()
+
+    stream_ms, expected = timed(stream_lookup)
+    container_ms, found = timed(container_lookup)
+    assert found == expected
+    print(f"  find one row:        full decrypt {stream_ms:>9,.2f} ms   container {container_ms:>9,.2f} ms")
+    stream_ms, expected = timed(stream_to_pandas, 3)
+    container_ms, frame = timed(container_to_pandas, 3)
+    assert frame.equals(expected)
+    print(f"  whole table, pandas: via file     {stream_ms:>9,.2f} ms   container {container_ms:>9,.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Native AES-GCM file encryption versus one openssl process per file.")
+    parser.add_argument("--small-files", type=int, default=200, help="Files the size of a scraped table")
+    parser.add_argument("--small-size", type=int, default=2048)
+    parser.add_argument("--large-files", type=int, default=16)
+    parser.add_argument("--large-size", type=int, default=16 * 2**20)
+    parser.add_argument("--workers", type=int, default=None, help="Thread pool size (default: CPUs + 4)")
+    parser.add_argument("--table-rows", type=int, default=200_000, help="Rows in the lookup comparison")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, count, size in (("small", args.small_files, args.small_size),
+                                   ("large", args.large_files, args.large_size)):
+            paths = make_files(directory, count, size)
+            print(f"{count} {label} files of {size / 1024:,.0f} KiB:")
+            run("openssl subprocess", lambda batch: [openssl_encrypt(path) for path in batch], paths)
+            run("native, sequential", native_sequential, paths)
+            run("native, thread pool", lambda batch: file_crypto.encrypt_files(batch, PASSWORD, args.workers), paths)
+            decrypted = file_crypto.decrypt_files([f"{path}.enc" for path in paths[:4]], PASSWORD)
+            for path, plain in zip(paths, decrypted):
+                with open(path, "rb") as original, open(plain, "rb") as result:
+                    assert original.read() == result.read()
+
+        # Memory stays at about two chunks however large the file is
+        big = make_files(directory, 1, 4 * args.large_size)[0]
+        ring = file_crypto.KeyRing(PASSWORD)
+        ring.key(ring.salt, *ring.params)  # Derive outside the measurement; scrypt's memory is not traced anyway
+        tracemalloc.start()
+        file_crypto.encrypt_file(big, ring)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"Encrypting a {os.path.getsize(big) / 2**20:,.0f} MiB file peaked at {peak / 2**20:.1f} MiB traced")
+
+        run_lookups(directory, args.table_rows)
+
+
+if __name__ == "__main__":
+    main()
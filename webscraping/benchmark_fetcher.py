@@ -0,0 +1,58 @@
+import argparse
+import tempfile
+import threading
+import time
+
+import requests
+
+from fetcher import Fetcher
+from fixtures import StubServer
+
+
+def sequential_get(urls):
+    """The previous approach: one bare requests.get per URL, in turn."""
+    return [requests.get(url).content for url in urls]
+
+
+def run(label, server, fetch, urls):
+    server.reset()
+    start = time.perf_counter()
+    contents = fetch(urls)
+    elapsed = time.perf_counter() - start
+    counts = server.counts
+    print(f"{label:<22}{len(urls) / elapsed:>10,.1f} pages/s  {elapsed:>7.2f}s  {counts['connections']:>5} connections  "
+          f"{counts[200]:>5} x 200  {counts[304]:>5} x 304  {counts['bytes'] / 1e6:>8.2f} MB downloaded")
+    return contents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetcher throughput and conditional-GET savings against a local stub.")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.02, help="Simulated server latency per request in seconds")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0, help="Requests per second per host (0 for no limit)")
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", 0), args.pages, args.delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/article/{n}" for n in range(args.pages)]
+    expected = [server.pages[f"/article/{n}"][0] for n in range(args.pages)]
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            assert run("sequential get", server, sequential_get, urls) == expected
+            with Fetcher(cache_dir, max_workers=args.workers, per_host_rate=args.rate or None) as fetcher:
+                def fetch(batch):
+                    results = fetcher.fetch_all(batch)
+                    assert all(result.ok for result in results)
+                    return [result.content for result in results]
+
+                assert run("fetcher, cold cache", server, fetch, urls) == expected
+                assert run("fetcher, warm cache", server, fetch, urls) == expected
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
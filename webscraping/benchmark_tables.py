@@ -0,0 +1,98 @@
+import argparse
+import multiprocessing
+import resource
+import time
+import tracemalloc
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from fixtures import article_html
+from tables import BENEFIT, POLICIES, etree, extract_frames, tag_rows
+
+
+def legacy_parse_table1(table):
+    """parse_table1 as it was: serialize the table and parse it a second time."""
+    soup = BeautifulSoup(str(table), 'html.parser')
+    table_element = soup.find('table')
+    rows = []
+    for row in table_element.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) > 0:
+            rows.append([cell.text.strip() for cell in cells])
+    df = pd.DataFrame(rows, columns=POLICIES.columns)
+    return df.drop([0, 1]).reset_index(drop=True)
+
+
+def legacy_parse_table2(table):
+    """parse_table2 as it was."""
+    soup = BeautifulSoup(str(table), 'html.parser')
+    table_element = soup.find('table')
+    header_row = table_element.find_all('tr')[1]
+    headers = [header.text.strip() for header in header_row.find_all('td')]
+    rows = []
+    for row in table_element.find_all('tr')[2:]:
+        cells = row.find_all('td')
+        if len(cells) > 0:
+            rows.append([cell.text.strip() for cell in cells])
+    return pd.DataFrame(rows, columns=headers)
+
+
+def legacy(page):
+    tables = BeautifulSoup(page, 'html.parser').find_all('div', {'class': 'tableBox'})
+    return [legacy_parse_table1(tables[0]), legacy_parse_table2(tables[1])]
+
+
+def soup_in_place(page):
+    tables = BeautifulSoup(page, 'html.parser').find_all('div', {'class': 'tableBox'})
+    return [POLICIES.to_frame(tag_rows(tables[0])), BENEFIT.to_frame(tag_rows(tables[1]))]
+
+
+ENGINES = {
+    "legacy (bs4, re-parse)": legacy,
+    "bs4, read in place": soup_in_place,
+    "single pass, html.parser": lambda page: extract_frames(page, backend="html.parser"),
+}
+if etree is not None:
+    ENGINES["single pass, lxml"] = lambda page: extract_frames(page, backend="lxml")
+
+
+def measure(engine, pages, results):
+    """Runs in a fresh process so peak memory is the engine's own."""
+    parse = ENGINES[engine]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for page in pages:
+        frames = parse(page)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.put((engine, len(pages) / elapsed, peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 [frame.to_csv(index=False) for frame in frames]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table extraction speed and peak memory on synthesized article pages.")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=40, help="Filler paragraphs around each table")
+    args = parser.parse_args()
+
+    # Distinct pages, so no engine benefits from caching
+    pages = [article_html(f"Article {n}", args.paragraphs).encode() for n in range(args.pages)]
+    print(f"{args.pages} pages of {len(pages[0]) / 1024:.0f} KiB")
+    print(f"{'engine':<28}{'pages/s':>10}{'traced peak (MiB)':>20}{'max RSS (MiB)':>16}")
+    results = multiprocessing.Queue()
+    expected = None
+    for engine in ENGINES:
+        process = multiprocessing.Process(target=measure, args=(engine, pages, results))
+        process.start()
+        name, rate, peak, max_rss, output = results.get()
+        process.join()
+        expected = expected or output
+        assert output == expected, f"{name} extracted different tables"
+        print(f"{name:<28}{rate:>10,.1f}{peak / 2**20:>20.2f}{max_rss / 1024:>16.1f}")
+    print("tracemalloc only sees Python allocations; lxml's own parse tree shows up in max RSS.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import bisect
+import csv
+import io
+import json
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+import file_crypto
+from dataset import read_csv
+from file_crypto import HEADER, DecryptionError, KeyRing
+
+# Container layout:
+#   header                   file_crypto.HEADER with CONTAINER_MAGIC
+#   chunk 0 .. chunk n-1     whole CSV records, each chunk sealed on its own
+#   bucket 0 .. bucket m-1   key column value -> chunks holding it, sealed
+#   index                    header rows and chunk/bucket positions, sealed
+#   footer                   index offset and sealed length, in the clear
+# Every seal is AES-256-GCM with the header as associated data. Chunk i uses
+# nonce (i, 0), bucket i (i, 3) and the index (0, 2), so no sealed part can
+# be moved to another position or file without failing authentication. The
+# footer is only a pointer: a tampered footer makes the index fail to decrypt.
+CONTAINER_MAGIC = b"SCRAPE\x00\x02"
+FOOTER = struct.Struct("!QQ8s")
+FOOTER_MAGIC = b"SCRIDX01"
+DEFAULT_CHUNK_SIZE = 64 * 1024  # Small chunks, so a lookup decrypts little
+_INDEX_FLAG = 2
+_BUCKET_FLAG = 3
+
+
+def _nonce(index: int, flag: int = 0) -> bytes:
+    return struct.pack("!QI", index, flag)
+
+
+def _record(fields: List[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(fields)
+    return buffer.getvalue()
+
+
+def _bucket_of(key: str, buckets: int) -> int:
+    return zlib.crc32(key.encode()) % buckets
+
+
+def _seal_json(cipher, nonce: bytes, value, header: bytes) -> bytes:
+    return cipher.encrypt(nonce, zlib.compress(json.dumps(value, separators=(",", ":")).encode()), header)
+
+
+def is_container(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+def encrypt_table(path: str, ring: KeyRing, output: Optional[str] = None, header_rows: int = 1,
+                  key_column: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    Encrypt a CSV file into a seekable container.
+
+    Records are packed into chunks of about `chunk_size` bytes without ever
+    splitting a record, and each chunk is authenticated on its own. Values
+    of `key_column` (the insurer name in the settlement tables) are hashed
+    into about one bucket per chunk, each listing the chunks a value is in,
+    so a lookup decrypts one bucket and those chunks, whatever the table size.
+    """
+    output = output or f"{path}.enc"
+    header = CONTAINER_MAGIC + ring.new_header(chunk_size)[len(CONTAINER_MAGIC):]
+    cipher = ring.file_cipher(header)
+    index = {"header": [], "chunks": [], "buckets": [], "key_column": key_column, "rows": 0}
+    key_chunks: Dict[str, List[int]] = {}
+
+    def write(destination):
+        destination.write(header)
+        position = len(header)
+        pending: List[str] = []
+        size = 0
+
+        def place(sealed: bytes) -> dict:
+            nonlocal position
+            destination.write(sealed)
+            placed = {"offset": position, "length": len(sealed)}
+            position += len(sealed)
+            return placed
+
+        def seal():
+            nonlocal pending, size
+            chunk = place(cipher.encrypt(_nonce(len(index["chunks"])), "".join(pending).encode(), header))
+            chunk["first_row"] = index["rows"]
+            index["chunks"].append(chunk)
+            index["rows"] += len(pending)
+            pending, size = [], 0
+
+        with open(path, newline="") as source:
+            for number, fields in enumerate(csv.reader(source)):
+                if number < header_rows:
+                    index["header"].append(fields)
+                    continue
+                record = _record(fields)
+                encoded_size = len(record.encode())
+                if pending and size + encoded_size > chunk_size:
+                    seal()
+                if key_column < len(fields):
+                    chunks = key_chunks.setdefault(fields[key_column], [])
+                    if not chunks or chunks[-1] != len(index["chunks"]):
+                        chunks.append(len(index["chunks"]))
+                pending.append(record)
+                size += encoded_size
+        if pending:
+            seal()
+
+        buckets: List[Dict[str, List[int]]] = [{} for _ in range(max(len(index["chunks"]), 1))]
+        for key, chunks in key_chunks.items():
+            buckets[_bucket_of(key, len(buckets))][key] = chunks
+        for number, bucket in enumerate(buckets):
+            index["buckets"].append(place(_seal_json(cipher, _nonce(number, _BUCKET_FLAG), bucket, header)))
+        index_offset = position
+        sealed_index = _seal_json(cipher, _nonce(0, _INDEX_FLAG), index, header)
+        destination.write(sealed_index)
+        destination.write(FOOTER.pack(index_offset, len(sealed_index), FOOTER_MAGIC))
+
+    file_crypto.write_atomically(output, write)
+    return output
+
+
+class _PlaintextStream(io.RawIOBase):
+    """Read-only file object over decrypted chunks, so pandas can stream from it."""
+
+    def __init__(self, parts: Iterator[bytes]):
+        self._parts = parts
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            part = next(self._parts, None)
+            if part is None:
+                return 0
+            self._buffer = memoryview(part)
+        n = min(len(target), len(self._buffer))
+        target[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class EncryptedTable:
+    """
+    Reader for a container written by encrypt_table.
+
+    Opening one decrypts only the small index. find() decrypts one key
+    bucket and the chunk holding the row, rows() and to_dataframe() decrypt
+    only the chunks spanning the requested rows, and nothing is ever
+    written to disk.
+    """
+
+    def __init__(self, path: str, ring: KeyRing):
+        self.path = path
+        self._ring = ring
+        self._file = open(path, "rb")
+        try:
+            index = self._read_index()
+        except BaseException:
+            self._file.close()
+            raise
+        self.header_rows: List[List[str]] = index["header"]
+        self.row_count: int = index["rows"]
+        self.key_column: int = index["key_column"]
+        self._chunks = index["chunks"]
+        self._first_rows = [chunk["first_row"] for chunk in self._chunks]
+        self._buckets = index["buckets"]
+        self._loaded_buckets: Dict[int, Dict[str, List[int]]] = {}
+        self.chunks_decrypted = 0
+        self._cached = (None, b"", None)  # The last chunk decrypted and its rows, since lookups cluster
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def _read_index(self) -> dict:
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size or not header.startswith(CONTAINER_MAGIC):
+            raise DecryptionError(f"{self.path} is not an encrypted table container")
+        self._header = header
+        self._cipher = self._ring.file_cipher(header)
+        if self._file.seek(0, io.SEEK_END) < HEADER.size + FOOTER.size:
+            raise DecryptionError(f"{self.path} has no container footer (truncated?)")
+        self._file.seek(-FOOTER.size, io.SEEK_END)
+        index_offset, index_length, magic = FOOTER.unpack(self._file.read(FOOTER.size))
+        if magic != FOOTER_MAGIC:
+            raise DecryptionError(f"{self.path} has no container footer (truncated?)")
+        return json.loads(zlib.decompress(self._open(index_offset, index_length, _nonce(0, _INDEX_FLAG), "index")))
+
+    def _open(self, offset: int, length: int, nonce: bytes, what: str) -> bytes:
+        self._file.seek(offset)
+        sealed = self._file.read(length)
+        try:
+            return self._cipher.decrypt(nonce, sealed, self._header)
+        except file_crypto.InvalidTag as e:
+            raise DecryptionError(f"{what} of {self.path} failed authentication") from e
+
+    def _chunk(self, number: int) -> bytes:
+        if self._cached[0] != number:
+            chunk = self._chunks[number]
+            self._cached = (number, self._open(chunk["offset"], chunk["length"], _nonce(number), f"chunk {number}"),
+                            None)
+            self.chunks_decrypted += 1
+        return self._cached[1]
+
+    def _chunk_rows(self, number: int) -> List[List[str]]:
+        data = self._chunk(number)
+        if self._cached[2] is None:
+            self._cached = (number, data, list(csv.reader(io.StringIO(data.decode(), newline=""))))
+        return self._cached[2]
+
+    def _bucket(self, number: int) -> Dict[str, List[int]]:
+        if number not in self._loaded_buckets:
+            bucket = self._buckets[number]
+            self._loaded_buckets[number] = json.loads(zlib.decompress(
+                self._open(bucket["offset"], bucket["length"], _nonce(number, _BUCKET_FLAG), f"key bucket {number}")))
+        return self._loaded_buckets[number]
+
+    def row(self, row: int) -> List[str]:
+        if not 0 <= row < self.row_count:
+            raise IndexError(row)
+        number = bisect.bisect_right(self._first_rows, row) - 1
+        return self._chunk_rows(number)[row - self._first_rows[number]]
+
+    def find(self, key: str) -> Optional[List[str]]:
+        """The first row whose key column equals `key`, or None."""
+        return next(self._matches(key), None)
+
+    def find_all(self, key: str) -> List[List[str]]:
+        return list(self._matches(key))
+
+    def _matches(self, key: str) -> Iterator[List[str]]:
+        for number in self._bucket(_bucket_of(key, len(self._buckets))).get(key, []):
+            for fields in self._chunk_rows(number):
+                if self.key_column < len(fields) and fields[self.key_column] == key:
+                    yield fields
+
+    def keys(self) -> List[str]:
+        """Every distinct key; this decrypts all the key buckets."""
+        return [key for number in range(len(self._buckets)) for key in self._bucket(number)]
+
+    def _plaintext(self, start: int, stop: int) -> Iterator[bytes]:
+        # Decrypted bytes of rows [start, stop), a chunk at a time. Records
+        # were written with _record, so a partial chunk is re-serialized
+        # from its parsed rows byte for byte.
+        if start >= stop:
+            return
+        first = bisect.bisect_right(self._first_rows, start) - 1
+        last = bisect.bisect_right(self._first_rows, stop - 1) - 1
+        for number in range(first, last + 1):
+            first_row = self._first_rows[number]
+            begin = start - first_row if number == first else 0
+            end = stop - first_row
+            data = self._chunk(number)
+            if begin == 0 and (number < last or end >= self._chunk_row_count(number)):
+                yield data
+            else:
+                yield "".join(_record(fields) for fields in self._chunk_rows(number)[begin:end]).encode()
+
+    def _chunk_row_count(self, number: int) -> int:
+        following = self._first_rows[number + 1] if number + 1 < len(self._first_rows) else self.row_count
+        return following - self._first_rows[number]
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[List[str]]:
+        """Rows [start, stop), decrypting only the chunks they are in."""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        lines = io.TextIOWrapper(io.BufferedReader(_PlaintextStream(self._plaintext(start, stop))),
+                                 encoding="utf-8", newline="")
+        return csv.reader(lines)
+
+    def to_dataframe(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """Rows [start, stop) as a DataFrame, streamed from the decrypted chunks into pandas."""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        header = "".join(_record(fields) for fields in self.header_rows).encode()
+        parts = self._with_header(header, start, stop)
+        return read_csv(io.BufferedReader(_PlaintextStream(parts)), max(len(self.header_rows), 1))
+
+    def _with_header(self, header: bytes, start: int, stop: int) -> Iterator[bytes]:
+        yield header
+        yield from self._plaintext(start, stop)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decrypt_table(path: str, ring: KeyRing, output: str):
+    """Write a container's CSV back out, for tools that need the file."""
+    with EncryptedTable(path, ring) as table:
+        def write(destination):
+            for fields in table.header_rows:
+                destination.write(_record(fields).encode())
+            for part in table._plaintext(0, table.row_count):
+                destination.write(part)
+
+        file_crypto.write_atomically(output, write)
+    return output
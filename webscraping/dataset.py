@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import sqlite3
+import time
+import warnings
+import zlib
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+    PARQUET_AVAILABLE = True
+except ImportError:  # pyarrow is optional; only CSV is written without it, with a warning
+    PARQUET_AVAILABLE = False
+
+
+def canonical_csv(frame: pd.DataFrame) -> bytes:
+    """The table as CSV with every header level, the form fingerprints and history are kept in."""
+    return frame.to_csv(index=False, lineterminator="\n").encode()
+
+
+def fingerprint(frame: pd.DataFrame) -> str:
+    """sha256 of the table's header, values and column types."""
+    digest = hashlib.sha256(canonical_csv(frame))
+    digest.update(repr([str(dtype) for dtype in frame.dtypes]).encode())
+    return digest.hexdigest()
+
+
+def read_csv(path_or_buffer, levels: int = 1) -> pd.DataFrame:
+    """Read a table written by write_table back with its header levels."""
+    if levels == 1:
+        return pd.read_csv(path_or_buffer)
+    frame = pd.read_csv(path_or_buffer, header=list(range(levels)))
+    # pandas names empty header cells "Unnamed: <n>_level_<m>"; they were empty when written
+    frame.columns = pd.MultiIndex.from_tuples([tuple("" if part.startswith("Unnamed: ") else part for part in column)
+                                               for column in frame.columns])
+    return frame
+
+
+class VersionHistory:
+    """
+    Every distinct version of every scraped table, in SQLite.
+
+    A version is stored when a table's fingerprint differs from its latest
+    one, with the canonical CSV compressed so any version can be restored.
+    Versions are ordered by their id, which increases with every insert, so
+    a wall clock stepping back cannot reorder them; scraped_at is only used
+    for point-in-time queries. Versions are indexed by table and by
+    fingerprint, so the latest version, a version at a point in time, and
+    "when did this content first appear" are all index lookups.
+    """
+
+    def __init__(self, path: str = "scrape_history.sqlite"):
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                scraped_at REAL NOT NULL,
+                source TEXT,
+                rows INTEGER NOT NULL,
+                header_levels INTEGER NOT NULL,
+                data BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS versions_by_time ON versions (name, scraped_at);
+            CREATE INDEX IF NOT EXISTS versions_by_name ON versions (name, id);
+            CREATE INDEX IF NOT EXISTS versions_by_fingerprint ON versions (fingerprint);
+        """)
+
+    def latest_fingerprint(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT fingerprint FROM versions WHERE name = ? ORDER BY id DESC LIMIT 1",
+                              (name,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, name: str, frame: pd.DataFrame, digest: str, source: Optional[str] = None) -> int:
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO versions (name, fingerprint, scraped_at, source, rows, header_levels, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, digest, time.time(), source, len(frame), frame.columns.nlevels,
+                 zlib.compress(canonical_csv(frame))))
+        return cursor.lastrowid
+
+    def versions(self, name: str) -> List[tuple]:
+        """(id, fingerprint, scraped_at, source, rows) for every version of a table, oldest first."""
+        return self.db.execute("SELECT id, fingerprint, scraped_at, source, rows FROM versions"
+                               " WHERE name = ? ORDER BY id", (name,)).fetchall()
+
+    def load(self, name: str, at: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """The table as it was at time `at` (default: now), or None if it had not been scraped yet."""
+        row = self.db.execute("SELECT data, header_levels FROM versions WHERE name = ? AND scraped_at <= ?"
+                              " ORDER BY id DESC LIMIT 1",
+                              (name, time.time() if at is None else at)).fetchone()
+        if row is None:
+            return None
+        return read_csv(io.BytesIO(zlib.decompress(row[0])), row[1])
+
+    def first_seen(self, digest: str) -> Optional[tuple]:
+        """(name, scraped_at) of the first version with this fingerprint."""
+        return self.db.execute("SELECT name, scraped_at FROM versions WHERE fingerprint = ?"
+                               " ORDER BY id LIMIT 1", (digest,)).fetchone()
+
+    def close(self):
+        self.db.close()
+
+
+def write_table(frame: pd.DataFrame, name: str, history: VersionHistory, directory: str = ".",
+                source: Optional[str] = None, derived: Iterable[str] = ()) -> bool:
+    """
+    Writes `name` (CSV, as before) and `name.parquet` and records a new
+    version, unless the table is unchanged since the last run and its files
+    are still there. `derived` names files the caller builds from the CSV,
+    such as its encrypted container; if one is missing the table counts as
+    written so the caller recreates it. Returns whether anything was written.
+    """
+    digest = fingerprint(frame)
+    csv_path = os.path.join(directory, name)
+    parquet_path = csv_path + ".parquet"
+    outputs = [csv_path, *(os.path.join(directory, path) for path in derived)]
+    if PARQUET_AVAILABLE:
+        outputs.append(parquet_path)
+    if digest == history.latest_fingerprint(name) and all(os.path.exists(path) for path in outputs):
+        return False
+    frame.to_csv(csv_path, index=False)
+    if PARQUET_AVAILABLE:
+        frame.to_parquet(parquet_path, index=False)
+    else:
+        warnings.warn(f"pyarrow is not installed, so {parquet_path} was not written; "
+                      "install pyarrow for the columnar output", RuntimeWarning, stacklevel=2)
+    if digest != history.latest_fingerprint(name):
+        history.record(name, frame, digest, source)
+    return True
@@ -1,7 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
-import subprocess
+
+import container
+import file_crypto
+from dataset import VersionHistory, write_table
+from tables import BENEFIT, POLICIES, extract_frames, tag_rows
 
 def fetch_and_parse(url):
     """Fetch and parse the webpage using BeautifulSoup."""
@@ -14,71 +17,60 @@ def extract_tables(soup):
 
 def parse_table1(table):
     """Parse table1 and return a cleaned DataFrame."""
-    soup = BeautifulSoup(str(table), 'html.parser')
-    table_element = soup.find('table')
-    headers = [header.text for header in table_element.find_all('th')]
-    rows = []
-    for row in table_element.find_all('tr'):
-        cells = row.find_all('td')
-        if len(cells) > 0:
-            rows.append([cell.text.strip() for cell in cells])
-    df = pd.DataFrame(rows, columns=["Life Insurer", "Total claims", "Claims paid", "Claims paid", "Claims repudiated", "Claims repudiated"])
-    return df.drop([0, 1]).reset_index(drop=True)
+    return POLICIES.to_frame(tag_rows(table))
 
 def parse_table2(table):
     """Parse table2 and return a cleaned DataFrame."""
-    soup = BeautifulSoup(str(table), 'html.parser')
-    table_element = soup.find('table')
-    header_row = table_element.find_all('tr')[1]
-    headers = [header.text.strip() for header in header_row.find_all('td')]
-    rows = []
-    for row in table_element.find_all('tr')[2:]:
-        cells = row.find_all('td')
-        if len(cells) > 0:
-            rows.append([cell.text.strip() for cell in cells])
-    return pd.DataFrame(rows, columns=headers)
+    return BENEFIT.to_frame(tag_rows(table))
 
 def save_to_csv(df, filename):
     """Save the DataFrame to a CSV file."""
     df.to_csv(filename, index=False)
     print(f"Data saved to {filename}")
 
-def encrypt_file(filename, password):
-    """Encrypt the file using openssl."""
-    encrypted_filename = f"{filename}.enc"
-    command = f"openssl enc -aes-256-cbc -salt -in {filename} -out {encrypted_filename} -k {password}"
-    subprocess.run(command, shell=True, check=True)
+def encrypt_file(filename, password, ring=None, header_rows=1):
+    """Encrypt the CSV file into a seekable container; pass one KeyRing to a batch so scrypt runs once."""
+    encrypted_filename = container.encrypt_table(filename, ring or file_crypto.KeyRing(password),
+                                                 header_rows=header_rows)
     print(f"File encrypted and saved as {encrypted_filename}")
 
-def decrypt_file(encrypted_filename, password):
-    """Decrypt the file using openssl."""
-    decrypted_filename = encrypted_filename.replace(".enc", "_decrypted.csv")
-    command = f"openssl enc -d -aes-256-cbc -in {encrypted_filename} -out {decrypted_filename} -k {password}"
-    subprocess.run(command, shell=True, check=True)
+def decrypt_file(encrypted_filename, password, ring=None):
+    """Decrypt the file to disk, whether it is a container, a stream or an old openssl enc file."""
+    ring = ring or file_crypto.KeyRing(password)
+    if container.is_container(encrypted_filename):
+        decrypted_filename = encrypted_filename.replace(".enc", "_decrypted.csv")
+        container.decrypt_table(encrypted_filename, ring, decrypted_filename)
+    else:
+        decrypted_filename = file_crypto.decrypt_file(encrypted_filename, ring)
     print(f"File decrypted and saved as {decrypted_filename}")
 
+def read_encrypted(encrypted_filename, password, ring=None, insurer=None):
+    """Load an encrypted table into pandas without writing it to disk, or only one insurer's row."""
+    with container.EncryptedTable(encrypted_filename, ring or file_crypto.KeyRing(password)) as table:
+        if insurer is None:
+            return table.to_dataframe()
+        return table.find(insurer)
+
 def main():
     """Main function to execute the workflow."""
     url = "https://economictimes.indiatimes.com/wealth/insure/life-insurance/latest-life-insurance-claim-settlement-ratio-of-insurance-companies-in-india/articleshow/97366610.cms"
-    soup = fetch_and_parse(url)
-    tables = extract_tables(soup)
-    
-    # Parse and save table1
-    table1_df = parse_table1(tables[0])
-    print("\nIndividual death claims settlement by % of policies")
-    print(table1_df)
-    save_to_csv(table1_df, "settlement_by_%_of_policies")
-    
-    # Parse and save table2
-    table2_df = parse_table2(tables[1])
-    print("\nIndividual death claims settlement by % of benefit amount")
-    print(table2_df)
-    save_to_csv(table2_df, "settlement_%_benefit_amount")
-    
-    # Encrypt the CSV files
+    # One pass over the page yields both tables, with numeric columns typed
+    table1_df, table2_df = extract_frames(requests.get(url).content, typed=True)
     password = "arnav1234"  # Replace with a secure password
-    encrypt_file("settlement_by_%_of_policies", password)
-    encrypt_file("settlement_%_benefit_amount", password)
+    ring = file_crypto.KeyRing(password)  # One key derivation for every file of the run
+    history = VersionHistory()
+
+    for title, spec, df in (("Individual death claims settlement by % of policies", POLICIES, table1_df),
+                            ("Individual death claims settlement by % of benefit amount", BENEFIT, table2_df)):
+        print(f"\n{title}")
+        print(df)
+        # Files are only rewritten and re-encrypted when the table has changed
+        if write_table(df, spec.name, history, source=url, derived=[f"{spec.name}.enc"]):
+            print(f"Data saved to {spec.name}")
+            encrypt_file(spec.name, password, ring, header_rows=df.columns.nlevels)
+        else:
+            print(f"{spec.name} is unchanged since the last run")
+    history.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
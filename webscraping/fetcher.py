@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchResult:
+    """The outcome of fetching one URL."""
+
+    def __init__(self, url, status=None, content=b"", not_modified=False, elapsed=0.0, error=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.not_modified = not_modified  # Revalidated with a 304; `content` is the cached copy
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host to at most `per_second` per second."""
+
+    def __init__(self, per_second: Optional[float]):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DiskCache:
+    """
+    Response bodies and their validators (ETag, Last-Modified) on disk, one
+    `<sha256 of url>.entry` file per URL: a JSON header line followed by the
+    body. Entries are written to a temporary name and renamed, so a crashed
+    run never leaves a torn entry and a body is always read together with
+    the validators it was served with, even while another thread stores a
+    newer response for the same URL.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".entry")
+
+    def _write(self, path: str, data: bytes):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def _read(self, url: str, with_body: bool) -> Optional[Tuple[dict, Optional[bytes]]]:
+        try:
+            with open(self._path(url), "rb") as f:
+                meta = json.loads(f.readline())
+                return meta, f.read() if with_body else None
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _conditional_headers(meta: dict) -> Dict[str, str]:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a cached URL, or {} if it is not cached."""
+        entry = self._read(url, with_body=False)
+        return self._conditional_headers(entry[0]) if entry is not None else {}
+
+    def load(self, url: str, validators: Dict[str, str]) -> Optional[bytes]:
+        """
+        The cached body, provided the entry still carries `validators` (the
+        headers a 304 answered); None if it has since vanished or been replaced.
+        """
+        entry = self._read(url, with_body=True)
+        if entry is None or self._conditional_headers(entry[0]) != validators:
+            return None
+        return entry[1]
+
+    def store(self, url: str, response: requests.Response):
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return  # Nothing to revalidate with
+        meta = {"url": url, "etag": etag, "last_modified": last_modified, "stored": time.time()}
+        self._write(self._path(url), json.dumps(meta).encode() + b"\n" + response.content)
+
+
+class Fetcher:
+    """
+    Fetches many URLs concurrently.
+
+    Worker threads share one requests.Session whose HTTPAdapter keeps up to
+    `max_workers` keep-alive connections per host, so repeated requests to
+    a host skip the TCP and TLS handshakes. Each host gets at most
+    `per_host_rate` requests per second. Responses carrying an ETag or
+    Last-Modified are cached in `cache_dir`, and later fetches send them
+    back as If-None-Match / If-Modified-Since so an unchanged page costs a
+    304 instead of a full download.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = ".http_cache", max_workers: int = 8,
+                 per_host_rate: Optional[float] = 2.0, timeout: float = 30.0, user_agent: Optional[str] = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = DiskCache(cache_dir) if cache_dir else None
+        self.limiter = HostRateLimiter(per_host_rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_workers, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+    def fetch(self, url: str) -> FetchResult:
+        """Fetch one URL, revalidating the cached copy if there is one."""
+        headers = self.cache.validators(url) if self.cache else {}
+        host = urlsplit(url).netloc
+        self.limiter.wait(host)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and headers:
+                content = self.cache.load(url, headers)
+                if content is not None:
+                    return FetchResult(url, 304, content, True, time.perf_counter() - start)
+                # The cache entry vanished or was replaced since the validators were read
+                self.limiter.wait(host)
+                response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            return FetchResult(url, getattr(e.response, "status_code", None), elapsed=time.perf_counter() - start,
+                               error=e)
+        if self.cache:
+            self.cache.store(url, response)
+        return FetchResult(url, response.status_code, response.content, False, time.perf_counter() - start)
+
+    def fetch_all(self, urls: List[str]) -> List[FetchResult]:
+        """Fetch every URL concurrently; results come back in the order of `urls`."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self.fetch, urls))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
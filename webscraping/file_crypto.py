@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.padding import PKCS7
+except ImportError:  # cryptography is optional until something is encrypted
+    AESGCM = None
+
+# File layout: header, then chunks of up to `chunk_size` plaintext bytes, each
+# sealed with AES-256-GCM and followed by its 16-byte tag. The header is the
+# associated data of every chunk, so none of its fields can be altered.
+MAGIC = b"SCRAPE\x00\x01"
+HEADER = struct.Struct("!8s16sBBB16sI")  # magic, salt, log2(n), r, p, file nonce, chunk size
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 1 << 20
+# scrypt cost: 2**15 * 8 * 128 bytes = 32 MiB of memory per derivation
+SCRYPT_LOG_N, SCRYPT_R, SCRYPT_P = 15, 8, 1
+# What `openssl enc -salt` writes before the salt
+OPENSSL_MAGIC = b"Salted__"
+
+
+class DecryptionError(ValueError):
+    pass
+
+
+def _require_cryptography():
+    if AESGCM is None:
+        raise RuntimeError("file encryption needs the 'cryptography' package (pip install cryptography)")
+
+
+def derive_key(password: str, salt: bytes, log_n: int = SCRYPT_LOG_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=1 << log_n, r=r, p=p, maxmem=256 * 2**20, dklen=32)
+
+
+def _chunk_nonce(index: int, last: bool) -> bytes:
+    # STREAM construction: a chunk counter plus a flag marking the final
+    # chunk, so chunks cannot be reordered, dropped or the file truncated
+    return struct.pack("!QI", index, 1 if last else 0)
+
+
+class KeyRing:
+    """
+    Keys derived from one password, cached by salt.
+
+    scrypt is deliberately slow, so it runs once per salt rather than once
+    per file: every file encrypted through the ring shares `salt`, and
+    decrypting a batch of such files derives its key once. Each file still
+    gets its own AES key, derived from the scrypt key and a random per-file
+    nonce with HMAC-SHA256, so chunk nonces never repeat under one key.
+    """
+
+    def __init__(self, password: str, salt: Optional[bytes] = None, log_n: int = SCRYPT_LOG_N,
+                 r: int = SCRYPT_R, p: int = SCRYPT_P):
+        self.password = password
+        self.salt = salt or os.urandom(16)
+        self.params = (log_n, r, p)
+        self._keys: Dict[Tuple[bytes, int, int, int], bytes] = {}
+        self._lock = threading.Lock()
+
+    def key(self, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+        with self._lock:
+            cached = self._keys.get((salt, log_n, r, p))
+            if cached is None:
+                cached = self._keys[(salt, log_n, r, p)] = derive_key(self.password, salt, log_n, r, p)
+        return cached
+
+    def file_cipher(self, header: bytes) -> "AESGCM":
+        _require_cryptography()
+        _, salt, log_n, r, p, file_nonce, _ = HEADER.unpack(header)
+        file_key = hmac.new(self.key(salt, log_n, r, p), b"file key" + file_nonce, hashlib.sha256).digest()
+        return AESGCM(file_key)
+
+    def new_header(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> bytes:
+        return HEADER.pack(MAGIC, self.salt, *self.params, os.urandom(16), chunk_size)
+
+
+def _read_full(source: BinaryIO, size: int) -> bytes:
+    data = source.read(size)
+    while data and len(data) < size:
+        more = source.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def encrypt_stream(source: BinaryIO, destination: BinaryIO, ring: KeyRing, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Encrypt `source` into `destination` holding at most two chunks in memory."""
+    _require_cryptography()
+    header = ring.new_header(chunk_size)
+    cipher = ring.file_cipher(header)
+    destination.write(header)
+    index = 0
+    chunk = _read_full(source, chunk_size)
+    while True:
+        # Read ahead one chunk to know whether this one is the last
+        following = _read_full(source, chunk_size) if len(chunk) == chunk_size else b""
+        last = not following
+        destination.write(cipher.encrypt(_chunk_nonce(index, last), chunk, header))
+        if last:
+            return
+        chunk = following
+        index += 1
+
+
+def decrypt_stream(source: BinaryIO, destination: BinaryIO, ring: KeyRing):
+    """Decrypt a file written by encrypt_stream, chunk by chunk."""
+    _require_cryptography()
+    header = _read_full(source, HEADER.size)
+    if len(header) < HEADER.size or not header.startswith(MAGIC):
+        raise DecryptionError("not an encrypted scrape file")
+    chunk_size = HEADER.unpack(header)[-1]
+    cipher = ring.file_cipher(header)
+    index = 0
+    sealed = _read_full(source, chunk_size + TAG_SIZE)
+    while True:
+        following = _read_full(source, chunk_size + TAG_SIZE) if len(sealed) == chunk_size + TAG_SIZE else b""
+        last = not following
+        try:
+            destination.write(cipher.decrypt(_chunk_nonce(index, last), sealed, header))
+        except InvalidTag as e:
+            raise DecryptionError(f"chunk {index} failed authentication (wrong password or tampered file)") from e
+        if last:
+            return
+        sealed = following
+        index += 1
+
+
+def decrypt_openssl_legacy(data: bytes, password: str) -> bytes:
+    """
+    Decrypt what `openssl enc -aes-256-cbc -salt -k <password>` produced
+    (OpenSSL 1.1+ defaults: EVP_BytesToKey with SHA-256), without openssl.
+    """
+    _require_cryptography()
+    if not data.startswith(OPENSSL_MAGIC):
+        raise DecryptionError("not an openssl enc file")
+    salt, body = data[8:16], data[16:]
+    material, block = b"", b""
+    while len(material) < 48:
+        block = hashlib.sha256(block + password.encode() + salt).digest()
+        material += block
+    decryptor = Cipher(algorithms.AES(material[:32]), modes.CBC(material[32:48])).decryptor()
+    unpadder = PKCS7(128).unpadder()
+    try:
+        return unpadder.update(decryptor.update(body) + decryptor.finalize()) + unpadder.finalize()
+    except ValueError as e:
+        raise DecryptionError("bad password or corrupt openssl file") from e
+
+
+def write_atomically(output: str, write):
+    # Readers never see a partial file, and a failed run leaves the old one
+    temporary = f"{output}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, "wb") as destination:
+            write(destination)
+        os.replace(temporary, output)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def encrypt_file(path: str, ring: KeyRing, output: Optional[str] = None) -> str:
+    output = output or f"{path}.enc"
+    with open(path, "rb") as source:
+        write_atomically(output, lambda destination: encrypt_stream(source, destination, ring))
+    return output
+
+
+def decrypt_file(path: str, ring: KeyRing, output: Optional[str] = None) -> str:
+    """Decrypt one file, in either the native format or the old openssl one."""
+    output = output or (path[:-len(".enc")] if path.endswith(".enc") else path) + "_decrypted.csv"
+    with open(path, "rb") as source:
+        legacy = source.read(len(OPENSSL_MAGIC)) == OPENSSL_MAGIC
+        source.seek(0)
+        if legacy:
+            plaintext = decrypt_openssl_legacy(source.read(), ring.password)
+            write_atomically(output, lambda destination: destination.write(plaintext))
+        else:
+            write_atomically(output, lambda destination: decrypt_stream(source, destination, ring))
+    return output
+
+
+def _batch(function, paths: List[str], ring: KeyRing, workers: Optional[int]) -> List[str]:
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4)) as pool:
+        return list(pool.map(lambda path: function(path, ring), paths))
+
+
+def encrypt_files(paths: List[str], password: str, workers: Optional[int] = None) -> List[str]:
+    """Encrypt many files in parallel with one scrypt derivation for the whole batch."""
+    return _batch(encrypt_file, paths, KeyRing(password), workers)
+
+
+def decrypt_files(paths: List[str], password: str, workers: Optional[int] = None) -> List[str]:
+    """Decrypt many files in parallel, deriving each distinct salt's key once."""
+    return _batch(decrypt_file, paths, KeyRing(password), workers)
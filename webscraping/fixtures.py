@@ -0,0 +1,127 @@
+import csv
+import hashlib
+import html
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The tables saved by encrypt_decypt.py, used to rebuild article pages offline
+HERE = os.path.dirname(os.path.abspath(__file__))
+POLICIES_CSV = os.path.join(HERE, "settlement_by_%_of_policies")
+BENEFIT_CSV = os.path.join(HERE, "settlement_%_benefit_amount")
+
+
+def read_csv(path):
+    """Return the header and rows of a saved CSV file."""
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
+
+
+def _row(cells, tag="td"):
+    return "<tr>" + "".join(f"<{tag}>{html.escape(cell)}</{tag}>" for cell in cells) + "</tr>"
+
+
+def policies_table_html(header, rows):
+    """A tableBox laid out like the article's first table: a <th> header, two header rows in <td>, then data."""
+    return ('<div class="tableBox"><table><thead>' + _row(header, "th") + "</thead><tbody>"
+            + _row(["Individual death claims settlement by % of policies"] + [""] * (len(header) - 1))
+            + _row(header) + "".join(_row(row) for row in rows) + "</tbody></table></div>")
+
+
+def benefit_table_html(header, rows):
+    """A tableBox laid out like the article's second table: a caption row, a header row, then data."""
+    return ('<div class="tableBox"><table><tbody>'
+            + f'<tr><td colspan="{len(header)}">Individual death claims settlement by % of benefit amount</td></tr>'
+            + _row(header) + "".join(_row(row) for row in rows) + "</tbody></table></div>")
+
+
+def article_html(title="Claim settlement ratio", paragraphs=40, policies=None, benefit=None):
+    """
+    A page shaped like the source article, with the two settlement tables
+    between paragraphs of filler text. Tables default to the saved CSVs.
+    """
+    policies = policies or read_csv(POLICIES_CSV)
+    benefit = benefit or read_csv(BENEFIT_CSV)
+    filler = "".join(f"<p>Paragraph {i} of the article body, with a <a href='/link/{i}'>link</a>.</p>"
+                     for i in range(paragraphs))
+    return ("<!DOCTYPE html><html><head><title>" + html.escape(title) + "</title></head><body>"
+            "<nav><ul>" + "".join(f"<li><a href='/section/{i}'>Section {i}</a></li>" for i in range(30)) + "</ul></nav>"
+            f"<article><h1>{html.escape(title)}</h1>{filler}"
+            + policies_table_html(*policies) + filler + benefit_table_html(*benefit) + filler
+            + "</article></body></html>")
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Serves /article/<n> pages with ETag and Last-Modified after a simulated
+    network delay (Last-Modified only with etags=False). Every request's
+    arrival time, path and headers are kept in `requests`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, pages, delay=0.0, etags=True):
+        super().__init__(address, StubHandler)
+        self.pages = {}
+        for n in range(pages):
+            body = article_html(f"Claim settlement ratio, article {n}").encode()
+            self.pages[f"/article/{n}"] = (body, '"' + hashlib.sha256(body).hexdigest()[:16] + '"')
+        self.last_modified = formatdate(time.time() - 3600, usegmt=True)
+        self.delay = delay
+        self.etags = etags
+        self.lock = threading.Lock()
+        self.counts = {"connections": 0, 200: 0, 304: 0, "bytes": 0}
+        self.requests = []
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.counts, 0)
+            self.requests = []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), self.path, dict(self.headers)))
+        time.sleep(self.server.delay)
+        page = self.server.pages.get(self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        body, etag = page
+        if not self.server.etags:
+            etag = None
+        if (etag and self.headers.get("If-None-Match") == etag) or \
+                self.headers.get("If-Modified-Since") == self.server.last_modified:
+            self.server.count(304)
+            self.send_response(304)
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.server.count(200)
+        self.server.count("bytes", len(body))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -1,6 +1,12 @@
+import argparse
+
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
+
+from fetcher import Fetcher
+from tables import BENEFIT, POLICIES, extract_frames, tag_rows
+
+DEFAULT_URL = "https://economictimes.indiatimes.com/wealth/insure/life-insurance/latest-life-insurance-claim-settlement-ratio-of-insurance-companies-in-india/articleshow/97366610.cms"
 
 def fetch_and_parse(url):
     """Fetch and parse the webpage using BeautifulSoup."""
@@ -13,43 +19,41 @@ def extract_tables(soup):
 
 def parse_table1(table):
     """Parse table1 and return a cleaned DataFrame."""
-    soup = BeautifulSoup(str(table), 'html.parser')
-    table_element = soup.find('table')
-    headers = [header.text for header in table_element.find_all('th')]
-    rows = []
-    for row in table_element.find_all('tr'):
-        cells = row.find_all('td')
-        if len(cells) > 0:
-            rows.append([cell.text.strip() for cell in cells])
-    df = pd.DataFrame(rows, columns=["Life Insurer", "Total claims", "Claims paid", "Claims paid", "Claims repudiated", "Claims repudiated"])
-    return df.drop([0, 1]).reset_index(drop=True)
+    return POLICIES.to_frame(tag_rows(table))
 
 def parse_table2(table):
     """Parse table2 and return a cleaned DataFrame."""
-    soup = BeautifulSoup(str(table), 'html.parser')
-    table_element = soup.find('table')
-    header_row = table_element.find_all('tr')[1]
-    headers = [header.text.strip() for header in header_row.find_all('td')]
-    rows = []
-    for row in table_element.find_all('tr')[2:]:
-        cells = row.find_all('td')
-        if len(cells) > 0:
-            rows.append([cell.text.strip() for cell in cells])
-    return pd.DataFrame(rows, columns=headers)
+    return BENEFIT.to_frame(tag_rows(table))
 
 def main():
     """Main function to execute the workflow."""
-    url = "https://economictimes.indiatimes.com/wealth/insure/life-insurance/latest-life-insurance-claim-settlement-ratio-of-insurance-companies-in-india/articleshow/97366610.cms"
-    soup = fetch_and_parse(url)
-    tables = extract_tables(soup)
-    
-    table1_df = parse_table1(tables[0])
-    print("\n Individual death claims settlement by % of policies")
-    print(table1_df)
-    
-    table2_df = parse_table2(tables[1])
-    print("\n Individual death claims settlement by % of benefit amount")
-    print(table2_df)
+    parser = argparse.ArgumentParser(description="Scrape claim settlement ratio tables from one or more articles.")
+    parser.add_argument("urls", nargs="*", default=[DEFAULT_URL], help="Article URLs (default: the 2023 article)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second per host")
+    parser.add_argument("--cache-dir", default=".http_cache", help="Conditional-GET cache directory")
+    args = parser.parse_args()
+
+    with Fetcher(args.cache_dir, max_workers=args.workers, per_host_rate=args.rate) as fetcher:
+        results = fetcher.fetch_all(args.urls)
+
+    for result in results:
+        print(f"\n{result.url}")
+        if not result.ok:
+            print(f" Failed: {result.error}")
+            continue
+        if result.not_modified:
+            # Same page as the cached copy, so the tables are unchanged too
+            print(" Unchanged since the last run (304)")
+            continue
+        # One pass over the page yields both tables
+        table1_df, table2_df = extract_frames(result.content, typed=True)
+
+        print("\n Individual death claims settlement by % of policies")
+        print(table1_df)
+
+        print("\n Individual death claims settlement by % of benefit amount")
+        print(table2_df)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
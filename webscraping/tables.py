@@ -0,0 +1,215 @@
+import io
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the standard library parser
+    etree = None
+
+TABLE_CLASS = "tableBox"
+CELL_TAGS = ("td", "th")
+
+
+class TableSpec:
+    """
+    How to turn the rows of one table into a DataFrame.
+
+    Rows are the table's <tr> elements that contain <td> cells, as lists of
+    their <td> text (header-only <th> rows are left out). Column names come
+    from `columns`, or from the row at `header_row`; `skip_rows` more rows
+    are then dropped before the data. With `subheader`, the first remaining
+    row is a second header level (units such as "No. of policies") rather
+    than data; to_frame keeps it as a row, to_typed_frame makes it a level.
+    """
+
+    def __init__(self, name: str, columns: Optional[List[str]] = None, header_row: Optional[int] = None,
+                 skip_rows: int = 0, subheader: bool = False):
+        if (columns is None) == (header_row is None):
+            raise ValueError("give exactly one of columns and header_row")
+        self.name = name
+        self.columns = columns
+        self.header_row = header_row
+        self.skip_rows = skip_rows
+        self.subheader = subheader
+
+    def to_frame(self, rows: List[List[str]]) -> pd.DataFrame:
+        if self.columns is not None:
+            return pd.DataFrame(rows[self.skip_rows:], columns=self.columns)
+        first = self.header_row + 1 + self.skip_rows
+        return pd.DataFrame(rows[first:], columns=rows[self.header_row])
+
+    def to_typed_frame(self, rows: List[List[str]]) -> pd.DataFrame:
+        """
+        to_frame with the subheader as a second column level, which also
+        makes repeated names such as "Claims paid" unique, and with numeric
+        columns converted.
+        """
+        frame = self.to_frame(rows)
+        if self.subheader:
+            units = frame.iloc[0].tolist()
+            frame = frame.iloc[1:].reset_index(drop=True)
+            frame.columns = pd.MultiIndex.from_arrays([list(frame.columns), units])
+        return numeric_columns(frame)
+
+
+def numeric_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts every column whose non-empty cells are all numbers, ignoring
+    thousands separators, a trailing "%" and "*" footnote markers, to Int64
+    or float64.
+    """
+    frame = frame.copy()
+    for position in range(frame.shape[1]):
+        text = frame.iloc[:, position].astype(str).str.replace(",", "", regex=False).str.strip().str.rstrip("%*")
+        present = text != ""
+        if not present.any():
+            continue
+        numbers = pd.to_numeric(text.where(present), errors="coerce")
+        if numbers[present].isna().any():
+            continue  # Some cell is not a number; leave the column as text
+        if (numbers[present] % 1 == 0).all():
+            numbers = numbers.astype("Int64")
+        frame.isetitem(position, numbers)
+    return frame
+
+
+# The two tables of the settlement ratio article
+POLICIES = TableSpec("settlement_by_%_of_policies", skip_rows=2, subheader=True, columns=[
+    "Life Insurer", "Total claims", "Claims paid", "Claims paid", "Claims repudiated", "Claims repudiated"])
+BENEFIT = TableSpec("settlement_%_benefit_amount", header_row=1)
+SETTLEMENT_SPECS = (POLICIES, BENEFIT)
+
+
+def _has_class(value: Optional[str], name: str) -> bool:
+    return bool(value) and name in value.split()
+
+
+def _lxml_tables(content: bytes, class_name: str) -> Iterator[List[List[str]]]:
+    # iterparse walks the document once; elements are freed as soon as they
+    # have been read, so memory stays flat no matter how long the page is
+    box = None  # The tableBox <div> being read
+    rows: List[List[str]] = []
+    row: List[str] = []
+    in_cell = 0
+    for event, element in etree.iterparse(io.BytesIO(content), events=("start", "end"), html=True, recover=True):
+        tag = element.tag
+        if event == "start":
+            if box is None and tag == "div" and _has_class(element.get("class"), class_name):
+                box, rows = element, []
+            elif box is not None and tag in CELL_TAGS:
+                in_cell += 1
+            continue
+        if box is not None:
+            if tag in CELL_TAGS:
+                in_cell -= 1
+                if tag == "td":
+                    row.append("".join(element.itertext()).strip())
+            elif tag == "tr":
+                if row:
+                    rows.append(row)
+                row = []
+            elif element is box:
+                box = None
+                yield rows
+            if in_cell:
+                continue  # Keep the text of elements inside a cell until the cell ends
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+
+class _TableCollector(HTMLParser):
+    """Standard library fallback: collects tableBox rows in one streaming pass."""
+
+    def __init__(self, class_name: str):
+        super().__init__(convert_charrefs=True)
+        self.class_name = class_name
+        self.tables: List[List[List[str]]] = []
+        self._div_depth = 0  # <div> nesting inside the current tableBox, 0 outside one
+        self._rows: List[List[str]] = []
+        self._row: List[str] = []
+        self._cell: Optional[List[str]] = None  # Text of the open <td>
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            if self._div_depth:
+                self._div_depth += 1
+            elif _has_class(dict(attrs).get("class"), self.class_name):
+                self._div_depth, self._rows = 1, []
+        elif self._div_depth:
+            if tag in CELL_TAGS:
+                self._close_cell()
+                self._cell = [] if tag == "td" else None
+            elif tag == "tr":
+                self._close_row()
+
+    def handle_endtag(self, tag):
+        if not self._div_depth:
+            return
+        if tag in CELL_TAGS:
+            self._close_cell()
+        elif tag in ("tr", "table"):
+            self._close_row()
+        elif tag == "div":
+            self._div_depth -= 1
+            if not self._div_depth:
+                self._close_row()
+                self.tables.append(self._rows)
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _close_cell(self):
+        if self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+            self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row:
+            self._rows.append(self._row)
+        self._row = []
+
+
+def iter_tables(content, class_name: str = TABLE_CLASS, backend: Optional[str] = None) -> Iterator[List[List[str]]]:
+    """
+    Yield the rows of every table inside a `class_name` div, in document
+    order, from one pass over the page. Uses lxml when it is installed
+    (backend "lxml") and the standard library parser otherwise ("html.parser").
+    """
+    backend = backend or ("lxml" if etree is not None else "html.parser")
+    if isinstance(content, str):
+        content = content.encode()
+    if backend == "lxml":
+        yield from _lxml_tables(content, class_name)
+        return
+    collector = _TableCollector(class_name)
+    collector.feed(content.decode("utf-8", errors="replace"))
+    collector.close()
+    yield from collector.tables
+
+
+def tag_rows(table) -> List[List[str]]:
+    """Rows of an already parsed BeautifulSoup tableBox, read in place."""
+    rows = []
+    for row in table.find_all("tr"):
+        cells = row.find_all("td")
+        if cells:
+            rows.append([cell.text.strip() for cell in cells])
+    return rows
+
+
+def extract_frames(content, specs=SETTLEMENT_SPECS, class_name: str = TABLE_CLASS,
+                   backend: Optional[str] = None, typed: bool = False) -> List[pd.DataFrame]:
+    """
+    DataFrames for the first len(specs) tables of a page, one spec per
+    table; with `typed`, as built by TableSpec.to_typed_frame.
+    """
+    return [spec.to_typed_frame(rows) if typed else spec.to_frame(rows)
+            for spec, rows in zip(specs, iter_tables(content, class_name, backend))]
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from fetcher import DiskCache, Fetcher
+from fixtures import StubServer
+
+
+def response(content, etag=None, last_modified=None):
+    """A requests.Response as the cache sees it after a 200."""
+    result = requests.Response()
+    result.status_code = 200
+    result._content = content
+    if etag:
+        result.headers["ETag"] = etag
+    if last_modified:
+        result.headers["Last-Modified"] = last_modified
+    return result
+
+
+class FetcherTest(unittest.TestCase):
+    """Fetcher against the local stub server from fixtures.py."""
+
+    def start_server(self, **options):
+        server = StubServer(("127.0.0.1", 0), pages=3, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/article/"
+
+    def fetcher(self, **options):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        fetcher = Fetcher(**{"cache_dir": cache_dir.name, "per_host_rate": None, **options})
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+    def test_etag_revalidation_marks_result_not_modified(self):
+        server, base = self.start_server()
+        fetcher = self.fetcher()
+        cold = fetcher.fetch(base + "0")
+        warm = fetcher.fetch(base + "0")
+        self.assertTrue(cold.ok and warm.ok)
+        self.assertFalse(cold.not_modified)
+        self.assertTrue(warm.not_modified)
+        self.assertEqual(warm.status, 304)
+        self.assertEqual(warm.content, server.pages["/article/0"][0])
+        self.assertEqual(server.requests[1][2].get("If-None-Match"), server.pages["/article/0"][1])
+
+    def test_last_modified_only_revalidation(self):
+        server, base = self.start_server(etags=False)
+        fetcher = self.fetcher()
+        fetcher.fetch(base + "1")
+        warm = fetcher.fetch(base + "1")
+        headers = server.requests[1][2]
+        self.assertNotIn("If-None-Match", headers)
+        self.assertEqual(headers.get("If-Modified-Since"), server.last_modified)
+        self.assertTrue(warm.not_modified)
+        self.assertEqual(warm.content, server.pages["/article/1"][0])
+        self.assertEqual(server.counts[304], 1)
+
+    def test_refetches_when_cache_entry_vanishes_after_304(self):
+        server, base = self.start_server()
+        fetcher = self.fetcher()
+        url = base + "2"
+        fetcher.fetch(url)
+        validators = fetcher.cache.validators
+
+        def validators_then_evict(cached_url):
+            headers = validators(cached_url)
+            os.remove(fetcher.cache._path(cached_url))
+            return headers
+
+        fetcher.cache.validators = validators_then_evict
+        waits = []
+        wait = fetcher.limiter.wait
+        fetcher.limiter.wait = lambda host: (waits.append(host), wait(host))
+        result = fetcher.fetch(url)
+        self.assertTrue(result.ok)
+        self.assertFalse(result.not_modified)
+        self.assertEqual(result.status, 200)
+        self.assertEqual(result.content, server.pages["/article/2"][0])
+        self.assertEqual(server.counts[304], 1)
+        self.assertEqual(server.counts[200], 2)
+        # Both the conditional GET and the refetch go through the per-host limiter
+        self.assertEqual(len(waits), 2)
+
+    def test_rate_limit_spaces_requests_to_a_host(self):
+        server, base = self.start_server()
+        fetcher = self.fetcher(per_host_rate=20, max_workers=4, cache_dir=None)
+        results = fetcher.fetch_all([base + str(n % 3) for n in range(6)])
+        self.assertTrue(all(result.ok for result in results))
+        arrivals = sorted(arrival for arrival, _, _ in server.requests)
+        gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+        # 20 requests/s means a 50 ms slot per request; allow for scheduling jitter
+        self.assertGreaterEqual(min(gaps), 0.04)
+        self.assertGreaterEqual(arrivals[-1] - arrivals[0], 0.2)
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = DiskCache(directory.name)
+        self.url = "http://example.test/article"
+
+    def test_body_is_served_only_with_its_own_validators(self):
+        self.cache.store(self.url, response(b"old", etag='"a"'))
+        sent = self.cache.validators(self.url)
+        # A concurrent fetch stores a newer response before the 304 arrives
+        self.cache.store(self.url, response(b"new", etag='"b"'))
+        self.assertIsNone(self.cache.load(self.url, sent))
+        self.assertEqual(self.cache.load(self.url, self.cache.validators(self.url)), b"new")
+
+    def test_response_without_validators_is_not_cached(self):
+        self.cache.store(self.url, response(b"body"))
+        self.assertEqual(self.cache.validators(self.url), {})
+        self.assertIsNone(self.cache.load(self.url, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()